@@ -1,6 +1,7 @@
 from collections.abc import Generator
 from fastapi import Depends, HTTPException, Request
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.db.session import SessionLocal
 from app.services.user_service import UserService
 
@@ -25,3 +26,11 @@ def get_current_guest(
     if not user:
         raise HTTPException(status_code=401, detail="Invalid guest_id")
     return user
+
+
+def require_admin(request: Request) -> None:
+    # Rotas administrativas ficam desativadas se ADMIN_TOKEN não estiver configurado
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin routes disabled")
+    if request.headers.get("x-admin-token") != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -0,0 +1,51 @@
+"""Medição por requisição (middleware ASGI): histograma por rota e header Server-Timing.
+
+Os spans registrados durante a requisição (RAG, LLM, banco, STT, TTS) saem no header
+`Server-Timing` junto com o `total` até o envio dos cabeçalhos. Em respostas em
+streaming (SSE, TTS em partes), só entram as etapas concluídas até o primeiro byte.
+"""
+
+from __future__ import annotations
+
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.timing import REQUEST_DURATION, begin_request, end_request, server_timing_header
+
+
+class TimingMiddleware:
+    def __init__(self, app: ASGIApp, *, server_timing: bool = True) -> None:
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        spans, token = begin_request()
+        status = 500
+
+        async def timed_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    header = server_timing_header(spans, time.perf_counter() - started)
+                    MutableHeaders(scope=message).append("Server-Timing", header)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            end_request(token)
+            labels = (scope["method"], _route_template(scope), str(status))
+            REQUEST_DURATION.observe(labels, time.perf_counter() - started)
+
+
+def _route_template(scope: Scope) -> str:
+    """Template da rota (ex.: /api/v1/conversations/{conversation_id}): cardinalidade limitada."""
+    return getattr(scope.get("route"), "path", None) or "unmatched"
@@ -0,0 +1,14 @@
+import json
+from typing import Any, Dict
+
+SSE_HEADERS: Dict[str, str] = {
+    "Cache-Control": "no-cache",
+    # Desativa buffering em proxies (nginx) para os tokens chegarem imediatamente
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Formata um evento Server-Sent Events com payload JSON."""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
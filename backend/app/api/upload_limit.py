@@ -0,0 +1,52 @@
+"""Limite de tamanho do corpo da requisição para rotas de upload (middleware ASGI).
+
+Rejeita com 413 antes de ler o corpo quando o Content-Length declarado excede o limite
+e, para uploads sem Content-Length (chunked), interrompe a leitura assim que o total
+recebido passa do limite — o multipart não chega a ser gravado por inteiro.
+"""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app: ASGIApp, *, max_bytes: int, path_prefixes: Sequence[str]) -> None:
+        self.app = app
+        self.max_bytes = int(max_bytes)
+        self.path_prefixes = tuple(path_prefixes)
+
+    def _detail(self) -> str:
+        return f"Arquivo excede o limite de {self.max_bytes // (1024 * 1024)} MB"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or self.max_bytes <= 0
+            or not scope["path"].startswith(self.path_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers") or []:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await JSONResponse({"detail": self._detail()}, status_code=413)(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Propagado pelo parser de formulário do FastAPI como resposta 413
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,52 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from app.api.deps import require_admin
+from app.services.chat_state import get_chat_state
+from app.services.clarify_cache import clarify_cache_stats
+from app.services.legal_agent import kb_status, trigger_kb_reload
+from app.services.llm_limiter import limiter_stats
+from app.services.speech_to_text import stt_pool_stats
+from app.services.transcript_cache import transcript_cache_stats
+from app.services.tts_cache import audio_cache_stats
+from app.services.tts_pool import tts_pool_stats
+from app.services.warmup import warmup_status
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/admin/kb", summary="Estado da base de conhecimento carregada")
+def get_kb_status() -> Dict[str, Any]:
+    return kb_status()
+
+
+@router.post("/admin/kb/reload", status_code=202, summary="Recarrega a KB em segundo plano")
+def reload_kb_endpoint():
+    # A recarga roda em thread própria e troca o snapshot atomicamente;
+    # requisições em andamento continuam com a versão anterior.
+    started = trigger_kb_reload()
+    body = {"status": "reloading" if started else "already_running", **kb_status()}
+    return JSONResponse(status_code=202 if started else 409, content=body)
+
+
+@router.get("/admin/cache", summary="Contadores dos caches de respostas, áudio e do estado do /chat")
+def get_cache_stats() -> Dict[str, Any]:
+    return {
+        "clarify": clarify_cache_stats(),
+        "chat_state": get_chat_state().stats(),
+        "transcripts": transcript_cache_stats(),
+        "tts_audio": audio_cache_stats(),
+    }
+
+
+@router.get("/admin/llm", summary="Vagas, fila e tempo de espera das chamadas ao LLM por tipo, do STT e do TTS")
+def get_llm_limits() -> Dict[str, Any]:
+    return {**limiter_stats(), "stt": stt_pool_stats(), "tts": tts_pool_stats()}
+
+
+@router.get("/admin/warmup", summary="Estado e tempos do aquecimento de inicialização, por componente")
+def get_warmup_status() -> Dict[str, Any]:
+    return warmup_status()
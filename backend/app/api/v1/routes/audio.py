@@ -1,31 +1,102 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import logging
 import os
 import io
-import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 import mimetypes
 
 from fastapi import (
-    APIRouter, File, Form, HTTPException, UploadFile, Depends, Request
+    APIRouter, File, Form, Header, HTTPException, Query, UploadFile, Depends, Request
 )
-from fastapi.responses import FileResponse, Response, JSONResponse # Response é necessário
+from fastapi.responses import FileResponse, Response, JSONResponse, StreamingResponse # Response é necessário
+import anyio
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from app.api.deps import get_current_guest
-from app.services.speech_to_text import transcribe_audio_file
+from app.core.config import settings
+from app.services.speech_to_text import (
+    AudioDecodeError,
+    AudioTooLongError,
+    STTBusyError,
+    check_duration,
+    raw_duration_limit,
+    transcribe_audio_bytes_async,
+)
+from app.services.stt_backends import RECOGNITION_ERROR
 from app.services.text_preprocessor import preprocess_transcript
+from app.services.transcript_cache import get_transcript_cache, transcript_cache_key
 
 # --- IMPORTE O NOVO SERVIÇO E REMOVA OS ANTIGOS ---
 from app.services.text_to_speech import (
+    OUTPUT_SAMPLE_RATES,
     generate_speech_sync,
+    negotiate_audio_format,
+    stream_speech_wav,
     TTSServiceError,
 )
+from app.services.tts_pool import TTSBusyError
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MAX_SECONDS = settings.STT_MAX_SECONDS
+
+# Tamanho dos blocos lidos do upload e gravados no arquivo
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+# Gravações de arquivamento em andamento (referência evita que a task seja coletada)
+_ARCHIVE_TASKS: "set[asyncio.Task]" = set()
+
+
+async def _read_upload(audio: UploadFile, max_bytes: int) -> Tuple[bytearray, str]:
+    """Lê o upload em blocos fixos, abortando com 413 assim que passar de `max_bytes`.
 
-MAX_SECONDS = 30.0
+    Retorna (conteúdo, SHA-256 hex), com o hash calculado bloco a bloco durante a leitura.
+    O bytearray é devolvido como está (sem cópia para `bytes`): o pico de memória por
+    requisição fica em ~1x o teto configurado; o corpo bruto já é limitado na leitura da
+    rede pelo BodySizeLimitMiddleware.
+    """
+    buf = bytearray()
+    digest = hashlib.sha256()
+    while True:
+        chunk = await audio.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            return buf, digest.hexdigest()
+        if max_bytes > 0 and len(buf) + len(chunk) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Arquivo excede o limite de {max_bytes // (1024 * 1024)} MB")
+        digest.update(chunk)
+        buf += chunk
+
+
+async def _write_upload(path: Path, content: bytes) -> None:
+    # Grava em arquivo temporário e renomeia: um reenvio simultâneo nunca vê o blob pela metade
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{id(content)}.part")
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as f:
+            view = memoryview(content)
+            for start in range(0, len(view), UPLOAD_CHUNK_BYTES):
+                await f.write(view[start : start + UPLOAD_CHUNK_BYTES])
+        os.replace(tmp_path, path)
+    except Exception:
+        logger.exception("Falha ao arquivar áudio em %s", path)
+        tmp_path.unlink(missing_ok=True)
+
+
+def _archive_upload(path: Path, content: bytes) -> None:
+    """Grava o original em segundo plano (I/O assíncrono); a transcrição não espera pelo disco.
+
+    Os nomes são endereçados pelo conteúdo (SHA-256): um reenvio idêntico reaproveita o blob.
+    """
+    if path.exists():
+        return
+    task = asyncio.get_running_loop().create_task(_write_upload(path, content))
+    _ARCHIVE_TASKS.add(task)
+    task.add_done_callback(_ARCHIVE_TASKS.discard)
 
 
 def _get_upload_base() -> Path:
@@ -56,24 +127,61 @@ async def speech_to_text(
     subdir = uploads / guest_id / (str(conversation_id) if conversation_id else "misc")
     subdir.mkdir(parents=True, exist_ok=True)
 
-    # Build filename based on timestamp, keep extension when possible
+    try:
+        content, sha256 = await _read_upload(audio, settings.STT_MAX_UPLOAD_BYTES)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Falha ao ler áudio: {e}")
+
+    # Content-addressed filename (SHA-256), keep extension when possible
     orig_name = audio.filename or "recording.bin"
-    ext = os.path.splitext(orig_name)[1] or ".bin"
-    ts = time.strftime("%Y%m%d-%H%M%S")
-    stored_name = f"{ts}{ext}"
+    ext = (os.path.splitext(orig_name)[1] or ".bin").lower()
+    stored_name = f"{sha256}{ext}"
     stored_path = subdir / stored_name
 
-    # Save uploaded content to disk
+    # Archive the original in the background (also kept when the request is rejected below)
+    _archive_upload(stored_path, content)
+
+    stored_info = {
+        "stored": True,
+        "audio_sha256": sha256,
+        "audio_filename": stored_name,
+        "audio_dir": str(subdir.relative_to(_get_upload_base())),
+        "audio_url": (f"/api/v1/audio/{conversation_id}/{stored_name}" if conversation_id else None),
+        "audio_path": (f"audio/{conversation_id}/{stored_name}" if conversation_id else None),
+    }
+
+    # Repeat upload of identical audio: answer from the transcript cache
+    language = "pt-BR"
+    cache_key = transcript_cache_key(sha256, language)
+    if cache_key:
+        # The store may be SQLite (blocking I/O): keep it off the event loop
+        cached = await run_in_threadpool(get_transcript_cache().get, cache_key)
+        if cached:
+            return {**cached, **stored_info, "cached": True}
+
+    # Pre-flight: container header / ffprobe only; rejects over-length or non-audio in ms
     try:
-        content = await audio.read()
-        with open(stored_path, "wb") as f:
-            f.write(content)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Falha ao salvar áudio: {e}")
+        await run_in_threadpool(check_duration, content, raw_duration_limit(MAX_SECONDS))
+    except AudioTooLongError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AudioDecodeError as e:
+        raise HTTPException(status_code=415, detail=f"Falha ao converter áudio (formato/codec não suportado?): {e}")
 
-    # Transcribe from stored path (conversion handled inside service)
+    # Transcribe straight from memory: bytes -> ffmpeg stdin -> PCM stdout -> recognizer (STT pool);
+    # ffmpeg -t caps decoding, so containers without a declared duration are still bounded
     try:
-        transcript, duration = transcribe_audio_file(str(stored_path), language="pt-BR")
+        transcript, duration = await transcribe_audio_bytes_async(
+            content, language=language, filename=orig_name, max_seconds=MAX_SECONDS
+        )
+    except STTBusyError:
+        raise
+    except AudioTooLongError as e:
+        # Keep the saved file, but reject the request
+        raise HTTPException(status_code=400, detail=str(e))
+    except AudioDecodeError as e:
+        raise HTTPException(status_code=415, detail=f"Falha ao converter áudio (formato/codec não suportado?): {e}")
     except Exception as e:
         # Se a conversão falhar (ex.: codec não suportado), informe claramente
         detail = str(e)
@@ -81,25 +189,20 @@ async def speech_to_text(
             raise HTTPException(status_code=415, detail=f"Falha ao converter áudio (formato/codec não suportado?): {detail}")
         raise HTTPException(status_code=500, detail=detail)
 
-    # Enforce 30s limit (best-effort; frontend should also limit)
-    if duration and duration > (MAX_SECONDS + 1.0):
-        # Keep the saved file, but reject the request
-        raise HTTPException(status_code=400, detail=f"Áudio excede {MAX_SECONDS:.0f}s (duração ~{duration:.1f}s)")
-
     # Optional preprocessing (LLM ou regras simples), controlado por env STT_PREPROCESS_MODE
-    cleaned, raw, mode = preprocess_transcript(transcript)
+    # (bloqueante no modo 'llm': roda no threadpool)
+    cleaned, raw, mode = await run_in_threadpool(preprocess_transcript, transcript)
 
-    return {
+    result = {
         "transcript": cleaned,
         "raw_transcript": raw,
         "transcript_preprocess_mode": mode,
         "duration": duration,
-        "stored": True,
-        "audio_filename": stored_name,
-        "audio_dir": str(subdir.relative_to(_get_upload_base())),
-        "audio_url": (f"/api/v1/audio/{conversation_id}/{stored_name}" if conversation_id else None),
-        "audio_path": (f"audio/{conversation_id}/{stored_name}" if conversation_id else None),
     }
+    # Falhas do reconhecedor não são cacheadas: um reenvio deve tentar de novo
+    if cache_key and transcript != RECOGNITION_ERROR:
+        await run_in_threadpool(get_transcript_cache().set, cache_key, result)
+    return {**result, **stored_info, "cached": False}
 
 
 @router.get("/audio/{conversation_id}/{filename}", summary="Baixa arquivo de áudio da conversa")
@@ -134,40 +237,79 @@ def get_audio(
 class TTSRequest(BaseModel):
     text: str
     voice_id: Optional[str] = None
+    # Streaming: sintetiza frase a frase e envia o WAV em partes (a reprodução começa após a 1ª frase)
+    stream: bool = False
     # Removido: speed e model (KittenTTS usa 'voice' e o modelo é fixo na config)
 
 
 @router.post("/text-to-speech", 
-            summary="Gera áudio (WAV) a partir de texto de forma síncrona",
-            # Define o tipo de resposta como audio/wav
+            summary="Gera áudio (WAV, OGG/Opus ou MP3) a partir de texto de forma síncrona",
+            # Tipos de resposta possíveis (negociados via Accept ou ?format=)
             responses={
                 200: {
-                    "content": {"audio/wav": {}},
-                    "description": "Arquivo de áudio WAV gerado com sucesso."
+                    "content": {"audio/wav": {}, "audio/ogg": {}, "audio/mpeg": {}},
+                    "description": "Arquivo de áudio gerado com sucesso."
                 }
             })
 def text_to_speech(
     body: TTSRequest,
+    format: Optional[str] = Query(default=None, description="wav | ogg (Opus) | mp3; tem prioridade sobre o Accept"),
+    sample_rate: Optional[int] = Query(default=None, description="Taxa de saída em Hz (reduz o tamanho)"),
+    accept: Optional[str] = Header(default=None),
     current_user=Depends(get_current_guest), # Mantém a autenticação
 ):
     """
-    Converte texto em áudio (WAV) e retorna o arquivo de áudio diretamente.
+    Converte texto em áudio e retorna o arquivo de áudio diretamente.
     
     Esta rota é síncrona e pode demorar alguns segundos para responder.
+    O formato vem de `?format=` ou do header Accept (`audio/ogg` -> Opus, ~10x menor que WAV).
+    Com `stream=true`, o texto é dividido em frases e o WAV é enviado em partes
+    (cabeçalho + PCM de cada frase assim que sintetizada); nesse modo só há WAV na taxa
+    do modelo, e `format`/`sample_rate` diferentes disso são recusados com 400.
     """
     if not body.text or not body.text.strip():
         raise HTTPException(status_code=400, detail="Texto para TTS é obrigatório")
 
+    try:
+        audio_format = negotiate_audio_format(accept, format, formats=("wav",) if body.stream else None)
+    except ValueError as e:
+        detail = f"{e}; com stream=true o áudio é sempre WAV" if body.stream else str(e)
+        raise HTTPException(status_code=400, detail=detail)
+    if body.stream and sample_rate not in (None, settings.KITTEN_TTS_SAMPLE_RATE):
+        raise HTTPException(
+            status_code=400,
+            detail=f"sample_rate não é suportado com stream=true (o WAV sai em {settings.KITTEN_TTS_SAMPLE_RATE} Hz)",
+        )
+    if sample_rate is not None and (
+        sample_rate not in OUTPUT_SAMPLE_RATES or sample_rate > settings.KITTEN_TTS_SAMPLE_RATE
+    ):
+        allowed = [r for r in OUTPUT_SAMPLE_RATES if r <= settings.KITTEN_TTS_SAMPLE_RATE]
+        raise HTTPException(status_code=400, detail=f"sample_rate inválido (aceitos: {allowed})")
+
+    if body.stream:
+        try:
+            # Sintetiza a 1ª frase antes de responder: falhas do modelo ainda viram HTTP 500
+            chunks = stream_speech_wav(body.text, voice_id=body.voice_id)
+        except TTSServiceError as e:
+            raise HTTPException(status_code=500, detail=f"Falha ao gerar TTS: {e}")
+        # Iterador síncrono: o StreamingResponse consome cada frase no threadpool
+        return StreamingResponse(chunks, media_type="audio/wav", headers={"Cache-Control": "no-store"})
+
     try:
         # Chama o novo serviço síncrono
         audio_bytes, media_type = generate_speech_sync(
             body.text,
             voice_id=body.voice_id,
+            audio_format=audio_format,
+            output_rate=sample_rate,
         )
         
         # Retorna o áudio diretamente no corpo da resposta
-        return Response(content=audio_bytes, media_type=media_type)
+        return Response(content=audio_bytes, media_type=media_type, headers={"Vary": "Accept"})
 
+    except TTSBusyError:
+        # Pool de TTS sem vaga: 503 + Retry-After (handler global)
+        raise
     except TTSServiceError as e:
         # Erro de negócio (ex: modelo falhou)
         raise HTTPException(status_code=500, detail=f"Falha ao gerar TTS: {e}")
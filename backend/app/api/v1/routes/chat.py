@@ -1,32 +1,37 @@
-from typing import Any, Dict
-
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
+from app.api.sse import SSE_HEADERS, format_sse
 from app.core.config import settings
 from app.schemas.agent import ChatRequest, ChatResponse
+from app.services.chat_state import get_chat_state
+from app.services.llm_limiter import LLMBusyError
 from app.services.legal_agent import (
-    generate_clarify_questions,
-    generate_final_answer,
+    generate_clarify_questions_async,
+    generate_final_answer_async,
     parse_q123,
     is_new_topic,
+    stream_final_answer,
 )
 
 
 router = APIRouter()
 
-# Estado mínimo em memória para dois passos do endpoint stateless
-# Chaveado por conversation_id.
-CHAT_STATE: Dict[str, Dict[str, Any]] = {}
+# Estado mínimo para dois passos do endpoint stateless, chaveado por conversation_id.
+# Entradas expiram (CHAT_STATE_TTL_SEC) e o total é limitado (LRU); com backend
+# 'sqlite' o estado é compartilhado entre workers (I/O bloqueante: sempre via threadpool).
+CHAT_STATE = get_chat_state()
 
 
 @router.post("/chat", response_model=ChatResponse, summary="Chat do agente jurídico")
-def chat(req: ChatRequest) -> ChatResponse:
+async def chat(req: ChatRequest) -> ChatResponse:
     if not settings.COHERE_API_KEY:
         raise HTTPException(status_code=500, detail="COHERE_API_KEY não configurada no ambiente")
 
     conv_id = req.conversation_id or "local-thread"
 
-    rec = CHAT_STATE.get(conv_id)
+    rec = await run_in_threadpool(CHAT_STATE.get, conv_id)
     if rec and rec.get("phase") == "clarify_sent":
         # Etapa B: usuário respondeu U1
         U0 = rec.get("U0") or ""
@@ -38,30 +43,101 @@ def chat(req: ChatRequest) -> ChatResponse:
             if is_new_topic(U0, Qs, U1):
                 # Recomeça Etapa A
                 # Reduz k para acelerar
-                clar = generate_clarify_questions(user_message=U1, k=3)
-                CHAT_STATE[conv_id] = {"phase": "clarify_sent", "U0": U1, "clarify": clar}
+                clar = await generate_clarify_questions_async(user_message=U1, k=3)
+                await run_in_threadpool(
+                    CHAT_STATE.set, conv_id, {"phase": "clarify_sent", "U0": U1, "clarify": clar}
+                )
                 return ChatResponse(response_text=clar, citations=[], conversation_id=conv_id)
 
             # Reduz k para acelerar
-            final = generate_final_answer(U0=U0, Qs=Qs, U1=U1, conversation_id=conv_id, k=3)
+            final = await generate_final_answer_async(U0=U0, Qs=Qs, U1=U1, conversation_id=conv_id, k=3)
             # Limpa estado após resposta final
-            CHAT_STATE.pop(conv_id, None)
+            await run_in_threadpool(CHAT_STATE.delete, conv_id)
             return ChatResponse(
                 response_text=final.get("text", ""),
                 citations=final.get("citations") or [],
                 conversation_id=conv_id,
             )
+        except LLMBusyError:
+            # Mantém o estado: o usuário pode reenviar U1 (tratado como 503 em main)
+            raise
         except Exception as e:
             # Em caso de falha, reseta estado e repassa erro
-            CHAT_STATE.pop(conv_id, None)
+            await run_in_threadpool(CHAT_STATE.delete, conv_id)
             raise HTTPException(status_code=500, detail=f"Erro ao gerar resposta final: {e}")
     else:
         # Etapa A: primeira passada
         try:
             # Reduz k para acelerar
-            clar = generate_clarify_questions(user_message=req.user_message, k=3)
-            CHAT_STATE[conv_id] = {"phase": "clarify_sent", "U0": req.user_message, "clarify": clar}
+            clar = await generate_clarify_questions_async(user_message=req.user_message, k=3)
+            await run_in_threadpool(
+                CHAT_STATE.set, conv_id, {"phase": "clarify_sent", "U0": req.user_message, "clarify": clar}
+            )
             return ChatResponse(response_text=clar, citations=[], conversation_id=conv_id)
+        except LLMBusyError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao gerar perguntas de esclarecimento: {e}")
+
+
+@router.post(
+    "/chat/stream",
+    summary="Chat do agente jurídico com streaming (SSE) da resposta final",
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def chat_stream(req: ChatRequest) -> StreamingResponse:
+    """Mesma política de duas etapas do `/chat`, respondendo em Server-Sent Events.
+
+    Eventos: `clarify` (Etapa A, bloco completo), `token` (trechos da Etapa B),
+    `citations` (ao final da Etapa B), `done` e `error`.
+    """
+    if not settings.COHERE_API_KEY:
+        raise HTTPException(status_code=500, detail="COHERE_API_KEY não configurada no ambiente")
+
+    conv_id = req.conversation_id or "local-thread"
+    rec = await run_in_threadpool(CHAT_STATE.get, conv_id)
+    stage_b = None
+    if rec and rec.get("phase") == "clarify_sent":
+        U0 = rec.get("U0") or ""
+        Qs = parse_q123(rec.get("clarify") or "")
+        if not is_new_topic(U0, Qs, req.user_message):
+            stage_b = (U0, Qs, req.user_message)
+
+    if stage_b is None:
+        # Etapa A: as perguntas são curtas e pós-processadas; enviadas em um único evento
+        try:
+            clar = await generate_clarify_questions_async(user_message=req.user_message, k=3)
+        except LLMBusyError:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Erro ao gerar perguntas de esclarecimento: {e}")
+        await run_in_threadpool(
+            CHAT_STATE.set, conv_id, {"phase": "clarify_sent", "U0": req.user_message, "clarify": clar}
+        )
+
+        async def clarify_events():
+            yield format_sse("clarify", {"response_text": clar, "conversation_id": conv_id})
+            yield format_sse("done", {"response_text": clar, "citations": [], "conversation_id": conv_id})
+
+        return StreamingResponse(clarify_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    U0, Qs, U1 = stage_b
+
+    async def final_events():
+        try:
+            async for ev in stream_final_answer(U0=U0, Qs=Qs, U1=U1, conversation_id=conv_id, k=3):
+                if ev["type"] == "token":
+                    yield format_sse("token", {"text": ev["text"]})
+                else:
+                    yield format_sse("citations", ev["citations"])
+                    yield format_sse(
+                        "done",
+                        {"response_text": ev["text"], "citations": ev["citations"], "conversation_id": conv_id},
+                    )
+        except Exception as e:
+            yield format_sse("error", {"detail": f"Erro ao gerar resposta final: {e}"})
+        finally:
+            # Limpa estado após resposta final (ou falha)
+            await run_in_threadpool(CHAT_STATE.delete, conv_id)
 
+    return StreamingResponse(final_events(), media_type="text/event-stream", headers=SSE_HEADERS)
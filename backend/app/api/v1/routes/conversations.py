@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
-from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_guest, get_db
+from app.api.sse import SSE_HEADERS, format_sse
+from app.core.config import settings
+from app.db.session import SessionLocal
 from app.schemas.conversation import (
     ConversationCreate,
     ConversationRead,
@@ -10,11 +15,15 @@ from app.schemas.conversation import (
     MessageCreate,
     MessageRead,
 )
+from app.models.conversation import Message
 from app.services.conversation_service import ConversationService
+from app.services.llm_limiter import LLMBusyError
 from app.services.legal_agent import (
-    generate_clarify_questions,
-    generate_final_answer,
+    generate_clarify_questions_async,
+    generate_final_answer_async,
+    is_new_topic,
     parse_q123,
+    stream_final_answer,
 )
 
 
@@ -52,54 +61,66 @@ def get_conversation(conversation_id: int, db: Session = Depends(get_db), curren
     }
 
 
+def _clarify_context(history: List[Message]) -> Optional[Tuple[str, List[str]]]:
+    """(U0, Qs) when the last assistant message is a <clarify> block (Stage B), else None."""
+    # Find the last assistant message before this one
+    last_assistant = None
+    for m in reversed(history):
+        if m.role == "assistant":
+            last_assistant = m
+            break
+
+    if not (last_assistant and isinstance(last_assistant.content, str) and last_assistant.content.strip().startswith("<clarify>")):
+        return None
+
+    # U0 = last user message before the clarify block
+    U0 = ""
+    for m in reversed(history):
+        if m.id == last_assistant.id:
+            # skip messages after clarify
+            continue
+        if m.created_at >= last_assistant.created_at:
+            continue
+        if m.role == "user":
+            U0 = m.content
+            break
+    if not U0:
+        # fallback to first user message in history
+        for m in history:
+            if m.role == "user":
+                U0 = m.content
+                break
+    return U0, parse_q123(last_assistant.content)
+
+
 @router.post("/conversations/{conversation_id}/messages", response_model=MessageRead)
-def post_message(
+async def post_message(
     conversation_id: int,
     payload: MessageCreate,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_guest),
 ):
+    # Async handler: DB calls (sync SQLAlchemy) run in the threadpool, the LLM call is awaited
     # Validate conversation ownership
     service = ConversationService(db)
-    conv = service.get_conversation(conversation_id, guest_id=current_user.guest_id)
+    conv = await run_in_threadpool(service.get_conversation, conversation_id, guest_id=current_user.guest_id)
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
     # Save message
-    saved_msg = service.add_message(conversation_id=conv.id, role=payload.role, content=payload.content)
+    saved_msg = await run_in_threadpool(
+        service.add_message, conversation_id=conv.id, role=payload.role, content=payload.content
+    )
 
     # Only trigger agent when role=user
     if payload.role == "user":
         # Load history to detect clarify/final stage
-        history = service.list_messages(conversation_id=conv.id)
-        # Find the last assistant message before this one
-        last_assistant = None
-        for m in reversed(history):
-            if m.role == "assistant":
-                last_assistant = m
-                break
+        history = await run_in_threadpool(service.list_messages, conversation_id=conv.id)
+        stage_b = _clarify_context(history)
 
-        if last_assistant and isinstance(last_assistant.content, str) and last_assistant.content.strip().startswith("<clarify>"):
+        if stage_b is not None:
             # Stage B: user answered Q1–Q3 -> produce final answer
-            # U0 = last user message before the clarify block
-            U0 = ""
-            for m in reversed(history):
-                if m.id == last_assistant.id:
-                    # skip messages after clarify
-                    continue
-                if m.created_at >= last_assistant.created_at:
-                    continue
-                if m.role == "user":
-                    U0 = m.content
-                    break
-            if not U0:
-                # fallback to first user message in history
-                for m in history:
-                    if m.role == "user":
-                        U0 = m.content
-                        break
-
-            Qs = parse_q123(last_assistant.content)
+            U0, Qs = stage_b
             U1 = payload.content
 
             # Simple heuristic: if user changed subject entirely, start a new Clarify stage
@@ -107,22 +128,108 @@ def post_message(
                 from app.services.legal_agent import is_new_topic  # local import to avoid cycles
 
                 if is_new_topic(U0, Qs, U1):
-                    clarify_block = generate_clarify_questions(user_message=U1, k=5)
-                    assistant_msg = service.add_message(conversation_id=conv.id, role="assistant", content=clarify_block)
+                    clarify_block = await generate_clarify_questions_async(user_message=U1, k=5)
+                    assistant_msg = await run_in_threadpool(
+                        service.add_message, conversation_id=conv.id, role="assistant", content=clarify_block
+                    )
                     return assistant_msg
+            except LLMBusyError:
+                # Clarify pool full: fast 503 (global handler), not a second LLM call
+                raise
             except Exception:
                 # If heuristic fails, continue with final answer normally
                 pass
 
             # Reduz k para acelerar RAG e resposta final
-            final = generate_final_answer(U0=U0, Qs=Qs, U1=U1, conversation_id=str(conv.id), k=3)
+            final = await generate_final_answer_async(U0=U0, Qs=Qs, U1=U1, conversation_id=str(conv.id), k=3)
             assistant_text = final.get("text", "")
-            assistant_msg = service.add_message(conversation_id=conv.id, role="assistant", content=assistant_text)
+            assistant_msg = await run_in_threadpool(
+                service.add_message, conversation_id=conv.id, role="assistant", content=assistant_text
+            )
             return assistant_msg
         else:
             # Stage A: first pass -> generate 3 clarify questions
             # Reduz k para acelerar primeira resposta
-            clarify_block = generate_clarify_questions(user_message=payload.content, k=3)
-            assistant_msg = service.add_message(conversation_id=conv.id, role="assistant", content=clarify_block)
+            clarify_block = await generate_clarify_questions_async(user_message=payload.content, k=3)
+            assistant_msg = await run_in_threadpool(
+                service.add_message, conversation_id=conv.id, role="assistant", content=clarify_block
+            )
             return assistant_msg
     return saved_msg
+
+
+def _persist_assistant_message(conversation_id: int, content: str) -> Message:
+    # Own session: the request-scoped one may already be closed once the stream finishes
+    db = SessionLocal()
+    try:
+        return ConversationService(db).add_message(conversation_id=conversation_id, role="assistant", content=content)
+    finally:
+        db.close()
+
+
+def _message_payload(msg: Message) -> dict:
+    return MessageRead.model_validate(msg).model_dump(mode="json")
+
+
+@router.post(
+    "/conversations/{conversation_id}/messages/stream",
+    summary="Envia mensagem e recebe a resposta do agente via SSE",
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def post_message_stream(
+    conversation_id: int,
+    payload: MessageCreate,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_guest),
+) -> StreamingResponse:
+    """Streaming variant of POST /conversations/{id}/messages.
+
+    Events: `token` (final-answer chunks), `citations`, `message` (the persisted
+    assistant/user message, same shape as MessageRead) and `error`. The assistant
+    message is stored once the stream completes.
+    """
+    service = ConversationService(db)
+    conv = await run_in_threadpool(service.get_conversation, conversation_id, guest_id=current_user.guest_id)
+    if not conv:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if payload.role == "user" and not settings.COHERE_API_KEY:
+        # Same guard as /chat/stream: fail before storing a message that would get no answer
+        raise HTTPException(status_code=500, detail="COHERE_API_KEY não configurada no ambiente")
+    conv_id = conv.id
+
+    saved_msg = await run_in_threadpool(
+        service.add_message, conversation_id=conv_id, role=payload.role, content=payload.content
+    )
+    stage_b = None
+    if payload.role == "user":
+        history = await run_in_threadpool(service.list_messages, conversation_id=conv_id)
+        stage_b = _clarify_context(history)
+        if stage_b is not None and is_new_topic(stage_b[0], stage_b[1], payload.content):
+            stage_b = None
+
+    async def events():
+        try:
+            if payload.role != "user":
+                yield format_sse("message", _message_payload(saved_msg))
+                return
+            if stage_b is None:
+                # Stage A (or new topic): the clarify block is short; sent as a single event
+                clarify_block = await generate_clarify_questions_async(user_message=payload.content, k=3)
+                msg = await run_in_threadpool(_persist_assistant_message, conv_id, clarify_block)
+                yield format_sse("message", _message_payload(msg))
+                return
+
+            U0, Qs = stage_b
+            async for ev in stream_final_answer(
+                U0=U0, Qs=Qs, U1=payload.content, conversation_id=str(conv_id), k=3
+            ):
+                if ev["type"] == "token":
+                    yield format_sse("token", {"text": ev["text"]})
+                else:
+                    yield format_sse("citations", ev["citations"])
+                    msg = await run_in_threadpool(_persist_assistant_message, conv_id, ev["text"])
+                    yield format_sse("message", _message_payload(msg))
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
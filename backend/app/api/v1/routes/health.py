@@ -1,5 +1,11 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.services.warmup import is_ready, warmup_status
+
 router = APIRouter()
-@router.get('/health', summary='Healthcheck')
+@router.get('/health', summary='Healthcheck (503 enquanto o worker aquece)')
 async def healthcheck():
+    if not is_ready():
+        return JSONResponse(status_code=503, content={'status': 'warming_up', 'warmup': warmup_status()})
     return {'status': 'ok'}
@@ -4,7 +4,76 @@ class Settings(BaseSettings):
     APP_ENV: str = "dev"
     DATABASE_URL: str = "sqlite:///./app.db"
     COHERE_API_KEY: str | None = None
+    # Tamanho do pool de conexões HTTP do cliente Cohere assíncrono
+    COHERE_MAX_CONNECTIONS: int = 20
+    # Chamadas simultâneas ao LLM por tipo (bulkhead) e fila de espera de cada tipo;
+    # fila cheia ou espera acima de LLM_QUEUE_TIMEOUT_SEC -> 503
+    LLM_CONCURRENCY_CLARIFY: int = 8
+    LLM_CONCURRENCY_FINAL: int = 8
+    LLM_CONCURRENCY_CLEANUP: int = 2
+    LLM_QUEUE_MAX: int = 32
+    LLM_QUEUE_TIMEOUT_SEC: float = 10.0
     KB_DIR: str = "./kb"
+    # Recuperador do RAG: 'bm25' (índice invertido) | 'keyword' (varredura linear legada)
+    # | 'semantic' (LSA local) | 'hybrid' (BM25 + LSA)
+    RAG_RETRIEVER: str = "bm25"
+    # Peso do cosseno LSA no modo híbrido (0 = só BM25, 1 = só semântico)
+    RAG_HYBRID_ALPHA: float = 0.5
+    # Dimensões latentes do modelo LSA
+    RAG_SEMANTIC_DIM: int = 128
+    # Matrizes .npy pré-computadas do LSA (padrão: <KB_DIR>/kb_semantic); gerar com `make kb-semantic`
+    KB_SEMANTIC_DIR: str | None = None
+    # Divide as leis estruturadas em unidades por artigo/parágrafo (texto.artigos)
+    KB_CHUNK_ARTICLES: bool = True
+    # Artefato compilado da KB (padrão: <KB_DIR>/kb_index.bin); gerar com `make kb-index`
+    KB_INDEX_PATH: str | None = None
+    # Hot reload da KB: intervalo (s) do observador de arquivos; 0 desativa (use a rota admin)
+    KB_WATCH_INTERVAL_SEC: float = 0.0
+    # Token exigido no header X-Admin-Token pelas rotas /admin; vazio desativa essas rotas
+    ADMIN_TOKEN: str | None = None
+    # Cache das perguntas de esclarecimento (Fase A): TTL + LRU; backend 'memory' | 'sqlite'
+    CLARIFY_CACHE_ENABLED: bool = True
+    CLARIFY_CACHE_BACKEND: str = "memory"
+    CLARIFY_CACHE_TTL_SEC: float = 3600.0
+    CLARIFY_CACHE_MAX_ENTRIES: int = 1024
+    # Estado das duas etapas do /chat: 'memory' (por processo) | 'sqlite' (compartilhado entre workers)
+    CHAT_STATE_BACKEND: str = "memory"
+    CHAT_STATE_TTL_SEC: float = 1800.0
+    CHAT_STATE_MAX_ENTRIES: int = 10000
+    # Arquivo SQLite (WAL) compartilhado pelos backends 'sqlite' dos caches/estado
+    CACHE_SQLITE_PATH: str = "./app_cache.sqlite3"
+    # Duração máxima do áudio enviado ao /speech-to-text (verificada antes da transcrição)
+    STT_MAX_SECONDS: float = 30.0
+    # Reconhecedor de fala: 'google' (Web Speech, rede) | 'vosk' | 'faster_whisper' (offline, CPU)
+    STT_BACKEND: str = "google"
+    # Diretório do modelo Vosk descompactado (ex.: vosk-model-small-pt-0.3)
+    STT_VOSK_MODEL_PATH: str | None = None
+    # Modelo faster-whisper (nome ou caminho), quantização e threads de CPU (0 = automático)
+    STT_WHISPER_MODEL: str = "small"
+    STT_WHISPER_COMPUTE_TYPE: str = "int8"
+    STT_WHISPER_CPU_THREADS: int = 0
+    # Tamanho máximo do upload de áudio (bytes); uploads maiores são abortados com 413 durante a leitura
+    STT_MAX_UPLOAD_BYTES: int = 16 * 1024 * 1024
+    # Detecção de voz (VAD por energia): corta silêncio do início/fim antes do reconhecimento;
+    # STT_MAX_SECONDS passa a valer para a fala, e o arquivo bruto pode ter até STT_MAX_RAW_SECONDS
+    STT_VAD_ENABLED: bool = True
+    STT_MAX_RAW_SECONDS: float = 45.0
+    # Limiar: STT_VAD_MARGIN_DB acima do ruído de fundo, nunca abaixo de STT_VAD_MIN_DB (dBFS)
+    STT_VAD_MARGIN_DB: float = 12.0
+    STT_VAD_MIN_DB: float = -50.0
+    # Margem mantida ao redor da fala (ms)
+    STT_VAD_PAD_MS: int = 200
+    # Pausas internas maiores que isso (ms) são encurtadas; 0 mantém as pausas
+    STT_VAD_MAX_PAUSE_MS: int = 0
+    # Transcrições simultâneas (pool dedicado, fora do event loop) e fila de espera
+    STT_MAX_CONCURRENCY: int = 2
+    STT_QUEUE_MAX: int = 16
+    STT_QUEUE_TIMEOUT_SEC: float = 15.0
+    # Cache de transcrições por SHA-256 do áudio (+ idioma, modo de pré-processamento e reconhecedor)
+    TRANSCRIPT_CACHE_ENABLED: bool = True
+    TRANSCRIPT_CACHE_BACKEND: str = "memory"
+    TRANSCRIPT_CACHE_TTL_SEC: float = 86400.0
+    TRANSCRIPT_CACHE_MAX_ENTRIES: int = 2048
     # Preprocessamento do texto de transcrição: 'off' | 'basic' | 'llm'
     STT_PREPROCESS_MODE: str = "llm"
 
@@ -14,6 +83,36 @@ class Settings(BaseSettings):
     KITTEN_TTS_VOICE_ID: str = "expr-voice-2-f"
     # Sample rate que o KittenTTS produz (do seu exemplo)
     KITTEN_TTS_SAMPLE_RATE: int = 24000
+    # Cache do áudio sintetizado: LRU em memória (entradas) + disco (MB); chave = texto+voz+modelo+sample rate
+    TTS_CACHE_ENABLED: bool = True
+    TTS_CACHE_DIR: str = "./tts_cache"
+    TTS_CACHE_MEMORY_ENTRIES: int = 64
+    TTS_CACHE_DISK_MAX_MB: float = 512.0
+    # Sintetiza os textos de fallback do agente na inicialização (em segundo plano)
+    TTS_PRECOMPUTE_FALLBACKS: bool = True
+    # Latência por etapa: GET /metrics (Prometheus) e header Server-Timing nas respostas
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING_ENABLED: bool = True
+    # Papéis deste processo (routers/serviços carregados): all | chat,conversations,audio,admin (ver app/core/roles.py)
+    APP_ROLES: str = "all"
+    # Aquecimento na inicialização (em ordem; vazio desativa): kb, cohere, stt, tts, tts_fallbacks
+    WARMUP_COMPONENTS: str = "kb,cohere,stt,tts,tts_fallbacks"
+    # Formato padrão da resposta do TTS quando o cliente não pede outro ("wav" | "ogg" (Opus) | "mp3")
+    TTS_DEFAULT_FORMAT: str = "wav"
+    # Taxa de saída do TTS (Hz; 0 = a do modelo). Reduzir (p.ex. 16000) encolhe ainda mais o áudio comprimido
+    TTS_OUTPUT_SAMPLE_RATE: int = 0
+    # Pool de inferência do TTS: processos (0 = uma thread no próprio processo) e threads ONNX por processo
+    TTS_WORKERS: int = 2
+    TTS_THREADS_PER_WORKER: int = 1
+    # Micro-lotes: até N textos curtos (<= TTS_BATCH_MAX_CHARS) que chegam dentro da janela (ms)
+    TTS_BATCH_MAX: int = 4
+    TTS_BATCH_WINDOW_MS: float = 10.0
+    TTS_BATCH_MAX_CHARS: int = 160
+    # Fila de espera por vaga no pool; cheia ou esgotada -> 503 com Retry-After
+    TTS_QUEUE_MAX: int = 16
+    TTS_QUEUE_TIMEOUT_SEC: float = 10.0
+    # Tempo máximo de uma síntese no pool (s); acima disso a requisição falha em vez de prender a vaga
+    TTS_INFERENCE_TIMEOUT_SEC: float = 60.0
     # ----------------------------------------------------
 
     model_config = SettingsConfigDict(
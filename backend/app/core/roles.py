@@ -0,0 +1,35 @@
+"""
+Papéis do processo da API (APP_ROLES), para separar pools de workers no deploy.
+
+- chat:          /chat (agente jurídico)
+- conversations: /conversations (histórico + agente)
+- audio:         /speech-to-text, /text-to-speech, /audio (STT/TTS)
+- admin:         /admin/*
+
+`/health` e `/sessions` estão sempre montados. Exemplos: `APP_ROLES=chat,conversations`
+para workers leves de texto e `APP_ROLES=audio` para workers com o modelo de voz;
+`all` (padrão) monta tudo.
+"""
+
+from __future__ import annotations
+
+from typing import FrozenSet
+
+from app.core.config import settings
+
+APP_ROLES = ("chat", "conversations", "audio", "admin")
+
+
+def enabled_roles() -> FrozenSet[str]:
+    names = {n.strip().lower() for n in (settings.APP_ROLES or "").split(",") if n.strip()}
+    if not names or "all" in names:
+        return frozenset(APP_ROLES)
+    unknown = names - set(APP_ROLES)
+    if unknown:
+        # Falha na inicialização: um papel digitado errado deixaria rotas de fora em silêncio
+        raise ValueError(f"APP_ROLES inválido: {', '.join(sorted(unknown))} (aceitos: all, {', '.join(APP_ROLES)})")
+    return frozenset(names)
+
+
+def role_enabled(role: str) -> bool:
+    return role in enabled_roles()
@@ -1,14 +1,37 @@
-from fastapi import FastAPI
-from fastapi.responses import Response, FileResponse
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, FileResponse
 import os
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.routes.health import router as health_router
 from app.api.v1.routes.users import router as users_router
-from app.api.v1.routes.chat import router as chat_router
-from app.api.v1.routes.conversations import router as conv_router
-from app.api.v1.routes.audio import router as audio_router
+from app.api.server_timing import TimingMiddleware
+from app.api.upload_limit import BodySizeLimitMiddleware
+from app.core.config import settings
+from app.core.roles import enabled_roles
+from app.services.llm_limiter import LLMBusyError
+from app.services.timing import render_prometheus
+from app.services.warmup import start_warmup
+
+# Papéis deste processo (APP_ROLES): só os routers e serviços correspondentes são carregados
+ROLES = enabled_roles()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # KB, clientes Cohere, STT e TTS carregados antes do primeiro usuário;
+    # o /health responde 503 até o aquecimento terminar
+    start_warmup()
+    yield
+    if "audio" in ROLES:
+        from app.services.tts_pool import get_tts_pool
 
-app = FastAPI(title="Backend FastAPI Base", version="0.1.1")
+        # Encerra os processos de inferência do TTS junto com o servidor
+        get_tts_pool().shutdown()
+
+
+app = FastAPI(title="Backend FastAPI Base", version="0.1.1", lifespan=lifespan)
 
 # CORS configuration to allow frontend dev origin(s)
 origins = [
@@ -23,12 +46,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Permite ao frontend (outra origem) ler o detalhamento de latência
+    expose_headers=["Server-Timing"],
 )
+# Histograma por rota + header Server-Timing com as etapas da requisição
+app.add_middleware(TimingMiddleware, server_timing=settings.SERVER_TIMING_ENABLED)
 app.include_router(health_router, prefix="/api/v1", tags=["health"])
 app.include_router(users_router, prefix="/api/v1", tags=["sessions"])
-app.include_router(chat_router, prefix="/api/v1", tags=["agent"])
-app.include_router(conv_router, prefix="/api/v1", tags=["conversations"])
-app.include_router(audio_router, prefix="/api/v1", tags=["audio"])
+if "chat" in ROLES:
+    from app.api.v1.routes.chat import router as chat_router
+
+    app.include_router(chat_router, prefix="/api/v1", tags=["agent"])
+if "conversations" in ROLES:
+    from app.api.v1.routes.conversations import router as conv_router
+
+    app.include_router(conv_router, prefix="/api/v1", tags=["conversations"])
+if "audio" in ROLES:
+    from app.api.v1.routes.audio import router as audio_router
+
+    # Uploads de áudio: 413 já na leitura do corpo (Content-Length ou contagem em streaming),
+    # com folga para os campos e delimitadores do multipart
+    app.add_middleware(
+        BodySizeLimitMiddleware,
+        max_bytes=settings.STT_MAX_UPLOAD_BYTES + 64 * 1024 if settings.STT_MAX_UPLOAD_BYTES > 0 else 0,
+        path_prefixes=["/api/v1/speech-to-text"],
+    )
+    app.include_router(audio_router, prefix="/api/v1", tags=["audio"])
+if "admin" in ROLES:
+    from app.api.v1.routes.admin import router as admin_router
+
+    app.include_router(admin_router, prefix="/api/v1", tags=["admin"])
+
+
+# Fila de chamadas ao LLM cheia: falha rápida com 503 em vez de acumular requisições
+@app.exception_handler(LLMBusyError)
+async def llm_busy_handler(request: Request, exc: LLMBusyError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
+
+# Métricas no formato texto do Prometheus (histogramas por etapa e por rota)
+if settings.METRICS_ENABLED:
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 # Optional favicon handler to avoid 404 noise when hitting the API root in a browser
@@ -0,0 +1,24 @@
+"""
+Estado das duas etapas do endpoint `/chat` (Etapa A -> Etapa B), por conversation_id.
+
+Com `CHAT_STATE_BACKEND=sqlite` o estado fica em um arquivo SQLite (WAL) compartilhado,
+então a Etapa B pode cair em outro worker do uvicorn sem perder as perguntas da Etapa A.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+from app.core.config import settings
+from app.services.kv_store import KVStore, make_store
+
+
+@lru_cache(maxsize=1)
+def get_chat_state() -> KVStore:
+    return make_store(
+        settings.CHAT_STATE_BACKEND,
+        namespace="chat_state",
+        max_entries=settings.CHAT_STATE_MAX_ENTRIES,
+        ttl_s=settings.CHAT_STATE_TTL_SEC,
+        sqlite_path=settings.CACHE_SQLITE_PATH,
+    )
@@ -0,0 +1,56 @@
+"""
+Cache de respostas da Fase A (perguntas de esclarecimento).
+
+A chave é uma impressão digital tolerante a pequenas variações da mensagem do usuário
+(minúsculas, sem acentos/pontuação, sem palavras vazias, ordem irrelevante) combinada
+com os documentos recuperados. Aberturas repetidas ("sofri racismo no trabalho")
+são respondidas sem nova chamada ao modelo.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.kb_index import tokenize
+from app.services.kv_store import KVStore, make_store
+
+
+_STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "da", "das", "de", "do", "dos", "e", "em", "eu", "me", "meu",
+    "minha", "na", "nas", "no", "nos", "o", "os", "ou", "para", "pela", "pelas", "pelo", "pelos",
+    "por", "pra", "que", "se", "um", "uma", "foi", "fui", "estou", "ele", "ela", "isso", "esta",
+}
+
+
+def fingerprint(user_message: str, documents: List[Dict[str, Any]]) -> str:
+    terms = sorted({t for t in tokenize(user_message) if t not in _STOPWORDS})
+    doc_ids = sorted(str(d.get("title") or "") for d in documents)
+    raw = " ".join(terms) + "\x1f" + "\x1e".join(doc_ids)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def get_clarify_cache() -> KVStore:
+    return make_store(
+        settings.CLARIFY_CACHE_BACKEND,
+        namespace="clarify",
+        max_entries=settings.CLARIFY_CACHE_MAX_ENTRIES,
+        ttl_s=settings.CLARIFY_CACHE_TTL_SEC,
+        sqlite_path=settings.CACHE_SQLITE_PATH,
+    )
+
+
+def clarify_cache_key(user_message: str, documents: List[Dict[str, Any]]) -> Optional[str]:
+    """Chave do cache, ou None se o cache estiver desativado."""
+    if not settings.CLARIFY_CACHE_ENABLED:
+        return None
+    return "clarify:" + fingerprint(user_message, documents)
+
+
+def clarify_cache_stats() -> Dict[str, Any]:
+    if not settings.CLARIFY_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_clarify_cache().stats()}
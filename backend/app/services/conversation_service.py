@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from sqlmodel import select
 
 from app.models.conversation import Conversation, Message
+from app.services.timing import timed
 
 
 class ConversationService:
@@ -13,6 +14,7 @@ class ConversationService:
         self.db = db
 
     # Conversations
+    @timed("db_create_conversation")
     def create_conversation(self, guest_id: str, title: Optional[str]) -> Conversation:
         conv = Conversation(guest_id=guest_id, title=title)
         self.db.add(conv)
@@ -20,15 +22,18 @@ class ConversationService:
         self.db.refresh(conv)
         return conv
 
+    @timed("db_list_conversations")
     def list_conversations(self, guest_id: str) -> List[Conversation]:
         stmt = select(Conversation).where(Conversation.guest_id == guest_id).order_by(Conversation.created_at.desc())
         return list(self.db.scalars(stmt))
 
+    @timed("db_get_conversation")
     def get_conversation(self, conv_id: int, guest_id: str) -> Optional[Conversation]:
         stmt = select(Conversation).where(Conversation.id == conv_id, Conversation.guest_id == guest_id)
         return self.db.scalar(stmt)
 
     # Messages
+    @timed("db_add_message")
     def add_message(self, conversation_id: int, role: str, content: str) -> Message:
         msg = Message(conversation_id=conversation_id, role=role, content=content)
         self.db.add(msg)
@@ -36,6 +41,7 @@ class ConversationService:
         self.db.refresh(msg)
         return msg
 
+    @timed("db_list_messages")
     def list_messages(self, conversation_id: int) -> List[Message]:
         stmt = select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at.asc())
         return list(self.db.scalars(stmt))
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Artefato binário pré-compilado da KB (índice BM25 + documentos), mapeado em memória.
+
+Características:
+- Compilado offline: `python -m app.services.kb_artifact [--kb-dir DIR] [--out ARQUIVO]`
+- Guarda vocabulário (IDs de termos), postings, idf, texto normalizado e metadados dos documentos
+- Aberto com mmap em modo leitura: os workers do uvicorn compartilham as mesmas páginas
+- Considerado obsoleto se qualquer JSON de origem mudou (mtime/tamanho); nesse caso volta-se ao JSON
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.kb_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"KBIDX\x00\x00\x01"
+FORMAT_VERSION = 1
+ARTIFACT_FILENAME = "kb_index.bin"
+_ALIGN = 8
+
+
+class KBArtifactError(RuntimeError):
+    pass
+
+
+# --------------------------- Manifesto das fontes ---------------------------
+def source_manifest(kb_dir: str) -> Dict[str, List[int]]:
+    """{caminho relativo: [mtime_ns, tamanho]} de cada JSON da KB (apenas stat, sem parsing)."""
+    manifest: Dict[str, List[int]] = {}
+    for path in glob.glob(os.path.join(kb_dir, "**", "*.json"), recursive=True):
+        st = os.stat(path)
+        manifest[os.path.relpath(path, kb_dir)] = [st.st_mtime_ns, st.st_size]
+    return manifest
+
+
+def _build_options() -> Dict[str, Any]:
+    # Opções que alteram o conteúdo do índice; mudanças invalidam o artefato
+    return {"kb_chunk_articles": bool(settings.KB_CHUNK_ARTICLES)}
+
+
+def default_artifact_path(kb_dir: str) -> str:
+    return settings.KB_INDEX_PATH or os.path.join(kb_dir, ARTIFACT_FILENAME)
+
+
+# --------------------------- Escrita ---------------------------
+def write_artifact(index: BM25Index, out_path: str, *, manifest: Dict[str, List[int]]) -> None:
+    """Serializa o índice em um único arquivo binário (escrita atômica via rename)."""
+    vocab = sorted(index.postings)
+    term_blob = bytearray()
+    term_offsets = array("Q", [0])
+    term_ptr = array("Q", [0])
+    post_docs = array("I")
+    post_weights = array("f")
+    idf = array("f")
+    for term in vocab:
+        term_blob += term.encode("utf-8")
+        term_offsets.append(len(term_blob))
+        for doc_id, wtf in index.postings[term]:
+            post_docs.append(doc_id)
+            post_weights.append(wtf)
+        term_ptr.append(len(post_docs))
+        idf.append(index.idf[term])
+
+    doc_blob = bytearray()
+    doc_offsets = array("Q", [0])
+    for doc in index.docs:
+        doc_blob += json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        doc_offsets.append(len(doc_blob))
+
+    sections: List[Tuple[str, str, bytes]] = [
+        ("term_blob", "B", bytes(term_blob)),
+        ("term_offsets", "Q", term_offsets.tobytes()),
+        ("term_ptr", "Q", term_ptr.tobytes()),
+        ("post_docs", "I", post_docs.tobytes()),
+        ("post_weights", "f", post_weights.tobytes()),
+        ("idf", "f", idf.tobytes()),
+        ("tiebreak", "d", array("d", index.tiebreak).tobytes()),
+        ("fallback_order", "I", array("I", index.fallback_order).tobytes()),
+        ("doc_blob", "B", bytes(doc_blob)),
+        ("doc_offsets", "Q", doc_offsets.tobytes()),
+    ]
+
+    header: Dict[str, Any] = {
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "built_at": time.time(),
+        "manifest": manifest,
+        "options": _build_options(),
+        "params": {"k1": index.k1, "b": index.b, "field_weights": index.field_weights},
+        "n_docs": len(index.docs),
+        "n_terms": len(vocab),
+        "sections": {},
+    }
+    # Offsets são relativos ao início da área de dados (após o cabeçalho)
+    offset = 0
+    for name, typecode, payload in sections:
+        header["sections"][name] = [offset, len(payload), typecode]
+        offset += len(payload) + (-len(payload) % _ALIGN)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    header_bytes += b" " * (-(len(MAGIC) + 4 + len(header_bytes)) % _ALIGN)
+
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for _, _, payload in sections:
+            f.write(payload)
+            f.write(b"\x00" * (-len(payload) % _ALIGN))
+    os.replace(tmp_path, out_path)
+
+
+def build_artifact(kb_dir: str, out_path: Optional[str] = None) -> str:
+    """Parseia a KB (JSON), constrói o índice BM25 e grava o artefato. Retorna o caminho."""
+    # Import local: legal_agent importa este módulo para carregar o artefato
+    from app.services.legal_agent import _parse_date, load_kb_from_dir
+
+    out_path = out_path or default_artifact_path(kb_dir)
+    manifest = source_manifest(kb_dir)
+    docs = load_kb_from_dir(kb_dir)
+    if not docs:
+        raise KBArtifactError(f"Nenhum documento encontrado em {kb_dir}")
+    index = BM25Index(docs, tiebreak=[_parse_date(d.get("updated_at")) for d in docs])
+    write_artifact(index, out_path, manifest=manifest)
+    return out_path
+
+
+# --------------------------- Leitura (mmap) ---------------------------
+class MappedDocs(Sequence[Dict[str, Any]]):
+    """Documentos da KB decodificados sob demanda a partir do mmap."""
+
+    def __init__(self, blob: memoryview, offsets: memoryview) -> None:
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):  # type: ignore[override]
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return json.loads(bytes(self._blob[start:end]).decode("utf-8"))
+
+
+class MappedBM25Index(BM25Index):
+    """Mesma interface de BM25Index, lendo postings diretamente do artefato mapeado."""
+
+    def __init__(self, path: str) -> None:  # noqa: D401 - não chama BM25Index.__init__
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mmap)
+        if bytes(buf[: len(MAGIC)]) != MAGIC:
+            raise KBArtifactError(f"Arquivo não é um artefato da KB: {path}")
+        (header_len,) = struct.unpack_from("<I", buf, len(MAGIC))
+        data_start = len(MAGIC) + 4 + header_len
+        self.header: Dict[str, Any] = json.loads(bytes(buf[len(MAGIC) + 4 : data_start]).decode("utf-8"))
+        if self.header.get("version") != FORMAT_VERSION or self.header.get("byteorder") != sys.byteorder:
+            raise KBArtifactError("Versão/endianness do artefato incompatível")
+
+        def section(name: str) -> memoryview:
+            off, length, typecode = self.header["sections"][name]
+            view = buf[data_start + off : data_start + off + length]
+            return view if typecode == "B" else view.cast(typecode)
+
+        self.path = path
+        params = self.header["params"]
+        self.k1 = float(params["k1"])
+        self.b = float(params["b"])
+        self.field_weights = dict(params["field_weights"])
+        self._term_blob = section("term_blob")
+        self._term_offsets = section("term_offsets")
+        self._term_ptr = section("term_ptr")
+        self._post_docs = section("post_docs")
+        self._post_weights = section("post_weights")
+        self._idf = section("idf")
+        self.tiebreak = section("tiebreak")  # type: ignore[assignment]
+        self.fallback_order = section("fallback_order")  # type: ignore[assignment]
+        self.docs = MappedDocs(section("doc_blob"), section("doc_offsets"))  # type: ignore[assignment]
+        self.postings = {}
+        self.idf = {}
+
+    def _term_id(self, term: str) -> Optional[int]:
+        """Busca binária no vocabulário ordenado (bytes UTF-8), sem dicionário por worker."""
+        key = term.encode("utf-8")
+        lo, hi = 0, len(self._term_offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = bytes(self._term_blob[self._term_offsets[mid] : self._term_offsets[mid + 1]])
+            if cur < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._term_offsets) - 1:
+            cur = bytes(self._term_blob[self._term_offsets[lo] : self._term_offsets[lo + 1]])
+            if cur == key:
+                return lo
+        return None
+
+    def _lookup(self, term: str) -> Optional[Tuple[float, Iterable[Tuple[int, float]]]]:
+        tid = self._term_id(term)
+        if tid is None:
+            return None
+        start, end = self._term_ptr[tid], self._term_ptr[tid + 1]
+        return self._idf[tid], zip(self._post_docs[start:end], self._post_weights[start:end])
+
+    def is_fresh(self, kb_dir: str) -> bool:
+        return (
+            self.header.get("manifest") == source_manifest(kb_dir)
+            and self.header.get("options") == _build_options()
+        )
+
+
+def load_artifact(kb_dir: str, path: Optional[str] = None) -> Optional[MappedBM25Index]:
+    """Abre o artefato se existir e estiver atualizado em relação aos JSON; senão retorna None."""
+    path = path or default_artifact_path(kb_dir)
+    if not os.path.isfile(path):
+        return None
+    try:
+        index = MappedBM25Index(path)
+    except Exception:
+        logger.exception("Falha ao abrir o artefato da KB '%s'; usando JSON", path)
+        return None
+    if not index.is_fresh(kb_dir):
+        logger.warning("Artefato da KB '%s' desatualizado em relação a %s; usando JSON", path, kb_dir)
+        return None
+    return index
+
+
+# --------------------------- CLI ---------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.services.legal_agent import resolve_kb_dir
+
+    parser = argparse.ArgumentParser(description="Compila a KB em um artefato binário mapeável em memória.")
+    parser.add_argument("--kb-dir", default=None, help="Diretório dos JSON (padrão: mesmo da API)")
+    parser.add_argument("--out", default=None, help=f"Arquivo de saída (padrão: <kb-dir>/{ARTIFACT_FILENAME})")
+    args = parser.parse_args(argv)
+
+    kb_dir = args.kb_dir or resolve_kb_dir()
+    started = time.perf_counter()
+    out_path = build_artifact(kb_dir, args.out)
+    index = MappedBM25Index(out_path)
+    print(
+        f"[kb] {len(index.docs)} documentos, {index.header['n_terms']} termos -> {out_path} "
+        f"({os.path.getsize(out_path)} bytes, {time.perf_counter() - started:.2f}s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Índice invertido BM25 para a base de conhecimento (KB).
+
+Características:
+- Construído uma única vez a partir da lista de documentos da KB
+- Pontuação BM25F: corpo (_fulltext), título e tags com pesos por campo
+- Custo da busca proporcional às postings dos termos da consulta, não ao tamanho da KB
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Pesos por campo (BM25F). O corpo já contém título e tags, então os pesos
+# abaixo funcionam como boosts adicionais, no mesmo espírito do score antigo.
+DEFAULT_FIELD_WEIGHTS: Dict[str, float] = {
+    "body": 1.0,
+    "title": 0.5,
+    "tags": 0.25,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, remoção de acentos e quebra em palavras (inclui '_' como separador)."""
+    s = unicodedata.normalize("NFKD", (text or "").lower())
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return [t for t in re.split(r"[\W_]+", s, flags=re.UNICODE) if t]
+
+
+def doc_fields(doc: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Tokens por campo de um documento (reaproveitável entre reconstruções do índice)."""
+    tags = doc.get("tags") or []
+    return {
+        "body": tokenize(doc.get("_fulltext") or doc.get("content") or ""),
+        "title": tokenize(str(doc.get("title") or "")),
+        "tags": tokenize(" ".join(map(str, tags))),
+    }
+
+
+class BM25Index:
+    """Índice invertido com pontuação BM25F.
+
+    As postings guardam, por termo, o tf já ponderado por campo e normalizado pelo
+    comprimento (tf~ do BM25F); na consulta resta apenas aplicar idf e saturação.
+    """
+
+    def __init__(
+        self,
+        docs: Sequence[Dict[str, Any]],
+        *,
+        k1: float = 1.2,
+        b: float = 0.75,
+        field_weights: Optional[Dict[str, float]] = None,
+        tiebreak: Optional[Sequence[float]] = None,
+        fields: Optional[Sequence[Dict[str, List[str]]]] = None,
+    ) -> None:
+        self.docs = list(docs)
+        self.k1 = k1
+        self.b = b
+        self.field_weights = dict(field_weights or DEFAULT_FIELD_WEIGHTS)
+        # Critério de desempate (ex.: data de atualização); maior vence
+        self.tiebreak: List[float] = list(tiebreak) if tiebreak is not None else [0.0] * len(self.docs)
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        self.idf: Dict[str, float] = {}
+        self._build(fields)
+        # Ordem usada para completar o top-k quando há poucos documentos com score
+        self.fallback_order: List[int] = sorted(
+            range(len(self.docs)), key=lambda i: self.tiebreak[i], reverse=True
+        )
+
+    def _build(self, fields: Optional[Sequence[Dict[str, List[str]]]] = None) -> None:
+        n = len(self.docs)
+        if n == 0:
+            return
+        fields_per_doc = list(fields) if fields is not None else [doc_fields(d) for d in self.docs]
+        avg_len = {
+            f: (sum(len(fs[f]) for fs in fields_per_doc) / n) or 1.0 for f in self.field_weights
+        }
+
+        acc: Dict[str, Dict[int, float]] = {}
+        for doc_id, fields in enumerate(fields_per_doc):
+            for field, toks in fields.items():
+                weight = self.field_weights.get(field, 0.0)
+                if not weight or not toks:
+                    continue
+                norm = 1.0 - self.b + self.b * (len(toks) / avg_len[field])
+                for term, tf in Counter(toks).items():
+                    plist = acc.setdefault(term, {})
+                    plist[doc_id] = plist.get(doc_id, 0.0) + weight * tf / norm
+
+        self.postings = {term: sorted(plist.items()) for term, plist in acc.items()}
+        self.idf = {
+            term: math.log(1.0 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _lookup(self, term: str) -> Optional[Tuple[float, Iterable[Tuple[int, float]]]]:
+        """(idf, postings) do termo, ou None se fora do vocabulário."""
+        plist = self.postings.get(term)
+        if not plist:
+            return None
+        return self.idf[term], plist
+
+    def score(self, query: str) -> Dict[int, float]:
+        """Retorna {doc_id: score} apenas para documentos presentes nas postings da consulta."""
+        scores: Dict[int, float] = {}
+        k1 = self.k1
+        for term in set(tokenize(query)):
+            found = self._lookup(term)
+            if found is None:
+                continue
+            idf, plist = found
+            for doc_id, wtf in plist:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * wtf * (k1 + 1.0) / (k1 + wtf)
+        return scores
+
+    def search(self, query: str, k: int = 5, *, pad: bool = True) -> List[Tuple[int, float]]:
+        """Top-k (doc_id, score). Com `pad`, completa com os documentos mais recentes."""
+        if k <= 0:
+            return []
+        scores = self.score(query)
+        top = heapq.nlargest(k, scores.items(), key=lambda it: (it[1], self.tiebreak[it[0]]))
+        if pad and len(top) < k:
+            for doc_id in self.fallback_order:
+                if len(top) >= k:
+                    break
+                if doc_id not in scores:
+                    top.append((doc_id, 0.0))
+        return top
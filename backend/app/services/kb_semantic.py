@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Recuperação semântica local (LSA: TF-IDF + SVD truncada), sem rede.
+
+Características:
+- Ajustado offline sobre os documentos da KB: `python -m app.services.kb_semantic`
+- Matriz de documentos (N x d) e projeção dos termos (V x d) salvas em float32 `.npy`
+  e abertas com mmap (páginas compartilhadas entre workers)
+- Consulta = soma das linhas dos termos + um único produto matriz-vetor contra os documentos
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.kb_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+SEMANTIC_DIRNAME = "kb_semantic"
+
+
+def doc_key(doc: Dict[str, Any]) -> str:
+    """Identificador estável do documento para alinhar as linhas da matriz ao snapshot."""
+    return str(doc.get("id") or f"{doc.get('title')}|{doc.get('url')}")
+
+
+def default_semantic_dir(kb_dir: str) -> str:
+    return settings.KB_SEMANTIC_DIR or os.path.join(kb_dir, SEMANTIC_DIRNAME)
+
+
+class LSAModel:
+    """Espaço latente LSA. Documentos e consultas são projetados em `dim` dimensões
+    e comparados por cosseno."""
+
+    def __init__(self, vocab: List[str], term_vectors: np.ndarray, doc_vectors: np.ndarray, doc_keys: List[str]):
+        self.vocab = vocab
+        self.term_vectors = term_vectors  # (V, d), já multiplicado pelo idf
+        self.doc_vectors = doc_vectors  # (N, d), linhas normalizadas (L2)
+        self.doc_keys = doc_keys
+        self._term_index = {t: i for i, t in enumerate(vocab)}
+
+    @property
+    def dim(self) -> int:
+        return int(self.doc_vectors.shape[1]) if self.doc_vectors.ndim == 2 else 0
+
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        counts = Counter(t for t in tokenize(query) if t in self._term_index)
+        if not counts:
+            return None
+        ids = np.fromiter((self._term_index[t] for t in counts), dtype=np.int64, count=len(counts))
+        tf = np.fromiter((1.0 + math.log(c) for c in counts.values()), dtype=np.float32, count=len(counts))
+        vec = tf @ self.term_vectors[ids]
+        norm = float(np.linalg.norm(vec))
+        if norm == 0.0:
+            return None
+        return (vec / norm).astype(np.float32, copy=False)
+
+    def scores(self, query: str) -> Optional[np.ndarray]:
+        """Cosseno da consulta contra todos os documentos (um produto matriz-vetor)."""
+        q = self.embed_query(query)
+        if q is None:
+            return None
+        return self.doc_vectors @ q
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        sims = self.scores(query)
+        if sims is None or k <= 0:
+            return []
+        k = min(k, sims.shape[0])
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(i), float(sims[i])) for i in top]
+
+    # --------------------------- Persistência ---------------------------
+    def save(self, directory: str, *, manifest: Dict[str, List[int]], options: Dict[str, Any]) -> None:
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "docs.npy"), np.ascontiguousarray(self.doc_vectors, dtype=np.float32))
+        np.save(os.path.join(directory, "terms.npy"), np.ascontiguousarray(self.term_vectors, dtype=np.float32))
+        meta = {
+            "version": FORMAT_VERSION,
+            "built_at": time.time(),
+            "manifest": manifest,
+            "options": options,
+            "dim": self.dim,
+            "vocab": self.vocab,
+            "doc_keys": self.doc_keys,
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str) -> Tuple["LSAModel", Dict[str, Any]]:
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError("Versão do modelo semântico incompatível")
+        docs = np.load(os.path.join(directory, "docs.npy"), mmap_mode="r")
+        terms = np.load(os.path.join(directory, "terms.npy"), mmap_mode="r")
+        return cls(meta["vocab"], terms, docs, meta["doc_keys"]), meta
+
+
+def fit_lsa(
+    docs: Sequence[Dict[str, Any]],
+    *,
+    dim: int = 128,
+    min_df: int = 1,
+    max_features: int = 20000,
+) -> LSAModel:
+    """TF-IDF (tf sublinear, idf suavizado) seguido de SVD truncada.
+
+    A matriz TF-IDF fica esparsa (linhas com índices/pesos) e a SVD é aleatorizada (Halko
+    et al.), só com produtos esparsos: a memória cresce com (N + V) x dim, sem matriz
+    densa N x V nem Gram N x N / V x V.
+    """
+    toks_per_doc = [Counter(tokenize(d.get("_fulltext") or d.get("content") or "")) for d in docs]
+    n = len(docs)
+    df: Counter = Counter()
+    for counts in toks_per_doc:
+        df.update(counts.keys())
+    terms = [t for t, c in df.items() if c >= min_df]
+    terms = sorted(sorted(terms, key=lambda t: -df[t])[:max_features])
+    term_index = {t: i for i, t in enumerate(terms)}
+    idf = np.array([math.log((1 + n) / (1 + df[t])) + 1.0 for t in terms], dtype=np.float32)
+
+    # TF-IDF esparso por linha (índices dos termos, pesos normalizados L2): a matriz densa
+    # N x V nunca é montada (com milhares de trechos e 20k termos passaria de centenas de MB)
+    rows: List[Tuple[np.ndarray, np.ndarray]] = []
+    for counts in toks_per_doc:
+        cols = np.fromiter((term_index[t] for t in counts if t in term_index), dtype=np.int64)
+        tf = np.fromiter((1.0 + math.log(c) for t, c in counts.items() if t in term_index), dtype=np.float32)
+        vals = tf * idf[cols]
+        norm = float(np.linalg.norm(vals))
+        rows.append((cols, vals / norm if norm else vals))
+
+    v = len(terms)
+    dim = max(1, min(dim, n, v))
+    basis = _top_right_singular_vectors(rows, _columns(rows, v), n, v, dim)
+
+    doc_vectors = _sparse_matmul(rows, basis, n)
+    doc_norms = np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+    doc_vectors /= np.where(doc_norms == 0, 1.0, doc_norms)
+    term_vectors = basis * idf[:, None]
+    return LSAModel(terms, term_vectors, doc_vectors.astype(np.float32), [doc_key(d) for d in docs])
+
+
+def _columns(rows: Sequence[Tuple[np.ndarray, np.ndarray]], n_terms: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Transpõe as linhas esparsas: para cada termo, (documentos, pesos)."""
+    if not rows:
+        return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))] * n_terms
+    doc_ids = np.concatenate([np.full(cols.size, i, dtype=np.int64) for i, (cols, _) in enumerate(rows)])
+    cols = np.concatenate([c for c, _ in rows])
+    vals = np.concatenate([v for _, v in rows])
+    order = np.argsort(cols, kind="stable")
+    bounds = np.searchsorted(cols[order], np.arange(n_terms + 1))
+    return [(doc_ids[order[a:b]], vals[order[a:b]]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _sparse_matmul(rows: Sequence[Tuple[np.ndarray, np.ndarray]], m: np.ndarray, n_out: int) -> np.ndarray:
+    """Produto de uma matriz esparsa (lista de linhas) por uma densa: (n_out x k)."""
+    out = np.zeros((n_out, m.shape[1]), dtype=np.float32)
+    for i, (idx, vals) in enumerate(rows):
+        if idx.size:
+            out[i] = vals @ m[idx]
+    return out
+
+
+def _top_right_singular_vectors(
+    rows: Sequence[Tuple[np.ndarray, np.ndarray]],
+    columns: Sequence[Tuple[np.ndarray, np.ndarray]],
+    n: int,
+    v: int,
+    dim: int,
+    *,
+    power_iters: int = 7,
+) -> np.ndarray:
+    """V (v x dim) da SVD truncada de X por iteração de subespaço aleatorizada.
+
+    Com sobreamostragem (k = 2·dim) e algumas iterações de potência, o subespaço dominante
+    converge; se k cobre min(N, V), o resultado é exato. Semente fixa: ajustes reprodutíveis.
+    """
+    k = min(n, v, 2 * dim + 8)
+    rng = np.random.default_rng(0)
+    omega = rng.standard_normal((v, k)).astype(np.float32)
+    q, _ = np.linalg.qr(_sparse_matmul(rows, omega, n))
+    for _ in range(power_iters):
+        z, _ = np.linalg.qr(_sparse_matmul(columns, q, v))
+        q, _ = np.linalg.qr(_sparse_matmul(rows, z, n))
+    # B = Qᵀ X (k x V, pequena): seus vetores singulares à direita são os de X
+    b = _sparse_matmul(columns, q, v).T
+    _u, _s, vt = np.linalg.svd(b, full_matrices=False)
+    return np.ascontiguousarray(vt[:dim].T, dtype=np.float32)
+
+
+def _build_options() -> Dict[str, Any]:
+    return {"dim": int(settings.RAG_SEMANTIC_DIM), "kb_chunk_articles": bool(settings.KB_CHUNK_ARTICLES)}
+
+
+def load_or_fit(
+    kb_dir: str, docs: Sequence[Dict[str, Any]], manifest: Dict[str, List[int]]
+) -> Optional[LSAModel]:
+    """Usa o modelo pré-computado se corresponder aos documentos atuais; senão ajusta em memória."""
+    keys = [doc_key(d) for d in docs]
+    directory = default_semantic_dir(kb_dir)
+    if os.path.isfile(os.path.join(directory, "meta.json")):
+        try:
+            model, meta = LSAModel.load(directory)
+            if meta.get("manifest") == manifest and meta.get("options") == _build_options() and model.doc_keys == keys:
+                return model
+            logger.warning("Modelo semântico em '%s' desatualizado; ajustando em memória", directory)
+        except Exception:
+            logger.exception("Falha ao abrir o modelo semântico em '%s'", directory)
+    if not docs:
+        return None
+    return fit_lsa(docs, dim=settings.RAG_SEMANTIC_DIM)
+
+
+# --------------------------- CLI ---------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.services.kb_artifact import source_manifest
+    from app.services.legal_agent import load_kb_from_dir, resolve_kb_dir
+
+    parser = argparse.ArgumentParser(description="Ajusta o modelo LSA da KB e salva as matrizes .npy.")
+    parser.add_argument("--kb-dir", default=None, help="Diretório dos JSON (padrão: mesmo da API)")
+    parser.add_argument("--out", default=None, help=f"Diretório de saída (padrão: <kb-dir>/{SEMANTIC_DIRNAME})")
+    parser.add_argument("--dim", type=int, default=None, help="Dimensões latentes (padrão: RAG_SEMANTIC_DIM)")
+    args = parser.parse_args(argv)
+    if args.dim:
+        settings.RAG_SEMANTIC_DIM = args.dim
+
+    kb_dir = args.kb_dir or resolve_kb_dir()
+    started = time.perf_counter()
+    manifest = source_manifest(kb_dir)
+    docs = load_kb_from_dir(kb_dir)
+    model = fit_lsa(docs, dim=settings.RAG_SEMANTIC_DIM)
+    out_dir = args.out or default_semantic_dir(kb_dir)
+    model.save(out_dir, manifest=manifest, options=_build_options())
+    print(
+        f"[kb] LSA {model.doc_vectors.shape[0]}x{model.dim} ({len(model.vocab)} termos) -> {out_dir} "
+        f"({time.perf_counter() - started:.2f}s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
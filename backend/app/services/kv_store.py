@@ -0,0 +1,236 @@
+"""
+Armazenamento chave-valor com TTL por entrada e limite de tamanho (LRU).
+
+Implementações:
+- MemoryTTLStore: OrderedDict em processo, protegido por lock
+- SQLiteTTLStore: arquivo SQLite em modo WAL, compartilhável entre workers/processos
+
+Valores devem ser serializáveis em JSON (o backend SQLite os persiste assim). No SQLite o
+limite é verificado a cada `prune_every` escritas (não a cada uma), então a tabela pode
+passar do limite por algumas entradas entre verificações.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class KVStore(ABC):
+    """Interface comum. `ttl_s` <= 0 significa sem expiração."""
+
+    backend = "base"
+
+    def __init__(self, *, max_entries: int = 1024, ttl_s: float = 3600.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self._stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def _expires_at(self, ttl_s: Optional[float]) -> float:
+        ttl = self.ttl_s if ttl_s is None else float(ttl_s)
+        return time.time() + ttl if ttl > 0 else 0.0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, *, ttl_s: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            out: Dict[str, Any] = dict(self._stats)
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        out["size"] = len(self)
+        out["max_entries"] = self.max_entries
+        out["ttl_s"] = self.ttl_s
+        out["backend"] = self.backend
+        return out
+
+
+class MemoryTTLStore(KVStore):
+    backend = "memory"
+
+    def __init__(self, *, max_entries: int = 1024, ttl_s: float = 3600.0) -> None:
+        super().__init__(max_entries=max_entries, ttl_s=ttl_s)
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._count("misses")
+                return None
+            expires_at, value = item
+            if expires_at and expires_at < time.time():
+                del self._data[key]
+                self._count("expirations")
+                self._count("misses")
+                return None
+            self._data.move_to_end(key)
+        self._count("hits")
+        return value
+
+    def set(self, key: str, value: Any, *, ttl_s: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (self._expires_at(ttl_s), value)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        self._count("sets")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteTTLStore(KVStore):
+    """Tabela por namespace; WAL permite leitores concorrentes com um escritor entre processos."""
+
+    backend = "sqlite"
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        namespace: str = "kv",
+        max_entries: int = 1024,
+        ttl_s: float = 3600.0,
+        prune_every: Optional[int] = None,
+    ) -> None:
+        super().__init__(max_entries=max_entries, ttl_s=ttl_s)
+        self.path = path
+        # COUNT(*) percorre a tabela: o limite é conferido só a cada N escritas (≈10% de folga)
+        self.prune_every = max(1, prune_every if prune_every is not None else min(64, self.max_entries // 10))
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self.table = "kv_" + re.sub(r"[^A-Za-z0-9_]", "_", namespace)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_lru ON {self.table} (last_access)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # Uma conexão por thread (sqlite3 não compartilha conexões entre threads por padrão)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._conn()
+        row = conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        value, expires_at = row
+        now = time.time()
+        if expires_at and expires_at < now:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._count("expirations")
+            self._count("misses")
+            return None
+        conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, *, ttl_s: Optional[float] = None) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), self._expires_at(ttl_s), now),
+        )
+        self._count("sets")
+        with self._writes_lock:
+            self._writes += 1
+            if self._writes < self.prune_every:
+                return
+            self._writes = 0
+        self._prune(conn, now)
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            # Remove expirados primeiro; depois os menos usados recentemente
+            cur = conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at > 0 AND expires_at < ?", (now,)
+            )
+            self._count("expirations", max(cur.rowcount, 0))
+            overflow = len(self) - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self._count("evictions", overflow)
+
+    def delete(self, key: str) -> None:
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._conn().execute(f"DELETE FROM {self.table}")
+
+    def __len__(self) -> int:
+        (n,) = self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        return int(n)
+
+
+def make_store(
+    backend: str,
+    *,
+    namespace: str,
+    max_entries: int,
+    ttl_s: float,
+    sqlite_path: Optional[str] = None,
+) -> KVStore:
+    """Fábrica usada pelos serviços: 'memory' (padrão) ou 'sqlite'."""
+    if (backend or "memory").strip().lower() == "sqlite":
+        return SQLiteTTLStore(
+            sqlite_path or "./app_cache.sqlite3", namespace=namespace, max_entries=max_entries, ttl_s=ttl_s
+        )
+    return MemoryTTLStore(max_entries=max_entries, ttl_s=ttl_s)
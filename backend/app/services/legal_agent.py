@@ -4,25 +4,33 @@ Serviço do agente jurídico: RAG local simples + Cohere Chat.
 
 Características:
 - Base de conhecimento em JSON (diretório configurável via settings.KB_DIR)
-- Recuperação por palavras-chave com boosts por título e tags
+- Recuperação por índice invertido BM25 (ou varredura por palavras-chave legada)
 - Geração de resposta via Cohere Command-R+ com documents
 """
 
 from __future__ import annotations
 
+import asyncio
 import glob
+import heapq
 import json
 import os
 import re
 from datetime import datetime
 from functools import lru_cache
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 import threading
-import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
 
-import cohere
 from app.core.config import settings
+from app.services.clarify_cache import clarify_cache_key, get_clarify_cache
 from app.services.final_prompt import build_final_prompt_v2
+from app.services.kb_artifact import load_artifact, source_manifest
+from app.services.kb_index import BM25Index, doc_fields
+from app.services.llm_limiter import get_bulkhead
+from app.services.timing import propagate, record, span, timed
 from textwrap import dedent
 
 
@@ -41,77 +49,252 @@ def _parse_date(s: Optional[str]) -> float:
 
 
 # --------------------------- Carregamento da KB ---------------------------
+def _join_lines(parts: List[str]) -> str:
+    return "\n".join([p for p in parts if p])
+
+
+def _incisos_text(node: Dict[str, Any]) -> List[str]:
+    lines: List[str] = []
+    for inc in node.get("incisos") or []:
+        if not isinstance(inc, dict):
+            continue
+        texto = str(inc.get("texto") or "").strip()
+        if texto:
+            lines.append(f"{inc.get('inciso') or ''} - {texto}".strip(" -"))
+    return lines
+
+
+def _pena_text(node: Dict[str, Any]) -> str:
+    pena = str(node.get("pena") or "").strip()
+    return f"Pena: {pena}." if pena else ""
+
+
+def _law_unit(
+    parent: Dict[str, Any],
+    *,
+    suffix: str,
+    anchor: Optional[str],
+    content: str,
+    kind: str,
+    tags_contexto: Optional[List[str]] = None,
+    pena_normalizada: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Unidade recuperável (artigo/parágrafo/trecho) ligada à lei de origem."""
+    ctx_tags = [str(t) for t in (tags_contexto or []) if t]
+    unit = {
+        "id": f"{parent['id']}:{suffix}",
+        "title": f"{parent['title']}, {suffix}",
+        "content": content,
+        "url": parent.get("url"),
+        "anchor": anchor,
+        "jurisdiction": "BR",
+        "updated_at": parent.get("updated_at"),
+        "tags": ctx_tags,
+        "kind": kind,
+        "parent_id": parent["id"],
+        "parent_title": parent["title"],
+    }
+    if pena_normalizada:
+        unit["pena_normalizada"] = pena_normalizada
+    unit["_fulltext"] = _normalize_text(
+        f"{unit['title']} {content} {' '.join(ctx_tags)} {' '.join(parent.get('tags', []))} BR"
+    )
+    return unit
+
+
+def _article_units(parent: Dict[str, Any], artigos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Uma unidade por artigo (caput + incisos) e uma por parágrafo/dispositivo alterado."""
+    units: List[Dict[str, Any]] = []
+    for art in artigos:
+        if not isinstance(art, dict) or (art.get("editorial") or {}).get("vetado"):
+            continue
+        num = str(art.get("artigo_num") or "").strip()
+        anchor = art.get("anchor") or (f"#art{num}" if num else None)
+        caput = str(art.get("caput") or "").strip()
+        art_label = f"Art. {num}" if num else "Art."
+        art_tags = art.get("tags_contexto") or []
+
+        head = caput if caput.lower().startswith("art.") else (f"{art_label}. {caput}" if caput else "")
+        body = _join_lines([head] + _incisos_text(art) + [_pena_text(art)])
+        if body:
+            units.append(
+                _law_unit(
+                    parent,
+                    suffix=f"art. {num}",
+                    anchor=anchor,
+                    content=body,
+                    kind="artigo",
+                    tags_contexto=art_tags,
+                    pena_normalizada=art.get("pena_normalizada"),
+                )
+            )
+
+        for par in art.get("paragrafos") or []:
+            if not isinstance(par, dict):
+                continue
+            label = str(par.get("paragrafo") or "").strip()
+            texto = str(par.get("texto") or "").strip()
+            content = _join_lines(
+                [head, f"{label}: {texto}" if texto else ""]
+                + _incisos_text(par)
+                + [_pena_text(par)]
+            )
+            units.append(
+                _law_unit(
+                    parent,
+                    suffix=f"art. {num}, {label}",
+                    anchor=par.get("anchor") or anchor,
+                    content=content,
+                    kind="paragrafo",
+                    tags_contexto=list(art_tags) + list(par.get("tags_contexto") or []),
+                    pena_normalizada=par.get("pena_normalizada"),
+                )
+            )
+
+        # Leis alteradoras (ex.: 14.532/2023) descrevem os dispositivos inseridos em outras leis
+        for disp in art.get("dispositivos_alterados_ou_inseridos") or []:
+            if not isinstance(disp, dict):
+                continue
+            destino = f"{disp.get('lei_destino') or ''}, art. {disp.get('artigo') or ''}".strip(", ")
+            paragrafos = [p for p in disp.get("paragrafos") or [] if isinstance(p, dict)]
+            texto = str(disp.get("texto") or "").strip()
+            if texto or not paragrafos:
+                units.append(
+                    _law_unit(
+                        parent,
+                        suffix=f"art. {num} ({destino})",
+                        anchor=disp.get("anchor") or anchor,
+                        content=_join_lines([f"{destino}: {texto}"] + _incisos_text(disp) + [_pena_text(disp)]),
+                        kind="dispositivo",
+                        tags_contexto=disp.get("tags_contexto"),
+                        pena_normalizada=disp.get("pena_normalizada"),
+                    )
+                )
+            for par in paragrafos:
+                label = str(par.get("paragrafo") or "").strip()
+                units.append(
+                    _law_unit(
+                        parent,
+                        suffix=f"art. {num} ({destino}, {label})",
+                        anchor=par.get("anchor") or disp.get("anchor") or anchor,
+                        content=_join_lines(
+                            [f"{destino}, {label}: {str(par.get('texto') or '').strip()}"]
+                            + _incisos_text(par)
+                            + [_pena_text(par)]
+                        ),
+                        kind="paragrafo",
+                        tags_contexto=list(disp.get("tags_contexto") or []) + list(par.get("tags_contexto") or []),
+                        pena_normalizada=par.get("pena_normalizada"),
+                    )
+                )
+    return units
+
+
+def _load_law_docs(item: Dict[str, Any], path: str) -> List[Dict[str, Any]]:
+    """JSON estruturado de leis (know_base).
+
+    Com KB_CHUNK_ARTICLES, emite um documento curto da lei (ementa) mais uma unidade por
+    artigo/parágrafo de `texto.artigos` e por item de `rag_chunks`; senão, um documento único.
+    """
+    md = item.get("metadados", {})
+    numero = str(md.get("numero") or "").strip()
+    ano = str(md.get("ano") or "").strip()
+    tipo = (md.get("tipo_ato") or "Lei").strip()
+    ementa = (md.get("ementa") or "").strip()
+    fonte = (md.get("fonte") or {}).get("fonte_oficial_url") if md.get("fonte") else None
+    versao = md.get("versao") or {}
+    updated_at = versao.get("ultima_atualizacao") or md.get("data_epigrafe")
+
+    conteudo_plano = (item.get("conteudo_plano") or "").strip()
+    rag_chunks = [c for c in item.get("rag_chunks") or [] if isinstance(c, dict)]
+    rag_text = " ".join([str(c.get("text", "")).strip() for c in rag_chunks])
+    chunked = settings.KB_CHUNK_ARTICLES
+    content = ementa if chunked else " \n ".join([c for c in [ementa, conteudo_plano, rag_text] if c])
+
+    title = (
+        f"{tipo} {numero}/{ano}".strip()
+        if (numero and ano)
+        else (md.get("titulo_oficial_raw") or os.path.basename(path))
+    )
+    tags = [
+        tipo.lower(),
+        numero,
+        ano,
+        f"{tipo} {numero}".strip(),
+    ]
+    if numero in {"7716", "12288", "14532"}:
+        tags.append("base_principal")
+
+    doc = {
+        "id": f"{tipo.lower()}_{numero}_{ano}" if (numero and ano) else os.path.basename(path),
+        "title": title,
+        "content": content,
+        "url": fonte,
+        "jurisdiction": "BR",
+        "updated_at": updated_at,
+        "tags": [t for t in tags if t],
+        "kind": "lei",
+    }
+    if chunked:
+        doc["_fulltext"] = _normalize_text(f"{doc['title']} {ementa} {' '.join(doc['tags'])} BR")
+    else:
+        doc["_fulltext"] = _normalize_text(
+            f"{doc['title']} {ementa} {conteudo_plano} {rag_text} {' '.join(doc['tags'])} BR"
+        )
+    if not chunked:
+        return [doc]
+
+    units = _article_units(doc, (item.get("texto") or {}).get("artigos") or [])
+    for c in rag_chunks:
+        text = str(c.get("text") or "").strip()
+        if not text:
+            continue
+        cid = str(c.get("id") or len(units))
+        units.append(
+            _law_unit(doc, suffix=f"trecho {cid}", anchor=c.get("anchor"), content=text, kind="trecho")
+        )
+    return [doc] + units
+
+
+def load_kb_file(path: str) -> List[Dict[str, Any]]:
+    docs: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    if isinstance(payload, dict):
+        payload = [payload]
+    for item in payload:
+        # Suporte a JSON estruturado de leis (know_base)
+        if isinstance(item, dict) and item.get("metadados"):
+            docs.extend(_load_law_docs(item, path))
+            continue
+
+        # Formato genérico
+        title = item.get("title") or os.path.basename(path)
+        content = item.get("content") or item.get("snippet") or ""
+        url = item.get("url")
+        jurisdiction = item.get("jurisdiction") or "BR"
+        updated_at = item.get("updated_at") or item.get("last_updated")
+        tags = item.get("tags") or []
+        docs.append(
+            {
+                "title": str(title),
+                "content": str(content),
+                "url": url,
+                "jurisdiction": jurisdiction,
+                "updated_at": updated_at,
+                "tags": tags,
+                "_fulltext": _normalize_text(f"{title} {content} {' '.join(tags)} {jurisdiction}"),
+            }
+        )
+    return docs
+
+
 def load_kb_from_dir(directory: str) -> List[Dict[str, Any]]:
     docs: List[Dict[str, Any]] = []
-    for path in glob.glob(os.path.join(directory, "**", "*.json"), recursive=True):
+    # Ordem determinística: o índice e a matriz semântica alinham documentos por posição
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*.json"), recursive=True)):
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                payload = json.load(f)
-                if isinstance(payload, dict):
-                    payload = [payload]
-                for item in payload:
-                    # Suporte a JSON estruturado de leis (know_base)
-                    if isinstance(item, dict) and item.get("metadados"):
-                        md = item.get("metadados", {})
-                        numero = str(md.get("numero") or "").strip()
-                        ano = str(md.get("ano") or "").strip()
-                        tipo = (md.get("tipo_ato") or "Lei").strip()
-                        ementa = (md.get("ementa") or "").strip()
-                        fonte = (md.get("fonte") or {}).get("fonte_oficial_url") if md.get("fonte") else None
-                        versao = md.get("versao") or {}
-                        updated_at = versao.get("ultima_atualizacao") or md.get("data_epigrafe")
-
-                        conteudo_plano = (item.get("conteudo_plano") or "").strip()
-                        rag_chunks = item.get("rag_chunks") or []
-                        rag_text = " ".join([str(c.get("text", "")).strip() for c in rag_chunks if c])
-                        content = " \n ".join([c for c in [ementa, conteudo_plano, rag_text] if c])
-
-                        title = (
-                            f"{tipo} {numero}/{ano}".strip()
-                            if (numero and ano)
-                            else (md.get("titulo_oficial_raw") or os.path.basename(path))
-                        )
-                        tags = [
-                            tipo.lower(),
-                            numero,
-                            ano,
-                            f"{tipo} {numero}".strip(),
-                        ]
-                        if numero in {"7716", "12288", "14532"}:
-                            tags.append("base_principal")
-
-                        doc = {
-                            "title": title,
-                            "content": content,
-                            "url": fonte,
-                            "jurisdiction": "BR",
-                            "updated_at": updated_at,
-                            "tags": [t for t in tags if t],
-                        }
-                        doc["_fulltext"] = _normalize_text(
-                            f"{doc['title']} {ementa} {conteudo_plano} {rag_text} {' '.join(doc['tags'])} BR"
-                        )
-                        docs.append(doc)
-                        continue
-
-                    # Formato genérico
-                    title = item.get("title") or os.path.basename(path)
-                    content = item.get("content") or item.get("snippet") or ""
-                    url = item.get("url")
-                    jurisdiction = item.get("jurisdiction") or "BR"
-                    updated_at = item.get("updated_at") or item.get("last_updated")
-                    tags = item.get("tags") or []
-                    docs.append(
-                        {
-                            "title": str(title),
-                            "content": str(content),
-                            "url": url,
-                            "jurisdiction": jurisdiction,
-                            "updated_at": updated_at,
-                            "tags": tags,
-                            "_fulltext": _normalize_text(f"{title} {content} {' '.join(tags)} {jurisdiction}"),
-                        }
-                    )
+            docs.extend(load_kb_file(path))
         except Exception:
             # Em produção, registrar erro de parsing
             pass
@@ -151,8 +334,7 @@ KB_FALLBACK: List[Dict[str, Any]] = [
 ]
 
 
-@lru_cache(maxsize=1)
-def get_kb_docs() -> List[Dict[str, Any]]:
+def resolve_kb_dir() -> str:
     # Resolve diretório da KB com fallback robusto
     candidates: List[str] = []
     if settings.KB_DIR:
@@ -168,11 +350,193 @@ def get_kb_docs() -> List[Dict[str, Any]]:
             os.path.abspath(os.path.join(os.getcwd(), "kb")),
         ]
     )
-    kb_dir = next((p for p in candidates if p and os.path.isdir(p)), settings.KB_DIR or "./kb")
-    docs = load_kb_from_dir(kb_dir)
+    return next((p for p in candidates if p and os.path.isdir(p)), settings.KB_DIR or "./kb")
+
+
+# --------------------------- Estado da KB (snapshot + hot reload) ---------------------------
+class KBSnapshot:
+    """Visão imutável da KB (documentos + índice). Cada recarga cria uma nova e a troca
+    atomicamente; requisições em andamento continuam usando a referência que já tinham."""
+
+    def __init__(
+        self,
+        docs: Sequence[Dict[str, Any]],
+        index: BM25Index,
+        *,
+        kb_dir: str,
+        source: str,
+        manifest: Dict[str, List[int]],
+        files: Optional[Dict[str, Tuple[List[int], List[Dict[str, Any]], List[Dict[str, List[str]]]]]] = None,
+        version: int = 1,
+        semantic: Optional[Any] = None,
+    ) -> None:
+        self.docs = docs
+        self.index = index
+        # Modelo LSA (kb_semantic.LSAModel) quando o recuperador semântico/híbrido está ativo
+        self.semantic = semantic
+        self.kb_dir = kb_dir
+        self.source = source  # 'artifact' | 'json' | 'fallback'
+        self.manifest = manifest
+        # Cache por arquivo (assinatura, documentos, tokens) para reindexação incremental
+        self.files = files or {}
+        self.version = version
+        self.loaded_at = time.time()
+        # As três fontes principais, calculadas uma vez por snapshot (não a cada requisição)
+        self.priority = [_to_rag_doc(d) for d in docs if _is_priority(d)]
+
+
+_KB_SNAPSHOT: Optional[KBSnapshot] = None
+_KB_BUILD_LOCK = threading.Lock()
+_KB_RELOAD: Dict[str, Any] = {"running": False, "last_error": None, "last_duration_s": None, "reloaded_files": []}
+
+
+def _build_kb_snapshot(previous: Optional[KBSnapshot]) -> KBSnapshot:
+    kb_dir = resolve_kb_dir()
+    version = (previous.version + 1) if previous else 1
+
+    artifact = load_artifact(kb_dir)
+    if artifact is not None:
+        _KB_RELOAD["reloaded_files"] = []
+        manifest = artifact.header.get("manifest") or {}
+        return KBSnapshot(
+            artifact.docs, artifact, kb_dir=kb_dir, source="artifact", manifest=manifest,
+            version=version, semantic=_load_semantic(kb_dir, artifact.docs, manifest),
+        )
+
+    # Reaproveita arquivos inalterados do snapshot anterior; só reparseia os JSON que mudaram
+    prev_files = previous.files if previous and previous.kb_dir == kb_dir else {}
+    manifest = source_manifest(kb_dir)
+    files: Dict[str, Tuple[List[int], List[Dict[str, Any]], List[Dict[str, List[str]]]]] = {}
+    reparsed: List[str] = []
+    for rel in sorted(manifest):
+        sig = manifest[rel]
+        cached = prev_files.get(rel)
+        if cached is not None and cached[0] == sig:
+            files[rel] = cached
+            continue
+        try:
+            file_docs = load_kb_file(os.path.join(kb_dir, rel))
+        except Exception:
+            # Em produção, registrar erro de parsing
+            file_docs = []
+        files[rel] = (sig, file_docs, [doc_fields(d) for d in file_docs])
+        reparsed.append(rel)
+    _KB_RELOAD["reloaded_files"] = reparsed
+
+    docs = [d for rel in sorted(files) for d in files[rel][1]]
+    fields = [f for rel in sorted(files) for f in files[rel][2]]
+    source = "json"
     if not docs:
-        return KB_FALLBACK
-    return docs
+        docs, fields, source = KB_FALLBACK, [doc_fields(d) for d in KB_FALLBACK], "fallback"
+    index = BM25Index(docs, tiebreak=[_parse_date(d.get("updated_at")) for d in docs], fields=fields)
+    return KBSnapshot(
+        docs, index, kb_dir=kb_dir, source=source, manifest=manifest, files=files, version=version,
+        semantic=_load_semantic(kb_dir, docs, manifest),
+    )
+
+
+def _load_semantic(kb_dir: str, docs: Sequence[Dict[str, Any]], manifest: Dict[str, List[int]]) -> Optional[Any]:
+    if _retriever_name() not in ("semantic", "hybrid"):
+        return None
+    # Import local: NumPy só é carregado quando o recuperador semântico está ativo
+    from app.services.kb_semantic import load_or_fit
+
+    try:
+        return load_or_fit(kb_dir, docs, manifest)
+    except Exception:
+        # Sem modelo semântico, rag_retrieve volta ao BM25
+        return None
+
+
+def get_kb_snapshot() -> KBSnapshot:
+    """Snapshot atual da KB. Só a primeira carga bloqueia; recargas nunca bloqueiam leitores."""
+    global _KB_SNAPSHOT
+    snap = _KB_SNAPSHOT
+    if snap is None:
+        with _KB_BUILD_LOCK:
+            if _KB_SNAPSHOT is None:
+                _KB_SNAPSHOT = _build_kb_snapshot(None)
+                if settings.KB_WATCH_INTERVAL_SEC > 0:
+                    start_kb_watcher(settings.KB_WATCH_INTERVAL_SEC)
+            snap = _KB_SNAPSHOT
+    return snap
+
+
+def reload_kb() -> KBSnapshot:
+    """Reconstrói a KB (incremental) e troca o snapshot atomicamente. Bloqueia o chamador."""
+    global _KB_SNAPSHOT
+    with _KB_BUILD_LOCK:
+        _KB_RELOAD["running"] = True
+        started = time.perf_counter()
+        try:
+            _KB_SNAPSHOT = _build_kb_snapshot(_KB_SNAPSHOT)
+            _KB_RELOAD["last_error"] = None
+        except Exception as e:
+            _KB_RELOAD["last_error"] = str(e)
+            raise
+        finally:
+            _KB_RELOAD["running"] = False
+            _KB_RELOAD["last_duration_s"] = round(time.perf_counter() - started, 4)
+        return _KB_SNAPSHOT
+
+
+def trigger_kb_reload() -> bool:
+    """Dispara a recarga em thread de fundo. Retorna False se já houver uma em andamento."""
+    if _KB_RELOAD["running"] or _KB_BUILD_LOCK.locked():
+        return False
+
+    def _worker():
+        try:
+            reload_kb()
+        except Exception:
+            pass  # erro fica registrado em _KB_RELOAD["last_error"]
+
+    threading.Thread(target=_worker, name="kb-reload", daemon=True).start()
+    return True
+
+
+def kb_status() -> Dict[str, Any]:
+    snap = _KB_SNAPSHOT
+    return {
+        "loaded": snap is not None,
+        "version": snap.version if snap else None,
+        "source": snap.source if snap else None,
+        "kb_dir": snap.kb_dir if snap else None,
+        "documents": len(snap.docs) if snap else 0,
+        "files": len(snap.manifest) if snap else 0,
+        "loaded_at": snap.loaded_at if snap else None,
+        "reloading": bool(_KB_RELOAD["running"]),
+        "last_reloaded_files": list(_KB_RELOAD["reloaded_files"]),
+        "last_duration_s": _KB_RELOAD["last_duration_s"],
+        "last_error": _KB_RELOAD["last_error"],
+    }
+
+
+_KB_WATCHER: Optional[threading.Thread] = None
+
+
+def start_kb_watcher(interval_s: float) -> None:
+    """Observa mtime/tamanho dos JSON da KB (apenas stat) e dispara recarga quando mudam."""
+    global _KB_WATCHER
+    if _KB_WATCHER is not None and _KB_WATCHER.is_alive():
+        return
+
+    def _watch():
+        while True:
+            time.sleep(interval_s)
+            snap = _KB_SNAPSHOT
+            try:
+                if snap is not None and source_manifest(snap.kb_dir) != snap.manifest:
+                    trigger_kb_reload()
+            except Exception:
+                pass
+
+    _KB_WATCHER = threading.Thread(target=_watch, name="kb-watcher", daemon=True)
+    _KB_WATCHER.start()
+
+
+def get_kb_docs() -> Sequence[Dict[str, Any]]:
+    return get_kb_snapshot().docs
 
 
 # --------------------------- RAG (keyword scoring) ---------------------------
@@ -200,8 +564,39 @@ def simple_keyword_score(query: str, doc: Dict[str, Any]) -> float:
     return score
 
 
-def rag_retrieve(query: str, k: int = 5) -> List[Dict[str, Any]]:
-    kb_docs = get_kb_docs()
+def _to_rag_doc(d: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": d["title"],
+        "snippet": d.get("content", "")[:1000],
+        "url": d.get("url"),
+        "jurisdiction": d.get("jurisdiction"),
+        "last_updated": d.get("updated_at"),
+        "tags": d.get("tags", []),
+        "anchor": d.get("anchor"),
+    }
+
+
+def _is_priority(doc: Dict[str, Any]) -> bool:
+    # Unidades (artigos/parágrafos) entram apenas pelo ranking, não como prioridade
+    if doc.get("parent_id"):
+        return False
+    t = (doc.get("title") or "").lower()
+    tags = [str(x).lower() for x in doc.get("tags", [])]
+    keys = ["7716", "12288", "14532"]
+    return any(k in t for k in keys) or any(any(k in tg for k in keys) for tg in tags)
+
+
+def get_kb_index() -> BM25Index:
+    """Índice BM25 do snapshot atual (artefato mapeado, se disponível)."""
+    return get_kb_snapshot().index
+
+
+def get_priority_docs() -> List[Dict[str, Any]]:
+    return get_kb_snapshot().priority
+
+
+def _rank_keyword(query: str, k: int, kb_docs: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Varredura linear legada: pontua e ordena todos os documentos da KB."""
     ranked = sorted(
         kb_docs,
         key=lambda d: (
@@ -210,37 +605,60 @@ def rag_retrieve(query: str, k: int = 5) -> List[Dict[str, Any]]:
         ),
         reverse=True,
     )
-    top = [
-        {
-            "title": d["title"],
-            "snippet": d.get("content", "")[:1000],
-            "url": d.get("url"),
-            "jurisdiction": d.get("jurisdiction"),
-            "last_updated": d.get("updated_at"),
-            "tags": d.get("tags", []),
-        }
-        for d in ranked[:k]
-    ]
+    return ranked[:k]
+
+
+def _rank_bm25(query: str, k: int, index: BM25Index) -> List[Dict[str, Any]]:
+    return [index.docs[doc_id] for doc_id, _ in index.search(query, k)]
+
+
+def _rank_semantic(query: str, k: int, snap: KBSnapshot) -> List[Dict[str, Any]]:
+    hits = snap.semantic.search(query, k) if snap.semantic is not None else []
+    if not hits:
+        return _rank_bm25(query, k, snap.index)
+    return [snap.docs[doc_id] for doc_id, _ in hits]
+
+
+def _rank_hybrid(query: str, k: int, snap: KBSnapshot) -> List[Dict[str, Any]]:
+    """Combinação linear do BM25 (normalizado pelo máximo) com o cosseno LSA."""
+    dense = snap.semantic.scores(query) if snap.semantic is not None else None
+    if dense is None:
+        return _rank_bm25(query, k, snap.index)
+    alpha = min(max(settings.RAG_HYBRID_ALPHA, 0.0), 1.0)
+    lexical = snap.index.score(query)
+    max_lex = max(lexical.values(), default=0.0) or 1.0
+    # Candidatos: postings da consulta + vizinhos semânticos mais próximos
+    candidates = set(lexical)
+    candidates.update(doc_id for doc_id, _ in snap.semantic.search(query, k * 4))
+    combined = {
+        i: (1.0 - alpha) * lexical.get(i, 0.0) / max_lex + alpha * max(float(dense[i]), 0.0)
+        for i in candidates
+    }
+    top = heapq.nlargest(k, combined.items(), key=lambda it: (it[1], snap.index.tiebreak[it[0]]))
+    return [snap.docs[doc_id] for doc_id, _ in top]
+
+
+def _retriever_name() -> str:
+    return (settings.RAG_RETRIEVER or "bm25").strip().lower()
+
+
+@timed("rag_retrieve")
+def rag_retrieve(query: str, k: int = 5) -> List[Dict[str, Any]]:
+    # Um único snapshot por requisição: uma recarga concorrente não mistura versões da KB
+    snap = get_kb_snapshot()
+    retriever = _retriever_name()
+    if retriever == "keyword":
+        ranked = _rank_keyword(query, k, snap.docs)
+    elif retriever == "semantic":
+        ranked = _rank_semantic(query, k, snap)
+    elif retriever == "hybrid":
+        ranked = _rank_hybrid(query, k, snap)
+    else:
+        ranked = _rank_bm25(query, k, snap.index)
+    top = [_to_rag_doc(d) for d in ranked]
 
     # Inclui sempre as três fontes principais, se presentes
-    def _is_priority(doc: Dict[str, Any]) -> bool:
-        t = (doc.get("title") or "").lower()
-        tags = [str(x).lower() for x in doc.get("tags", [])]
-        keys = ["7716", "12288", "14532"]
-        return any(k in t for k in keys) or any(any(k in tg for k in keys) for tg in tags)
-
-    priority = [
-        {
-            "title": d["title"],
-            "snippet": d.get("content", "")[:1000],
-            "url": d.get("url"),
-            "jurisdiction": d.get("jurisdiction"),
-            "last_updated": d.get("updated_at"),
-            "tags": d.get("tags", []),
-        }
-        for d in kb_docs
-        if _is_priority(d)
-    ]
+    priority = snap.priority
     seen = set()
     merged: List[Dict[str, Any]] = []
     for d in priority + top:
@@ -249,7 +667,10 @@ def rag_retrieve(query: str, k: int = 5) -> List[Dict[str, Any]]:
             continue
         seen.add(key)
         merged.append(d)
-    # Retorna pelo menos as prioridades, com top k complementando
+    # Retorna pelo menos as prioridades, com top k complementando. Com a KB em unidades,
+    # as prioridades são só as ementas e os k trechos mais relevantes vêm em seguida.
+    if settings.KB_CHUNK_ARTICLES:
+        return merged[: len(priority) + k]
     return merged[: max(k, len(priority))]
 
 
@@ -305,55 +726,91 @@ GLOBAL_PROMPT = dedent(
 
 
 # --------------------------- Cliente Cohere ---------------------------
+# O SDK (e o httpx) só é importado ao criar o cliente: rotas que não chamam o LLM
+# (conversas, áudio) não pagam essa importação na inicialização do worker.
+if TYPE_CHECKING:
+    import cohere
+
+COHERE_MODEL = "command-r-plus-08-2024"
+
+
 @lru_cache(maxsize=1)
 def get_cohere_client() -> cohere.Client:
     if not settings.COHERE_API_KEY:
         raise RuntimeError("COHERE_API_KEY não configurada")
+    import cohere
+
     return cohere.Client(api_key=settings.COHERE_API_KEY)
 
 
-def call_model(
+@lru_cache(maxsize=1)
+def get_async_cohere_client() -> cohere.AsyncClient:
+    """Cliente assíncrono com pool httpx próprio (conexões reaproveitadas entre requisições)."""
+    if not settings.COHERE_API_KEY:
+        raise RuntimeError("COHERE_API_KEY não configurada")
+    import cohere
+    import httpx
+
+    http = httpx.AsyncClient(
+        timeout=_model_timeout_s() + 5,
+        limits=httpx.Limits(
+            max_connections=settings.COHERE_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.COHERE_MAX_CONNECTIONS,
+        ),
+    )
+    return cohere.AsyncClient(api_key=settings.COHERE_API_KEY, httpx_client=http)
+
+
+def _model_timeout_s() -> int:
+    try:
+        return int(os.getenv("MODEL_TIMEOUT_SEC", "55"))
+    except Exception:
+        return 55
+
+
+def _sanitize_documents(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Sanitiza os documentos para o formato esperado pelo SDK Cohere 5.x
+    sanitized: List[Dict[str, Any]] = []
+    for d in docs:
+        nd: Dict[str, Any] = {}
+        # Campos comuns suportados
+        for key in ("title", "snippet", "url", "anchor"):
+            if d.get(key) is not None:
+                nd[key] = str(d.get(key))
+        # Campos adicionais convertidos para string
+        if d.get("jurisdiction") is not None:
+            nd["jurisdiction"] = str(d.get("jurisdiction"))
+        if d.get("last_updated") is not None:
+            nd["last_updated"] = str(d.get("last_updated"))
+        if "tags" in d:
+            tags_val = d.get("tags")
+            if isinstance(tags_val, list):
+                nd["tags"] = ", ".join(map(str, tags_val))
+            else:
+                nd["tags"] = str(tags_val)
+        sanitized.append(nd)
+    return sanitized
+
+
+def _chat_kwargs(
     user_message: str,
     conversation_id: Optional[str],
     documents: Optional[List[Dict[str, Any]]] = None,
 ) -> Dict[str, Any]:
     # Adaptado para o SDK Cohere 5.x: usar 'message' e 'preamble' em vez de 'messages'
     kwargs: Dict[str, Any] = {
-        "model": "command-r-plus-08-2024",
+        "model": COHERE_MODEL,
         "message": user_message,
         "preamble": GLOBAL_PROMPT,
     }
     if documents:
-        # Sanitiza os documentos para o formato esperado pelo SDK Cohere 5.x
-        def _sanitize_documents(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-            sanitized: List[Dict[str, Any]] = []
-            for d in docs:
-                nd: Dict[str, Any] = {}
-                # Campos comuns suportados
-                for key in ("title", "snippet", "url"):
-                    if d.get(key) is not None:
-                        nd[key] = str(d.get(key))
-                # Campos adicionais convertidos para string
-                if d.get("jurisdiction") is not None:
-                    nd["jurisdiction"] = str(d.get("jurisdiction"))
-                if d.get("last_updated") is not None:
-                    nd["last_updated"] = str(d.get("last_updated"))
-                if "tags" in d:
-                    tags_val = d.get("tags")
-                    if isinstance(tags_val, list):
-                        nd["tags"] = ", ".join(map(str, tags_val))
-                    else:
-                        nd["tags"] = str(tags_val)
-                sanitized.append(nd)
-            return sanitized
-
         kwargs["documents"] = _sanitize_documents(documents)
     if conversation_id:
         kwargs["conversation_id"] = conversation_id
+    return kwargs
 
-    co = get_cohere_client()
-    resp = co.chat(**kwargs)
 
+def _parse_chat_response(resp: Any) -> Dict[str, Any]:
     # Extrai texto e citações de forma compatível com diferentes versões
     text = ""
     citations: List[Dict[str, Any]] = []
@@ -380,6 +837,63 @@ def call_model(
     }
 
 
+@timed("llm_call")
+def call_model(
+    user_message: str,
+    conversation_id: Optional[str],
+    documents: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    co = get_cohere_client()
+    resp = co.chat(**_chat_kwargs(user_message, conversation_id, documents))
+    return _parse_chat_response(resp)
+
+
+@timed("llm_call")
+async def call_model_async(
+    user_message: str,
+    conversation_id: Optional[str],
+    documents: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    co = get_async_cohere_client()
+    resp = await co.chat(**_chat_kwargs(user_message, conversation_id, documents))
+    return _parse_chat_response(resp)
+
+
+def _fallback_response(mode: Optional[str]) -> Dict[str, Any]:
+    """Resposta amigável usada quando o modelo não responde dentro do prazo."""
+    if mode == "clarify":
+        fb_text = "\n".join([
+            "<clarify>",
+            "Q1: Qual é a situação específica que você deseja entender?",
+            "Q2: Você possui evidências (mensagens, e-mails, testemunhas, protocolos)?",
+            "Q3: Quando e onde ocorreu?",
+            "</clarify>",
+        ])
+        return {"text": fb_text, "citations": [], "fallback": True}
+    fb_text = (
+        "## Entendimento do caso\n"
+        "Com as informações fornecidas, é possível apenas um parecer provisório.\n\n"
+        "## Enquadramento jurídico possível\n"
+        "Em tese, pode haver diferentes enquadramentos — dependemos de detalhes de contexto e evidências.\n\n"
+        "## Leis potencialmente aplicáveis\n"
+        "Prioritariamente: Lei 7.716/1989 e Lei 14.532/2023; a Lei 12.288/2010 pode complementar o contexto.\n\n"
+        "## Lacunas que podem mudar o enquadramento\n"
+        "- Descrição objetiva dos fatos (quem, quando, onde, como).\n"
+        "- Evidências (mensagens, e-mails, testemunhas, registros).\n"
+        "- Contexto do local e eventual histórico.\n\n"
+        "## Veredito provisório\n"
+        "É plausível que, com mais detalhes e evidências, seja possível indicar o fundamento jurídico mais adequado.\n\n"
+        "## Aviso legal\n"
+        "Sou uma IA. Minha análise é informativa e não substitui consulta com advogado habilitado."
+    )
+    return {"text": fb_text, "citations": [], "fallback": True}
+
+
+def fallback_texts() -> List[str]:
+    """Textos fixos de fallback (Fase A e Fase B), usados p.ex. para pré-sintetizar o áudio."""
+    return [_fallback_response("clarify")["text"], _fallback_response("final")["text"]]
+
+
 def call_model_with_timeout(
     user_message: str,
     conversation_id: Optional[str],
@@ -391,15 +905,18 @@ def call_model_with_timeout(
     """Wrapper que aplica timeout e fallback amigável sobre call_model.
     - mode: 'clarify' para perguntas, 'final' para resposta final.
     - timeout_s: tempo máximo em segundos (default 55 via env MODEL_TIMEOUT_SEC).
+
+    Obs.: a thread não é cancelada no timeout; prefira call_model_with_timeout_async.
     """
     if timeout_s is None:
-        try:
-            timeout_s = int(os.getenv("MODEL_TIMEOUT_SEC", "55"))
-        except Exception:
-            timeout_s = 55
+        timeout_s = _model_timeout_s()
 
     result: Dict[str, Any] | None = None
     error: Exception | None = None
+    # A vaga do limitador só é liberada quando a chamada termina de fato (mesmo após o timeout)
+    bulkhead = get_bulkhead(mode)
+    with span("llm_queue"):
+        bulkhead.acquire()
 
     def _worker():
         nonlocal result, error
@@ -407,39 +924,16 @@ def call_model_with_timeout(
             result = call_model(user_message=user_message, conversation_id=conversation_id, documents=documents)
         except Exception as e:
             error = e
+        finally:
+            bulkhead.release()
 
-    th = threading.Thread(target=_worker, daemon=True)
+    # propagate: os spans medidos na thread também entram no Server-Timing da requisição
+    th = threading.Thread(target=propagate(_worker), daemon=True)
     th.start()
     th.join(timeout_s)
 
     if th.is_alive():
-        if mode == "clarify":
-            fb_text = "\n".join([
-                "<clarify>",
-                "Q1: Qual é a situação específica que você deseja entender?",
-                "Q2: Você possui evidências (mensagens, e-mails, testemunhas, protocolos)?",
-                "Q3: Quando e onde ocorreu?",
-                "</clarify>",
-            ])
-            return {"text": fb_text, "citations": []}
-        else:
-            fb_text = (
-                "## Entendimento do caso\n"
-                "Com as informações fornecidas, é possível apenas um parecer provisório.\n\n"
-                "## Enquadramento jurídico possível\n"
-                "Em tese, pode haver diferentes enquadramentos — dependemos de detalhes de contexto e evidências.\n\n"
-                "## Leis potencialmente aplicáveis\n"
-                "Prioritariamente: Lei 7.716/1989 e Lei 14.532/2023; a Lei 12.288/2010 pode complementar o contexto.\n\n"
-                "## Lacunas que podem mudar o enquadramento\n"
-                "- Descrição objetiva dos fatos (quem, quando, onde, como).\n"
-                "- Evidências (mensagens, e-mails, testemunhas, registros).\n"
-                "- Contexto do local e eventual histórico.\n\n"
-                "## Veredito provisório\n"
-                "É plausível que, com mais detalhes e evidências, seja possível indicar o fundamento jurídico mais adequado.\n\n"
-                "## Aviso legal\n"
-                "Sou uma IA. Minha análise é informativa e não substitui consulta com advogado habilitado."
-            )
-            return {"text": fb_text, "citations": []}
+        return _fallback_response(mode)
 
     if error is not None:
         # Se houve erro imediato, propaga
@@ -447,6 +941,33 @@ def call_model_with_timeout(
     return result or {"text": "", "citations": []}
 
 
+async def call_model_with_timeout_async(
+    user_message: str,
+    conversation_id: Optional[str],
+    documents: Optional[List[Dict[str, Any]]] = None,
+    *,
+    mode: Optional[str] = None,
+    timeout_s: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Versão asyncio de call_model_with_timeout: no timeout a requisição HTTP é
+    cancelada de fato (asyncio.wait_for), sem threads ou sockets órfãos."""
+    if timeout_s is None:
+        timeout_s = _model_timeout_s()
+    bulkhead = get_bulkhead(mode)
+    with span("llm_queue"):
+        await bulkhead.aacquire()
+    try:
+        result = await asyncio.wait_for(
+            call_model_async(user_message=user_message, conversation_id=conversation_id, documents=documents),
+            timeout=timeout_s,
+        )
+    except asyncio.TimeoutError:
+        return _fallback_response(mode)
+    finally:
+        bulkhead.release()
+    return result or {"text": "", "citations": []}
+
+
 # --------------------------- Two-step policy helpers ---------------------------
 def _ensure_max_len(s: str, max_len: int = 240) -> str:
     s = re.sub(r"\s+", " ", s).strip()
@@ -558,12 +1079,31 @@ def is_new_topic(U0: str, Qs: List[str], U1: str) -> bool:
     return ratio < 0.15 and len(t_u1) >= 4
 
 
+def _clarify_cached(cache_key: Optional[str]) -> Optional[str]:
+    if not cache_key:
+        return None
+    return get_clarify_cache().get(cache_key)
+
+
+def _clarify_store(cache_key: Optional[str], resp: Dict[str, Any], block: str) -> None:
+    # Não guarda o texto de fallback (timeout): a próxima tentativa deve chamar o modelo
+    if cache_key and not resp.get("fallback"):
+        get_clarify_cache().set(cache_key, block)
+
+
 def generate_clarify_questions(user_message: str, k: int = 5) -> str:
     """Executa RAG sobre U0 e retorna um bloco <clarify> com Q1–Q3."""
     documents = rag_retrieve(user_message, k=k)
-    prompt = build_clarify_prompt(user_message)
+    cache_key = clarify_cache_key(user_message, documents)
+    cached = _clarify_cached(cache_key)
+    if cached:
+        return cached
+    with span("prompt_build"):
+        prompt = build_clarify_prompt(user_message)
     resp = call_model_with_timeout(user_message=prompt, conversation_id=None, documents=documents, mode="clarify")
-    return enforce_three_questions(resp.get("text", ""))
+    block = enforce_three_questions(resp.get("text", ""))
+    _clarify_store(cache_key, resp, block)
+    return block
 
 
 def generate_final_answer(
@@ -572,6 +1112,116 @@ def generate_final_answer(
     """Executa RAG com base em {U0, Qs, U1} e retorna resposta final + citações."""
     retrieval_query = combine_for_retrieval(U0, Qs, U1)
     documents = rag_retrieve(retrieval_query, k=k)
-    prompt = build_final_prompt_v2(U0=U0, Qs=Qs, U1=U1)
+    with span("prompt_build"):
+        prompt = build_final_prompt_v2(U0=U0, Qs=Qs, U1=U1)
     resp = call_model_with_timeout(user_message=prompt, conversation_id=conversation_id, documents=documents, mode="final")
     return resp
+
+
+async def generate_clarify_questions_async(user_message: str, k: int = 5) -> str:
+    """Como generate_clarify_questions, usando o cliente Cohere assíncrono."""
+    # Recuperação (e, com snapshot frio, a carga da KB/LSA) é CPU: fora do event loop
+    documents = await run_in_threadpool(rag_retrieve, user_message, k=k)
+    cache_key = clarify_cache_key(user_message, documents)
+    # O cache pode ser SQLite (I/O bloqueante): fora do event loop
+    cached = await run_in_threadpool(_clarify_cached, cache_key)
+    if cached:
+        return cached
+    with span("prompt_build"):
+        prompt = build_clarify_prompt(user_message)
+    resp = await call_model_with_timeout_async(
+        user_message=prompt, conversation_id=None, documents=documents, mode="clarify"
+    )
+    block = enforce_three_questions(resp.get("text", ""))
+    await run_in_threadpool(_clarify_store, cache_key, resp, block)
+    return block
+
+
+async def generate_final_answer_async(
+    U0: str, Qs: List[str], U1: str, conversation_id: Optional[str] = None, k: int = 5
+) -> Dict[str, Any]:
+    """Como generate_final_answer, usando o cliente Cohere assíncrono."""
+    retrieval_query = combine_for_retrieval(U0, Qs, U1)
+    documents = await run_in_threadpool(rag_retrieve, retrieval_query, k=k)
+    with span("prompt_build"):
+        prompt = build_final_prompt_v2(U0=U0, Qs=Qs, U1=U1)
+    return await call_model_with_timeout_async(
+        user_message=prompt, conversation_id=conversation_id, documents=documents, mode="final"
+    )
+
+
+def citations_to_dicts(citations: Any) -> List[Dict[str, Any]]:
+    """Converte citações do SDK (modelos pydantic) em dicts serializáveis em JSON."""
+    out: List[Dict[str, Any]] = []
+    for c in citations or []:
+        if isinstance(c, dict):
+            out.append(c)
+        elif hasattr(c, "model_dump"):
+            out.append(c.model_dump(mode="json"))
+        elif hasattr(c, "dict"):
+            out.append(c.dict())
+        else:
+            out.append({"text": str(c)})
+    return out
+
+
+async def stream_final_answer(
+    U0: str, Qs: List[str], U1: str, conversation_id: Optional[str] = None, k: int = 5
+) -> AsyncIterator[Dict[str, Any]]:
+    """Versão em streaming da Fase B (co.chat_stream).
+
+    Emite {"type": "token", "text": ...} a cada trecho gerado e, ao final,
+    {"type": "end", "text": <texto completo>, "citations": [...]}. Se nenhum evento
+    chegar em MODEL_TIMEOUT_SEC, o stream é cancelado e o texto de fallback é emitido.
+    """
+    retrieval_query = combine_for_retrieval(U0, Qs, U1)
+    documents = await run_in_threadpool(rag_retrieve, retrieval_query, k=k)
+    with span("prompt_build"):
+        prompt = build_final_prompt_v2(U0=U0, Qs=Qs, U1=U1)
+    timeout_s = _model_timeout_s()
+
+    # A vaga 'final' fica ocupada durante todo o stream
+    bulkhead = get_bulkhead("final")
+    with span("llm_queue"):
+        await bulkhead.aacquire()
+    started = time.perf_counter()
+    events: Optional[AsyncIterator[Any]] = None
+    chunks: List[str] = []
+    citations: List[Any] = []
+    try:
+        # Dentro do try: se o cliente ou a abertura do stream falharem, a vaga é devolvida
+        co = get_async_cohere_client()
+        events = co.chat_stream(**_chat_kwargs(prompt, conversation_id, documents)).__aiter__()
+        while True:
+            try:
+                event = await asyncio.wait_for(events.__anext__(), timeout=timeout_s)
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                if not chunks:
+                    fb_text = _fallback_response("final")["text"]
+                    chunks.append(fb_text)
+                    yield {"type": "token", "text": fb_text}
+                break
+            event_type = getattr(event, "event_type", None)
+            if event_type == "text-generation" and getattr(event, "text", None):
+                if not chunks:
+                    # Tempo até o 1º token: o que o usuário percebe como espera
+                    record("llm_first_token", time.perf_counter() - started)
+                chunks.append(event.text)
+                yield {"type": "token", "text": event.text}
+            elif event_type == "citation-generation":
+                citations.extend(getattr(event, "citations", None) or [])
+            elif event_type == "stream-end":
+                final_resp = getattr(event, "response", None)
+                if final_resp is not None and getattr(final_resp, "citations", None):
+                    citations = list(final_resp.citations)
+    finally:
+        try:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            bulkhead.release()
+            record("llm_stream", time.perf_counter() - started)
+    yield {"type": "end", "text": "".join(chunks), "citations": citations_to_dicts(citations)}
@@ -0,0 +1,217 @@
+"""
+Limitador de concorrência (bulkhead) para chamadas ao LLM, por tipo de chamada.
+
+Cada tipo ('clarify', 'final', 'cleanup') tem seu próprio limite de chamadas simultâneas
+e uma fila de espera limitada:
+- Com vaga livre, a chamada segue imediatamente
+- Sem vaga, espera na fila (FIFO) até LLM_QUEUE_TIMEOUT_SEC
+- Com a fila cheia (ou no timeout da espera), falha rápido com LLMBusyError (HTTP 503)
+
+Como os limites são separados, a limpeza de transcrições (STT) nunca ocupa as vagas
+das respostas finais. Funciona tanto para código síncrono (threads) quanto assíncrono.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Type
+
+from app.core.config import settings
+
+
+class LLMBusyError(RuntimeError):
+    """Fila de chamadas ao LLM cheia (ou espera esgotada) para o tipo de chamada."""
+
+    service = "Serviço de IA"
+
+    def __init__(self, kind: str, reason: str, retry_after_s: int = 1) -> None:
+        super().__init__(f"{self.service} ocupado ({kind}: {reason}); tente novamente em instantes")
+        self.kind = kind
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class _Waiter:
+    __slots__ = ("granted", "_event", "_loop", "_future")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self.granted = False
+        self._loop = loop
+        self._future = loop.create_future() if loop is not None else None
+        self._event = None if loop is not None else threading.Event()
+
+    def wake(self) -> None:
+        # Chamado sob o lock do bulkhead, possivelmente a partir de outra thread
+        self.granted = True
+        if self._future is not None:
+            self._loop.call_soon_threadsafe(_resolve, self._future)
+        else:
+            self._event.set()
+
+
+def _resolve(fut: "asyncio.Future[None]") -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class Bulkhead:
+    def __init__(
+        self,
+        kind: str,
+        *,
+        limit: int,
+        max_queue: int,
+        queue_timeout_s: float,
+        busy_error: Type[LLMBusyError] = LLMBusyError,
+    ) -> None:
+        self.kind = kind
+        self.busy_error = busy_error
+        self.limit = max(1, int(limit))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout_s = float(queue_timeout_s)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue: Deque[_Waiter] = deque()
+        self._stats = {"admitted": 0, "rejected": 0, "timeouts": 0, "queued_total": 0}
+        self._wait_total_s = 0.0
+        self._wait_max_s = 0.0
+
+    # --------------------------- Núcleo ---------------------------
+    def _enter(self, waiter_factory) -> Optional[_Waiter]:
+        """Ocupa uma vaga (retorna None) ou enfileira um waiter; fila cheia -> LLMBusyError."""
+        with self._lock:
+            if self._active < self.limit and not self._queue:
+                self._active += 1
+                self._stats["admitted"] += 1
+                return None
+            if len(self._queue) >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise self.busy_error(self.kind, "fila cheia")
+            waiter = waiter_factory()
+            self._queue.append(waiter)
+            self._stats["queued_total"] += 1
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Desiste da espera. Retorna True se a vaga já tinha sido concedida (e deve ser liberada)."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queue.remove(waiter)
+            self._stats["timeouts"] += 1
+            return False
+
+    def _admitted_after(self, started: float) -> None:
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._stats["admitted"] += 1
+            self._wait_total_s += waited
+            self._wait_max_s = max(self._wait_max_s, waited)
+
+    def release(self) -> None:
+        with self._lock:
+            if self._queue:
+                # Repassa a vaga diretamente ao próximo da fila (active não muda)
+                self._queue.popleft().wake()
+            else:
+                self._active -= 1
+
+    # --------------------------- Síncrono ---------------------------
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self) -> None:
+        waiter = self._enter(_Waiter)
+        if waiter is None:
+            return
+        started = time.perf_counter()
+        if not waiter._event.wait(self.queue_timeout_s) and not self._abandon(waiter):
+            raise self.busy_error(self.kind, "tempo de espera esgotado")
+        self._admitted_after(started)
+
+    # --------------------------- Assíncrono ---------------------------
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        waiter = self._enter(lambda: _Waiter(loop))
+        if waiter is None:
+            return
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter._future), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                raise self.busy_error(self.kind, "tempo de espera esgotado")
+        except asyncio.CancelledError:
+            if self._abandon(waiter):
+                self.release()
+            raise
+        self._admitted_after(started)
+
+    # --------------------------- Métricas ---------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(
+                {
+                    "limit": self.limit,
+                    "max_queue": self.max_queue,
+                    "active": self._active,
+                    "queue_depth": len(self._queue),
+                    "wait_max_ms": round(self._wait_max_s * 1000, 2),
+                    "wait_avg_ms": round(self._wait_total_s * 1000 / out["queued_total"], 2)
+                    if out["queued_total"]
+                    else 0.0,
+                }
+            )
+        return out
+
+
+_BULKHEADS: Dict[str, Bulkhead] = {}
+_BULKHEADS_LOCK = threading.Lock()
+
+
+def _limit_for(kind: str) -> int:
+    return {
+        "clarify": settings.LLM_CONCURRENCY_CLARIFY,
+        "final": settings.LLM_CONCURRENCY_FINAL,
+        "cleanup": settings.LLM_CONCURRENCY_CLEANUP,
+    }.get(kind, settings.LLM_CONCURRENCY_FINAL)
+
+
+def get_bulkhead(kind: Optional[str]) -> Bulkhead:
+    """Bulkhead do tipo de chamada ('clarify' | 'final' | 'cleanup'); None conta como 'final'."""
+    kind = kind or "final"
+    bulkhead = _BULKHEADS.get(kind)
+    if bulkhead is None:
+        with _BULKHEADS_LOCK:
+            bulkhead = _BULKHEADS.get(kind)
+            if bulkhead is None:
+                bulkhead = Bulkhead(
+                    kind,
+                    limit=_limit_for(kind),
+                    max_queue=settings.LLM_QUEUE_MAX,
+                    queue_timeout_s=settings.LLM_QUEUE_TIMEOUT_SEC,
+                )
+                _BULKHEADS[kind] = bulkhead
+    return bulkhead
+
+
+def limiter_stats() -> Dict[str, Any]:
+    return {kind: get_bulkhead(kind).stats() for kind in ("clarify", "final", "cleanup")}
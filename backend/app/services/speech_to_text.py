@@ -1,44 +1,109 @@
 from __future__ import annotations
 
+import asyncio
+import io
 import os
-import shutil
 import subprocess
 import tempfile
-import wave
-from typing import Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-import speech_recognition as sr
+from app.core.config import settings
+from app.services.llm_limiter import Bulkhead, LLMBusyError
+from app.services.stt_backends import INAUDIBLE, PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH, get_stt_backend
+from app.services.timing import propagate, span, timed
 
+if TYPE_CHECKING:
+    import numpy as np
 
-def _run_ffmpeg_convert_to_wav(src_path: str, dst_path: str) -> None:
-    """Convert any audio file to mono 16kHz WAV using ffmpeg.
+# numpy/soundfile are imported on first use: processes that never touch audio
+# (chat-only workers) don't pay for them at startup.
 
-    Requires `ffmpeg` to be available in the environment.
-    """
-    # -y overwrite, -ac 1 mono, -ar 16000 sample rate
-    cmd = [
+
+class FFmpegNotFoundError(RuntimeError):
+    pass
+
+
+class AudioDecodeError(RuntimeError):
+    """Upload is not decodable audio (mapped to HTTP 415)."""
+
+
+class AudioTooLongError(ValueError):
+    """Audio exceeds the configured maximum duration (mapped to HTTP 400)."""
+
+    def __init__(self, duration: float, max_seconds: float) -> None:
+        super().__init__(f"Áudio excede {max_seconds:.0f}s (duração ~{duration:.1f}s)")
+        self.duration = duration
+        self.max_seconds = max_seconds
+
+
+# Tolerance over STT_MAX_SECONDS, kept from the original post-hoc check
+_DURATION_SLACK_S = 1.0
+
+
+def _ffmpeg_pcm_cmd(src: str, max_seconds: Optional[float] = None) -> list:
+    # -ac 1 mono, -ar 16000 sample rate, raw s16le on stdout (no WAV container);
+    # -t stops decoding right after the limit, so over-length input costs at most that much
+    cap = ["-t", f"{max_seconds + _DURATION_SLACK_S + 0.5:.2f}"] if max_seconds else []
+    return [
         "ffmpeg",
-        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
         "-i",
-        src_path,
+        src,
+        *cap,
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
         "-ac",
         "1",
         "-ar",
-        "16000",
-        dst_path,
+        str(PCM_SAMPLE_RATE),
+        "pipe:1",
     ]
+
+
+def _run_ffmpeg(cmd: list, data: Optional[bytes]) -> bytes:
     try:
         # Capture stderr so we can surface codec errors (e.g., webm/opus unsupported)
         completed = subprocess.run(
             cmd,
+            input=data,
             check=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
         )
+    except FileNotFoundError as e:
+        raise FFmpegNotFoundError(f"ffmpeg não encontrado no ambiente: {e}")
     except subprocess.CalledProcessError as e:
-        msg = e.stderr or str(e)
+        msg = (e.stderr or b"").decode("utf-8", "replace") or str(e)
         raise RuntimeError(f"ffmpeg falhou ao converter o arquivo. Detalhes: {msg}")
+    return completed.stdout
+
+
+@timed("stt_decode")
+def decode_to_pcm(data: bytes, *, filename: str = "", max_seconds: Optional[float] = None) -> bytes:
+    """Decode any audio container to 16 kHz mono PCM entirely through pipes.
+
+    The upload bytes go to ffmpeg's stdin and raw PCM is read back from stdout.
+    Containers that need seeking (e.g. MP4/M4A with the index at the end) cannot be
+    demuxed from a pipe; only for those the bytes are spilled to a single temp file.
+    """
+    try:
+        return _run_ffmpeg(_ffmpeg_pcm_cmd("pipe:0", max_seconds), data)
+    except FFmpegNotFoundError:
+        raise
+    except RuntimeError as pipe_error:
+        with tempfile.NamedTemporaryFile(prefix="stt_", suffix=_guess_ext(filename) or ".bin") as tmp:
+            tmp.write(data)
+            tmp.flush()
+            try:
+                return _run_ffmpeg(_ffmpeg_pcm_cmd(tmp.name, max_seconds), None)
+            except RuntimeError:
+                raise pipe_error
 
 
 def _guess_ext(filename: str) -> str:
@@ -46,55 +111,253 @@ def _guess_ext(filename: str) -> str:
     return (ext or "").lower()
 
 
-def _get_wav_duration_seconds(path: str) -> float:
-    with wave.open(path, "rb") as wf:
-        frames = wf.getnframes()
-        rate = wf.getframerate() or 1
-        return frames / float(rate)
+def pcm_duration_seconds(pcm: bytes) -> float:
+    return len(pcm) / float(PCM_SAMPLE_RATE * PCM_SAMPLE_WIDTH)
+
+
+def _ffprobe_duration(data: bytes) -> Optional[float]:
+    """Container duration via ffprobe over a pipe (demuxes headers only, no decoding).
+
+    Raises AudioDecodeError when ffprobe cannot recognise the input at all.
+    """
+    cmd = [
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", "-i", "pipe:0",
+    ]
+    try:
+        completed = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=5)
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return None
+    if completed.returncode != 0:
+        msg = completed.stderr.decode("utf-8", "replace").strip()
+        raise AudioDecodeError(f"Arquivo não reconhecido como áudio: {msg}")
+    try:
+        return float(completed.stdout.decode().strip())
+    except ValueError:
+        # e.g. "N/A" for MediaRecorder WebM without duration in the header
+        return None
+
+
+def probe_duration(data: bytes) -> Optional[float]:
+    """Cheap pre-flight duration check, before any transcoding or recognition.
+
+    WAV/FLAC/OGG headers are read in-process with soundfile; other containers go to
+    ffprobe. Returns None when the container does not declare a duration (the ffmpeg
+    `-t` cap then bounds the work).
+    """
+    import soundfile as sf
+
+    try:
+        info = sf.info(io.BytesIO(data))
+        if info.samplerate:
+            return info.frames / float(info.samplerate)
+    except Exception:
+        pass
+    return _ffprobe_duration(data)
+
+
+@timed("stt_probe")
+def check_duration(data: bytes, max_seconds: float) -> Optional[float]:
+    """Raise AudioTooLongError/AudioDecodeError early; returns the probed duration, if any."""
+    duration = probe_duration(data)
+    if duration is not None and duration > max_seconds + _DURATION_SLACK_S:
+        raise AudioTooLongError(duration, max_seconds)
+    return duration
+
+
+def raw_duration_limit(max_seconds: float) -> float:
+    """Limit for the raw upload (pre-flight and ffmpeg -t). With VAD on, leading/trailing
+    silence does not count against `max_seconds`, so the raw clip may be longer."""
+    if settings.STT_VAD_ENABLED:
+        return max(max_seconds, float(settings.STT_MAX_RAW_SECONDS))
+    return max_seconds
+
+
+# --------------------------- Voice activity detection ---------------------------
+_VAD_FRAME_MS = 30
+
+
+def _frame_energy_db(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    import numpy as np
+
+    n_frames = len(samples) // frame_len
+    frames = samples[: n_frames * frame_len].astype(np.float32).reshape(n_frames, frame_len) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-6))
+
+
+def speech_segments(pcm: bytes) -> List[Tuple[int, int]]:
+    """Sample ranges [start, end) containing speech, by frame energy (dBFS).
+
+    The threshold adapts to the clip: STT_VAD_MARGIN_DB above its noise floor (10th
+    percentile of frame energy), never below STT_VAD_MIN_DB. Gaps shorter than
+    STT_VAD_MAX_PAUSE_MS are bridged; with 0 the whole span from first to last speech
+    frame is one segment. Each segment is padded by STT_VAD_PAD_MS.
+    """
+    import numpy as np
+
+    samples = np.frombuffer(pcm, dtype="<i2")
+    frame_len = PCM_SAMPLE_RATE * _VAD_FRAME_MS // 1000
+    if len(samples) < frame_len:
+        return []
+    energy = _frame_energy_db(samples, frame_len)
+    threshold = max(float(np.percentile(energy, 10)) + settings.STT_VAD_MARGIN_DB, settings.STT_VAD_MIN_DB)
+    voiced = np.flatnonzero(energy > threshold)
+    if voiced.size == 0:
+        return []
+
+    max_gap = settings.STT_VAD_MAX_PAUSE_MS // _VAD_FRAME_MS
+    runs: List[List[int]] = [[int(voiced[0]), int(voiced[0]) + 1]]
+    for f in voiced[1:]:
+        if max_gap <= 0 or f - runs[-1][1] <= max_gap:
+            runs[-1][1] = int(f) + 1
+        else:
+            runs.append([int(f), int(f) + 1])
+
+    pad = PCM_SAMPLE_RATE * settings.STT_VAD_PAD_MS // 1000
+    segments: List[Tuple[int, int]] = []
+    for start_f, end_f in runs:
+        start = max(0, start_f * frame_len - pad)
+        end = min(len(samples), end_f * frame_len + pad)
+        if segments and start <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    return segments
+
+
+@timed("stt_vad")
+def trim_silence(pcm: bytes) -> bytes:
+    """Drop leading/trailing silence and, with STT_VAD_MAX_PAUSE_MS > 0, long internal pauses
+    (segments are re-joined with a short gap). Returns b"" when no speech is found."""
+    segments = speech_segments(pcm)
+    if not segments:
+        return b""
+    if len(segments) == 1:
+        start, end = segments[0]
+        return pcm[start * PCM_SAMPLE_WIDTH : end * PCM_SAMPLE_WIDTH]
+    gap = b"\x00" * (PCM_SAMPLE_RATE * settings.STT_VAD_PAD_MS // 1000 * PCM_SAMPLE_WIDTH)
+    return gap.join(pcm[s * PCM_SAMPLE_WIDTH : e * PCM_SAMPLE_WIDTH] for s, e in segments)
+
+
+@timed("stt_recognize")
+def _recognize_pcm(pcm: bytes, *, language: str) -> str:
+    # Google Web Speech (default) or an offline engine kept warm in this worker (STT_BACKEND)
+    return get_stt_backend().recognize(pcm, language=language)
+
+
+def transcribe_audio_bytes(
+    data: bytes,
+    *,
+    language: str = "pt-BR",
+    filename: str = "",
+    max_seconds: Optional[float] = None,
+) -> Tuple[str, float]:
+    """Transcribe in-memory audio bytes with the configured recognizer backend.
+
+    - Decodes to 16kHz mono PCM with ffmpeg over pipes (no temp dirs or WAV files).
+    - With `max_seconds`, decoding stops just past the limit and over-length audio raises
+      AudioTooLongError before recognition is attempted.
+    - With STT_VAD_ENABLED, silence is trimmed first: only speech is recognized, counted
+      against `max_seconds` and reported as the duration.
+    - Returns (transcript, duration_seconds).
+    """
+    raw_limit = raw_duration_limit(max_seconds) if max_seconds else None
+    try:
+        pcm = decode_to_pcm(data, filename=filename, max_seconds=raw_limit)
+    except FFmpegNotFoundError:
+        raise
+    except Exception as e:
+        raise AudioDecodeError(f"Falha ao converter áudio para PCM: {e}")
+    if not pcm:
+        raise AudioDecodeError("Nenhuma amostra de áudio decodificada")
+    if raw_limit and pcm_duration_seconds(pcm) > raw_limit + _DURATION_SLACK_S:
+        raise AudioTooLongError(pcm_duration_seconds(pcm), raw_limit)
+    if settings.STT_VAD_ENABLED:
+        pcm = trim_silence(pcm)
+        if not pcm:
+            # Only silence: nothing to send to the recognizer
+            return INAUDIBLE, 0.0
+    duration = pcm_duration_seconds(pcm)
+    if max_seconds and duration > max_seconds + _DURATION_SLACK_S:
+        raise AudioTooLongError(duration, max_seconds)
+    return _recognize_pcm(pcm, language=language), duration
 
 
 def transcribe_audio_file(filepath: str, *, language: str = "pt-BR") -> Tuple[str, float]:
-    """Transcribe an audio file to text using Google Web Speech API via SpeechRecognition.
+    """Transcribe an audio file to text (reads it once and delegates to transcribe_audio_bytes).
 
-    - Converts input to 16kHz mono WAV with ffmpeg when needed.
     - Returns (transcript, duration_seconds).
     """
     if not os.path.exists(filepath):
         raise FileNotFoundError(filepath)
+    with open(filepath, "rb") as f:
+        data = f.read()
+    return transcribe_audio_bytes(data, language=language, filename=filepath)
 
-    # Prepare temp workspace
-    workdir = tempfile.mkdtemp(prefix="stt_")
-    src_copy = os.path.join(workdir, os.path.basename(filepath))
-    shutil.copyfile(filepath, src_copy)
 
-    # Always convert to WAV (mono/16k) for consistent recognition
-    wav_path = os.path.join(workdir, "audio.wav")
-    try:
-        _run_ffmpeg_convert_to_wav(src_copy, wav_path)
-    except Exception as e:
-        # Cleanup and rethrow for API layer
-        shutil.rmtree(workdir, ignore_errors=True)
-        raise RuntimeError(f"Falha ao converter áudio para WAV: {e}")
+# --------------------------- Off-loop execution ---------------------------
+class STTBusyError(LLMBusyError):
+    """Too many transcriptions running/queued (mapped to HTTP 503)."""
 
-    # Compute duration (server-side check if useful)
-    try:
-        duration = _get_wav_duration_seconds(wav_path)
-    except Exception:
-        duration = 0.0
+    service = "Serviço de transcrição"
+
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_BULKHEAD: Optional[Bulkhead] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _stt_pool() -> Tuple[ThreadPoolExecutor, Bulkhead]:
+    """Dedicated pool sized to STT_MAX_CONCURRENCY, so STT never eats the default threadpool.
 
-    recognizer = sr.Recognizer()
-    transcript = ""
+    Threads are enough here: ffmpeg runs as a subprocess and recognition is network I/O,
+    both of which release the GIL.
+    """
+    global _EXECUTOR, _BULKHEAD
+    if _EXECUTOR is None:
+        with _POOL_LOCK:
+            if _EXECUTOR is None:
+                workers = max(1, int(settings.STT_MAX_CONCURRENCY))
+                _BULKHEAD = Bulkhead(
+                    "stt",
+                    limit=workers,
+                    max_queue=settings.STT_QUEUE_MAX,
+                    queue_timeout_s=settings.STT_QUEUE_TIMEOUT_SEC,
+                    busy_error=STTBusyError,
+                )
+                _EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stt")
+    return _EXECUTOR, _BULKHEAD  # type: ignore[return-value]
+
+
+async def _run_in_stt_pool(fn, *args, **kwargs):
+    """Run `fn` in the STT pool without blocking the event loop.
+
+    Waits at most STT_QUEUE_TIMEOUT_SEC for a free slot; raises STTBusyError when the
+    queue is full or the wait expires.
+    """
+    executor, bulkhead = _stt_pool()
+    with span("stt_queue"):
+        await bulkhead.aacquire()
     try:
-        with sr.AudioFile(wav_path) as source:
-            audio = recognizer.record(source)
-        try:
-            transcript = recognizer.recognize_google(audio, language=language)
-        except sr.UnknownValueError:
-            transcript = "[Inaudível]"
-        except sr.RequestError:
-            transcript = "[Erro de transcrição]"
+        loop = asyncio.get_running_loop()
+        # propagate: stage spans measured in the pool still reach this request's Server-Timing
+        return await loop.run_in_executor(executor, propagate(lambda: fn(*args, **kwargs)))
     finally:
-        shutil.rmtree(workdir, ignore_errors=True)
+        bulkhead.release()
+
+
+async def transcribe_audio_file_async(filepath: str, *, language: str = "pt-BR") -> Tuple[str, float]:
+    return await _run_in_stt_pool(transcribe_audio_file, filepath, language=language)
+
+
+async def transcribe_audio_bytes_async(
+    data: bytes, *, language: str = "pt-BR", filename: str = "", max_seconds: Optional[float] = None
+) -> Tuple[str, float]:
+    return await _run_in_stt_pool(
+        transcribe_audio_bytes, data, language=language, filename=filename, max_seconds=max_seconds
+    )
 
-    return transcript, float(duration)
 
+def stt_pool_stats() -> dict:
+    return _stt_pool()[1].stats()
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Optional
+
+from app.core.config import settings
+
+
+# Raw PCM handed to every backend: 16 kHz, mono, signed 16-bit little-endian
+PCM_SAMPLE_RATE = 16000
+PCM_SAMPLE_WIDTH = 2
+
+INAUDIBLE = "[Inaudível]"
+RECOGNITION_ERROR = "[Erro de transcrição]"
+
+
+class STTBackendUnavailable(RuntimeError):
+    """Configured backend cannot be used (missing package or model files)."""
+
+
+class STTBackend(ABC):
+    """Speech recognizer interface: 16 kHz mono PCM in, transcript out.
+
+    Offline backends load their model once per worker process (on first use or in
+    `warmup()`) and reuse it for every request. Engine packages are imported inside
+    the backend, so importing this module stays cheap.
+    """
+
+    name = "base"
+
+    def warmup(self) -> None:
+        pass
+
+    @abstractmethod
+    def recognize(self, pcm: bytes, *, language: str) -> str:
+        ...
+
+
+class GoogleBackend(STTBackend):
+    """Google Web Speech API via SpeechRecognition (network call per clip)."""
+
+    name = "google"
+
+    def recognize(self, pcm: bytes, *, language: str) -> str:
+        import speech_recognition as sr
+
+        recognizer = sr.Recognizer()
+        audio = sr.AudioData(pcm, PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH)
+        try:
+            return recognizer.recognize_google(audio, language=language)
+        except sr.UnknownValueError:
+            return INAUDIBLE
+        except sr.RequestError:
+            return RECOGNITION_ERROR
+
+
+class _LazyModelBackend(STTBackend):
+    """Loads the model once, thread-safely, and keeps it warm."""
+
+    def __init__(self) -> None:
+        self._model = None
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _load(self):
+        ...
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def warmup(self) -> None:
+        self._get_model()
+
+
+class VoskBackend(_LazyModelBackend):
+    """Vosk (Kaldi) offline recognizer. Needs `vosk` and an unpacked model directory."""
+
+    name = "vosk"
+
+    def __init__(self, model_path: Optional[str]) -> None:
+        super().__init__()
+        self.model_path = model_path
+
+    def _load(self):
+        try:
+            import vosk
+        except ImportError as e:
+            raise STTBackendUnavailable("STT_BACKEND=vosk requer o pacote 'vosk'") from e
+        if not self.model_path:
+            raise STTBackendUnavailable("STT_BACKEND=vosk requer STT_VOSK_MODEL_PATH")
+        vosk.SetLogLevel(-1)
+        return vosk.Model(self.model_path)
+
+    def recognize(self, pcm: bytes, *, language: str) -> str:
+        import vosk
+
+        # The model is shared; a recognizer per clip keeps requests independent
+        rec = vosk.KaldiRecognizer(self._get_model(), PCM_SAMPLE_RATE)
+        rec.AcceptWaveform(pcm)
+        text = json.loads(rec.FinalResult()).get("text", "").strip()
+        return text or INAUDIBLE
+
+
+class FasterWhisperBackend(_LazyModelBackend):
+    """Whisper on CPU via faster-whisper (CTranslate2), int8 by default."""
+
+    name = "faster_whisper"
+
+    def __init__(self, model: str, *, compute_type: str = "int8", cpu_threads: int = 0) -> None:
+        super().__init__()
+        self.model = model
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+
+    def _load(self):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise STTBackendUnavailable("STT_BACKEND=faster_whisper requer o pacote 'faster-whisper'") from e
+        return WhisperModel(
+            self.model, device="cpu", compute_type=self.compute_type, cpu_threads=self.cpu_threads
+        )
+
+    def recognize(self, pcm: bytes, *, language: str) -> str:
+        import numpy as np
+
+        audio = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        segments, _info = self._get_model().transcribe(
+            audio, language=(language or "pt").split("-")[0], beam_size=1
+        )
+        text = " ".join(seg.text.strip() for seg in segments).strip()
+        return text or INAUDIBLE
+
+
+@lru_cache(maxsize=1)
+def get_stt_backend() -> STTBackend:
+    """Backend selected by STT_BACKEND ('google' | 'vosk' | 'faster_whisper'), one per worker."""
+    name = (settings.STT_BACKEND or "google").strip().lower()
+    if name == "vosk":
+        return VoskBackend(settings.STT_VOSK_MODEL_PATH)
+    if name in ("faster_whisper", "whisper"):
+        return FasterWhisperBackend(
+            settings.STT_WHISPER_MODEL,
+            compute_type=settings.STT_WHISPER_COMPUTE_TYPE,
+            cpu_threads=settings.STT_WHISPER_CPU_THREADS,
+        )
+    return GoogleBackend()
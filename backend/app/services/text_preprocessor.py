@@ -4,6 +4,8 @@ import re
 from typing import Tuple
 
 from app.core.config import settings
+from app.services.llm_limiter import get_bulkhead
+from app.services.timing import timed
 
 try:
     # Reutiliza o cliente Cohere já configurado pelo agente jurídico, se existir
@@ -62,11 +64,14 @@ def _llm_cleanup(text: str) -> str:
         "5) devolver apenas o texto limpo, em uma única linha.\n"
         "Proibido: inventar fatos, adicionar conteúdo, mudar datas/nomes, traduzir."
     )
-    resp = co.chat(
-        model="command-r-plus-08-2024",
-        message=str(text or ""),
-        preamble=preamble,
-    )
+    # Limite próprio ('cleanup'): a limpeza não disputa vagas com as respostas do agente;
+    # com a fila cheia, LLMBusyError faz preprocess_transcript cair no modo 'basic'
+    with get_bulkhead("cleanup").slot():
+        resp = co.chat(
+            model="command-r-plus-08-2024",
+            message=str(text or ""),
+            preamble=preamble,
+        )
 
     cleaned = ""
     try:
@@ -85,6 +90,7 @@ def _llm_cleanup(text: str) -> str:
     return cleaned
 
 
+@timed("stt_preprocess")
 def preprocess_transcript(text: str) -> Tuple[str, str, str]:
     """
     Aplica pré-processamento ao transcript de voz.
@@ -1,21 +1,31 @@
 from __future__ import annotations
 
-from typing import Tuple, Optional
+from typing import TYPE_CHECKING, Iterator, List, Sequence, Tuple, Optional
 from functools import lru_cache
+import importlib.util
 import io
 import logging
+import re
+import struct
 
-import soundfile as sf
 from app.core.config import settings
+from app.services.tts_cache import audio_cache_key, get_audio_cache
+from app.services.timing import span, timed
+from app.services.tts_pool import TTSBusyError, TTSTimeoutError, get_tts_pool
+
+if TYPE_CHECKING:
+    import numpy as np
+    from kittentts import KittenTTS
 
 logger = logging.getLogger(__name__)
 
-# Importe o KittenTTS. Isso falhará se não for instalado via Dockerfile/pyproject
-try:
-    from kittentts import KittenTTS
-except ImportError:
-    logger.error("KittenTTS não instalado. O serviço de TTS não funcionará.")
-    KittenTTS = None  # type: ignore
+# KittenTTS (onnxruntime/torch), numpy e soundfile são importados no primeiro uso:
+# processos que só atendem chat/conversas não os carregam na inicialização.
+
+
+def kittentts_available() -> bool:
+    """KittenTTS instalado? Verifica sem importar o pacote."""
+    return importlib.util.find_spec("kittentts") is not None
 
 
 class TTSServiceError(RuntimeError):
@@ -28,7 +38,11 @@ def get_tts_model() -> KittenTTS:
     Carrega o modelo KittenTTS e o mantém em cache (LRU cache de tamanho 1).
     Isso evita recarregar o modelo do disco a cada requisição.
     """
-    if not KittenTTS:
+    try:
+        # Isso falhará se não for instalado via Dockerfile/pyproject
+        from kittentts import KittenTTS
+    except ImportError:
+        logger.error("KittenTTS não instalado. O serviço de TTS não funcionará.")
         raise TTSServiceError("Biblioteca KittenTTS não está instalada.")
 
     try:
@@ -46,13 +60,132 @@ def get_tts_model() -> KittenTTS:
         )
 
 
+# --------------------------- Formatos de saída ---------------------------
+# Nome -> (formato libsndfile, subtipo, media type). Opus/MP3 dependem da libsndfile (>= 1.0.29 / 1.1.0)
+AUDIO_FORMATS = {
+    "wav": ("WAV", "PCM_16", "audio/wav"),
+    "ogg": ("OGG", "OPUS", "audio/ogg"),
+    "mp3": ("MP3", "MPEG_LAYER_III", "audio/mpeg"),
+}
+_ACCEPT_FORMATS = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/ogg": "ogg",
+    "audio/opus": "ogg",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+}
+# Taxas aceitas por todos os codecs acima (Opus só codifica 8/12/16/24/48 kHz)
+OUTPUT_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+@lru_cache(maxsize=1)
+def supported_audio_formats() -> Tuple[str, ...]:
+    import soundfile as sf
+
+    out = []
+    for name, (fmt, subtype, _media) in AUDIO_FORMATS.items():
+        if fmt in sf.available_formats() and subtype in sf.available_subtypes(fmt):
+            out.append(name)
+    return tuple(out)
+
+
+def negotiate_audio_format(
+    accept: Optional[str], requested: Optional[str] = None, *, formats: Optional[Sequence[str]] = None
+) -> str:
+    """Formato explícito (`?format=`) tem prioridade; senão o header Accept (com q-values).
+
+    Sem correspondência (ou `*/*`), usa TTS_DEFAULT_FORMAT. Levanta ValueError para um
+    formato explícito desconhecido ou indisponível nesta libsndfile. `formats` restringe
+    os candidatos (ex.: só "wav" no modo stream).
+    """
+    supported = [f for f in supported_audio_formats() if formats is None or f in formats]
+    if requested:
+        name = requested.strip().lower()
+        name = {"opus": "ogg", "mpeg": "mp3"}.get(name, name)
+        if name not in supported:
+            raise ValueError(f"Formato de áudio não suportado: {requested} (disponíveis: {', '.join(supported)})")
+        return name
+
+    default = settings.TTS_DEFAULT_FORMAT if settings.TTS_DEFAULT_FORMAT in supported else "wav"
+    ranked = []
+    for i, part in enumerate((accept or "").split(",")):
+        media, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media and q > 0:
+            ranked.append((-q, i, media.strip().lower()))
+    for _q, _i, media in sorted(ranked):
+        if media in ("*/*", "audio/*"):
+            return default
+        name = _ACCEPT_FORMATS.get(media)
+        if name in supported:
+            return name
+    return default
+
+
+def _lowpass(audio: np.ndarray, cutoff: float, taps: int = 63) -> np.ndarray:
+    """FIR passa-baixas (sinc janelada); `cutoff` em fração da taxa de amostragem."""
+    import numpy as np
+
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return np.convolve(audio, (kernel / kernel.sum()).astype(np.float32), mode="same")
+
+
+def resample_audio(audio_array, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Reduz a taxa de amostragem (passa-baixas anti-aliasing + interpolação linear)."""
+    import numpy as np
+
+    audio = np.asarray(audio_array, dtype=np.float32).reshape(-1)
+    if dst_rate >= src_rate or audio.size == 0:
+        return audio
+    filtered = _lowpass(audio, 0.45 * dst_rate / src_rate)
+    positions = np.arange(int(audio.size * dst_rate / src_rate)) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(audio.size), filtered).astype(np.float32)
+
+
+@timed("tts_encode")
+def encode_audio(audio_array, *, sample_rate: int, audio_format: str = "wav", output_rate: Optional[int] = None) -> bytes:
+    """Codifica o array do modelo no formato pedido (em memória, na thread da requisição)."""
+    import soundfile as sf
+
+    fmt, subtype, _media = AUDIO_FORMATS[audio_format]
+    rate = output_rate or sample_rate
+    audio = resample_audio(audio_array, sample_rate, rate)
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, samplerate=rate, format=fmt, subtype=subtype)
+    return buffer.getvalue()
+
+
+def _cache_lookup_key(text: str, voice: str, audio_format: str = "wav", output_rate: Optional[int] = None):
+    cache = get_audio_cache()
+    if cache is None:
+        return None, ""
+    rate = output_rate or settings.KITTEN_TTS_SAMPLE_RATE
+    return cache, audio_cache_key(text, voice, settings.KITTEN_TTS_MODEL, rate, audio_format)
+
+
 def generate_speech_sync(
     text: str,
     *,
     voice_id: Optional[str] = None,
+    audio_format: str = "wav",
+    output_rate: Optional[int] = None,
 ) -> Tuple[bytes, str]:
     """
-    Gera áudio (WAV) de forma síncrona usando KittenTTS.
+    Gera áudio de forma síncrona usando KittenTTS.
+
+    `audio_format` é um de AUDIO_FORMATS (WAV PCM 16-bit por padrão; "ogg" = Opus em OGG,
+    cerca de 10x menor) e `output_rate` reduz a taxa de amostragem antes da codificação.
+    Só a inferência ocupa o pool de TTS; a codificação roda na thread da requisição.
 
     Retorna:
         Tuple[bytes, str]: (audio_bytes, media_type)
@@ -60,34 +193,189 @@ def generate_speech_sync(
     if not text or not text.strip():
         raise TTSServiceError("Texto para síntese não pode ser vazio")
 
-    model = get_tts_model()
-
     selected_voice = voice_id or settings.KITTEN_TTS_VOICE_ID
     sample_rate = settings.KITTEN_TTS_SAMPLE_RATE
+    output_rate = output_rate or settings.TTS_OUTPUT_SAMPLE_RATE or sample_rate
+    media_type = AUDIO_FORMATS[audio_format][2]
+
+    # Textos repetidos (fallbacks, perguntas de esclarecimento, replays) saem do cache sem inferência
+    cache, cache_key = _cache_lookup_key(text, selected_voice, audio_format, output_rate)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached, media_type
 
     try:
-        # Gera o array numpy de áudio
-        audio_array = model.generate(text, voice=selected_voice)
-
-        if audio_array is None:
-            raise TTSServiceError("Modelo não retornou dados de áudio.")
-
-        # Converte o array numpy para bytes WAV em memória
-        buffer = io.BytesIO()
-        sf.write(
-            buffer,
-            audio_array,
-            samplerate=sample_rate,
-            format='WAV',
-            subtype='PCM_16'
+        # Gera o array numpy de áudio no pool de inferência (processos com threads ONNX fixas)
+        audio_array = get_tts_pool().synthesize(text, selected_voice)
+
+        # Converte o array numpy para o formato pedido, em memória
+        audio_bytes = encode_audio(
+            audio_array, sample_rate=sample_rate, audio_format=audio_format, output_rate=output_rate
         )
-        buffer.seek(0)
-        audio_bytes = buffer.read()
 
-        return audio_bytes, "audio/wav"
+        if cache is not None:
+            cache.set(cache_key, audio_bytes)
+        return audio_bytes, media_type
 
+    except TTSBusyError:
+        raise
     except Exception as e:
         # Captura erros do 'model.generate()' ou 'sf.write()'
         logger.exception("Falha na geração do áudio (TTS)")
         raise TTSServiceError(f"Falha na geração do áudio: {e}")
 
+
+# --------------------------- Streaming por frases ---------------------------
+# Limite de caracteres por trecho sintetizado (frases maiores são quebradas em vírgulas/espaços)
+MAX_CHUNK_CHARS = 300
+# Trechos menores que isso são unidos ao seguinte (evita prosódia picotada em "Sim." / "1.")
+MIN_CHUNK_CHARS = 25
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…;:])\s+|\n+")
+
+
+def split_sentences(text: str, *, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
+    """Quebra o texto em frases para síntese incremental."""
+    pieces = [p.strip() for p in _SENTENCE_END.split(text or "") if p and p.strip()]
+    chunks: List[str] = []
+    for piece in pieces:
+        # Remove marcações de Markdown que seriam lidas em voz alta
+        piece = re.sub(r"^[#>*\-\s]+", "", piece).replace("**", "").strip()
+        if not piece:
+            continue
+        while len(piece) > max_chars:
+            cut = piece.rfind(",", 0, max_chars)
+            if cut < max_chars // 2:
+                cut = piece.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            chunks.append(piece[: cut + 1].strip())
+            piece = piece[cut + 1 :].strip()
+        if chunks and len(chunks[-1]) < MIN_CHUNK_CHARS and len(chunks[-1]) + len(piece) < max_chars:
+            sep = " " if chunks[-1][-1] in ".!?…;:," else ". "
+            chunks[-1] = f"{chunks[-1]}{sep}{piece}"
+        elif piece:
+            chunks.append(piece)
+    return chunks
+
+
+def wav_stream_header(
+    sample_rate: int, *, channels: int = 1, bits: int = 16, data_size: Optional[int] = None
+) -> bytes:
+    """Cabeçalho WAV (PCM). Sem `data_size` (stream de tamanho desconhecido), os campos de
+    tamanho vão com o valor máximo; navegadores e players tocam até o fim da conexão.
+    """
+    riff_size = 0xFFFFFFFF if data_size is None else 36 + data_size
+    data_size = 0xFFFFFFFF if data_size is None else data_size
+    byte_rate = sample_rate * channels * bits // 8
+    return b"".join(
+        [
+            b"RIFF", struct.pack("<I", riff_size), b"WAVE",
+            b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * bits // 8, bits),
+            b"data", struct.pack("<I", data_size),
+        ]
+    )
+
+
+def _to_pcm16(audio_array) -> bytes:
+    import numpy as np
+
+    audio = np.asarray(audio_array, dtype=np.float32).reshape(-1)
+    return (np.clip(audio, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+# Variante de cache do modo stream: o áudio frase a frase (Markdown removido, trechos
+# agrupados por split_sentences) difere da síntese do texto inteiro em WAV
+STREAM_CACHE_VARIANT = "wav-stream"
+
+
+def iter_speech_pcm(text: str, *, voice_id: Optional[str] = None) -> Iterator[bytes]:
+    """Sintetiza frase a frase, devolvendo PCM 16-bit mono de cada trecho assim que fica pronto.
+
+    Uma única vaga do pool é tomada no 1º trecho e mantida até o fim: depois do cabeçalho
+    já enviado, o stream não pode mais falhar com TTSBusyError (WAV truncado).
+    """
+    pool = get_tts_pool()
+    selected_voice = voice_id or settings.KITTEN_TTS_VOICE_ID
+    sentences = split_sentences(text)
+    if not sentences:
+        return
+    with span("tts_queue"):
+        pool.bulkhead.acquire()
+    held = True
+    try:
+        for sentence in sentences:
+            # Frases curtas de requisições simultâneas são agrupadas pelo pool
+            try:
+                audio_array = pool.synthesize(sentence, selected_voice, admitted=True)
+            except TTSTimeoutError as e:
+                # O trecho ainda roda no worker: a vaga fica com ele até terminar
+                pool.release_when_done(e.pending)
+                held = False
+                raise TTSServiceError(f"Falha na geração do áudio: {e}")
+            except Exception as e:
+                logger.exception("Falha na geração do áudio (TTS) do trecho")
+                raise TTSServiceError(f"Falha na geração do áudio: {e}")
+            yield _to_pcm16(audio_array)
+    finally:
+        if held:
+            pool.bulkhead.release()
+
+
+def stream_speech_wav(text: str, *, voice_id: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Gera um WAV em streaming: cabeçalho imediatamente, depois o PCM de cada frase.
+
+    O texto é validado e a 1ª frase sintetizada antes do primeiro byte, para que erros
+    (inclusive TTSBusyError) ainda possam virar uma resposta HTTP de erro. O stream é
+    sempre WAV na taxa do modelo (formatos comprimidos só na resposta completa; a rota
+    recusa outro formato ou taxa com stream=true).
+    """
+    if not text or not text.strip():
+        raise TTSServiceError("Texto para síntese não pode ser vazio")
+    sample_rate = settings.KITTEN_TTS_SAMPLE_RATE
+    cache, cache_key = _cache_lookup_key(text, voice_id or settings.KITTEN_TTS_VOICE_ID, STREAM_CACHE_VARIANT)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return iter([cached])
+
+    pcm_chunks = iter_speech_pcm(text, voice_id=voice_id)
+    first = next(pcm_chunks, b"")
+
+    def body() -> Iterator[bytes]:
+        produced = [first]
+        try:
+            yield wav_stream_header(sample_rate) + first
+            for chunk in pcm_chunks:
+                produced.append(chunk)
+                yield chunk
+        finally:
+            # Cliente desconectado no meio: devolve a vaga do pool sem esperar o GC
+            pcm_chunks.close()
+        # Stream completo: guarda o WAV (com tamanhos corretos) para as próximas requisições
+        pcm = b"".join(produced)
+        if cache is not None and pcm:
+            cache.set(cache_key, wav_stream_header(sample_rate, data_size=len(pcm)) + pcm)
+
+    return body()
+
+
+def precompute_fallback_audio() -> int:
+    """Sintetiza (e deixa em cache) os textos fixos de fallback do agente. Retorna quantos
+    foram gerados agora; os já presentes no cache em disco não passam pelo modelo."""
+    from app.services.legal_agent import fallback_texts  # import local: evita ciclo na carga
+
+    generated = 0
+    voice = settings.KITTEN_TTS_VOICE_ID
+    audio_format = negotiate_audio_format(None)
+    output_rate = settings.TTS_OUTPUT_SAMPLE_RATE or None
+    cache = get_audio_cache()
+    for text in fallback_texts():
+        _, key = _cache_lookup_key(text, voice, audio_format, output_rate or settings.KITTEN_TTS_SAMPLE_RATE)
+        if cache is not None and cache.get(key) is not None:
+            continue
+        generate_speech_sync(text, voice_id=voice, audio_format=audio_format, output_rate=output_rate)
+        generated += 1
+    return generated
@@ -0,0 +1,156 @@
+"""
+Latência por etapa (spans) do fluxo do agente e dos serviços de áudio.
+
+- `span("rag_retrieve")` (context manager) e `@timed("llm_call")` (funções síncronas
+  ou assíncronas) medem uma etapa com perf_counter.
+- Cada duração entra em um histograma por etapa (`/metrics`, formato texto do
+  Prometheus) e na lista de spans da requisição corrente (contextvar), que o
+  TimingMiddleware devolve no header `Server-Timing`.
+
+Threads criadas à mão não herdam o contexto: use `propagate(fn)` para que os spans
+medidos nelas também apareçam no Server-Timing (os histogramas recebem de qualquer forma).
+O módulo só usa a biblioteca padrão, para não pesar na importação do app.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Limites dos buckets (segundos): de consultas locais (ms) a respostas do LLM (dezenas de s)
+BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_REQUEST_SPANS: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_spans", default=None
+)
+
+
+class HistogramFamily:
+    """Histogramas cumulativos (estilo Prometheus) indexados por valores de rótulos."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float] = BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # valores dos rótulos -> [contagem por bucket..., +Inf], soma
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, label_values: Sequence[str], seconds: float) -> None:
+        key = tuple(label_values)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += seconds
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+        with self._lock:
+            return {k: {"counts": list(c), "sum": s[0], "count": sum(c)} for k, (c, s) in self._series.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, data in sorted(self.snapshot().items()):
+            base = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key))
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, data["counts"]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {data["count"]}')
+            lines.append(f"{self.name}_sum{{{base}}} {data['sum']:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {data['count']}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_DURATION = HistogramFamily(
+    "app_stage_duration_seconds", "Duração de cada etapa (RAG, LLM, banco, STT, TTS).", ("stage",)
+)
+REQUEST_DURATION = HistogramFamily(
+    "app_http_request_duration_seconds", "Duração das requisições HTTP por rota.", ("method", "route", "status")
+)
+
+
+def record(stage: str, seconds: float) -> None:
+    STAGE_DURATION.observe((stage,), seconds)
+    spans = _REQUEST_SPANS.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def timed(stage: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorador: mede cada chamada da função como a etapa `stage`."""
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(stage):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Liga `fn` ao contexto atual (spans da requisição) para rodar em outra thread."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def begin_request() -> Tuple[List[Tuple[str, float]], contextvars.Token]:
+    spans: List[Tuple[str, float]] = []
+    return spans, _REQUEST_SPANS.set(spans)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _REQUEST_SPANS.reset(token)
+
+
+def server_timing_header(spans: Sequence[Tuple[str, float]], total_s: Optional[float] = None) -> str:
+    """`etapa;dur=ms` por etapa (somando repetições, na ordem da 1ª ocorrência) + `total`."""
+    merged: Dict[str, float] = {}
+    for stage, seconds in list(spans):
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    if total_s is not None:
+        merged["total"] = total_s
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in merged.items())
+
+
+def render_prometheus() -> str:
+    return "\n".join(STAGE_DURATION.render() + REQUEST_DURATION.render()) + "\n"
@@ -0,0 +1,41 @@
+"""
+Cache de transcrições por conteúdo do áudio.
+
+Chave: (SHA-256 do arquivo enviado, idioma, modo de pré-processamento, reconhecedor).
+Reenvios idênticos (retentativas do frontend, duplo clique) custam apenas o hash:
+sem ffmpeg e sem chamada ao reconhecedor.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.kv_store import KVStore, make_store
+
+
+@lru_cache(maxsize=1)
+def get_transcript_cache() -> KVStore:
+    return make_store(
+        settings.TRANSCRIPT_CACHE_BACKEND,
+        namespace="transcripts",
+        max_entries=settings.TRANSCRIPT_CACHE_MAX_ENTRIES,
+        ttl_s=settings.TRANSCRIPT_CACHE_TTL_SEC,
+        sqlite_path=settings.CACHE_SQLITE_PATH,
+    )
+
+
+def transcript_cache_key(sha256: str, language: str) -> Optional[str]:
+    """Chave do cache, ou None se o cache estiver desativado."""
+    if not settings.TRANSCRIPT_CACHE_ENABLED:
+        return None
+    mode = (settings.STT_PREPROCESS_MODE or "off").strip().lower()
+    backend = (settings.STT_BACKEND or "google").strip().lower()
+    return f"stt:{sha256}:{language}:{mode}:{backend}"
+
+
+def transcript_cache_stats() -> Dict[str, Any]:
+    if not settings.TRANSCRIPT_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_transcript_cache().stats()}
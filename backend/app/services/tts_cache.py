@@ -0,0 +1,150 @@
+"""
+Cache de áudio sintetizado (já codificado: WAV/OGG/MP3), em dois níveis:
+- memória: LRU limitado por número de entradas (por processo)
+- disco: um arquivo `<chave>.audio` por entrada, limitado em bytes; os menos usados
+  recentemente (mtime, atualizado a cada leitura) são removidos primeiro
+
+Chave: SHA-256 do texto normalizado + voz + modelo + sample rate + formato. Acertos não passam
+pelo modelo ONNX.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.kv_store import MemoryTTLStore
+
+logger = logging.getLogger(__name__)
+
+_SUFFIX = ".audio"
+
+
+def normalize_tts_text(text: str) -> str:
+    # Marcadores do fluxo de duas etapas não são lidos em voz alta
+    s = re.sub(r"</?clarify>", " ", text or "")
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def audio_cache_key(text: str, voice_id: str, model_id: str, sample_rate: int, audio_format: str = "wav") -> str:
+    raw = "\x1f".join(
+        [normalize_tts_text(text), voice_id or "", model_id or "", str(sample_rate), audio_format]
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, directory: Optional[str], *, memory_entries: int, disk_max_bytes: int) -> None:
+        self.memory = MemoryTTLStore(max_entries=memory_entries, ttl_s=0)
+        self.directory = directory
+        self.disk_max_bytes = int(disk_max_bytes)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "disk_evictions": 0}
+        self._disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(e.stat().st_size for e in os.scandir(directory) if e.name.endswith(_SUFFIX))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory or "", f"{key}{_SUFFIX}")
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.memory.get(key)
+        if data is not None:
+            self._count("memory_hits")
+            return data
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)  # marca como usado recentemente
+            except OSError:
+                data = None
+            if data:
+                self.memory.set(key, data)
+                self._count("disk_hits")
+                return data
+        self._count("misses")
+        return None
+
+    def set(self, key: str, data: bytes) -> None:
+        self.memory.set(key, data)
+        self._count("sets")
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            existed = os.path.exists(path)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("Falha ao gravar áudio em cache em %s", path)
+            return
+        if not existed:
+            with self._lock:
+                self._disk_bytes += len(data)
+                over = self._disk_bytes > self.disk_max_bytes
+            if over:
+                self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """Remove os arquivos menos usados recentemente até ficar em 90% do limite."""
+        entries = sorted(
+            (e for e in os.scandir(self.directory) if e.name.endswith(_SUFFIX)),
+            key=lambda e: e.stat().st_mtime,
+        )
+        total = sum(e.stat().st_size for e in entries)
+        target = int(self.disk_max_bytes * 0.9)
+        removed = 0
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._stats["disk_evictions"] += removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["disk_bytes"] = self._disk_bytes
+        lookups = out["memory_hits"] + out["disk_hits"] + out["misses"]
+        out["hit_ratio"] = round((out["memory_hits"] + out["disk_hits"]) / lookups, 4) if lookups else 0.0
+        out["memory_entries"] = len(self.memory)
+        out["disk_max_bytes"] = self.disk_max_bytes
+        return out
+
+
+@lru_cache(maxsize=1)
+def get_audio_cache() -> Optional[AudioCache]:
+    if not settings.TTS_CACHE_ENABLED:
+        return None
+    return AudioCache(
+        settings.TTS_CACHE_DIR or None,
+        memory_entries=settings.TTS_CACHE_MEMORY_ENTRIES,
+        disk_max_bytes=int(settings.TTS_CACHE_DISK_MAX_MB * 1024 * 1024),
+    )
+
+
+def audio_cache_stats() -> Dict[str, Any]:
+    cache = get_audio_cache()
+    return {"enabled": False} if cache is None else {"enabled": True, **cache.stats()}
@@ -0,0 +1,410 @@
+"""
+Pool de inferência do TTS (KittenTTS/ONNX), separado do threadpool do Starlette.
+
+- TTS_WORKERS > 0: N processos, cada um com seu próprio modelo carregado e o ONNX
+  Runtime fixado em TTS_THREADS_PER_WORKER threads (intra-op); o uso de CPU fica
+  previsível (≈ N × threads) independentemente do número de requisições.
+- TTS_WORKERS = 0: uma única thread no próprio processo (desenvolvimento/testes).
+
+Textos curtos que chegam juntos (até TTS_BATCH_WINDOW_MS de diferença) são agrupados
+em um único envio ao worker (até TTS_BATCH_MAX itens): economiza idas e voltas entre
+processos e, se o modelo expuser `generate_batch`, uma única inferência em lote.
+
+A admissão passa por um Bulkhead: com todas as vagas ocupadas e a fila cheia (ou
+esgotado TTS_QUEUE_TIMEOUT_SEC), falha rápido com TTSBusyError (HTTP 503 + Retry-After).
+Uma síntese que passa de TTS_INFERENCE_TIMEOUT_SEC falha com TTSWorkerError; se um
+processo morrer (BrokenProcessPool), o pool é recriado na próxima requisição.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.llm_limiter import Bulkhead, LLMBusyError
+from app.services.timing import span
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Item enviado ao worker: (texto, voz)
+TTSItem = Tuple[str, str]
+
+
+class TTSBusyError(LLMBusyError):
+    """Pool de síntese de voz sem vaga (mapeado para HTTP 503)."""
+
+    service = "Serviço de voz"
+
+
+class TTSWorkerError(RuntimeError):
+    """Falha da síntese dentro do worker (modelo ausente, erro de inferência)."""
+
+
+class TTSTimeoutError(TTSWorkerError):
+    """Síntese passou de TTS_INFERENCE_TIMEOUT_SEC; `pending` ainda roda no worker."""
+
+    def __init__(self, message: str, pending: Future) -> None:
+        super().__init__(message)
+        self.pending = pending
+
+
+# ------------------------------ lado do worker ------------------------------
+
+def _pin_onnx_threads(threads: int) -> None:
+    """Fixa as threads do ONNX Runtime neste processo (chamado só dentro dos workers)."""
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        return
+
+    base = ort.InferenceSession
+
+    class _PinnedSession(base):  # type: ignore[misc, valid-type]
+        def __init__(self, path_or_bytes, sess_options=None, *args, **kwargs):
+            opts = sess_options or ort.SessionOptions()
+            opts.intra_op_num_threads = threads
+            opts.inter_op_num_threads = 1
+            super().__init__(path_or_bytes, opts, *args, **kwargs)
+
+    # O processo é dedicado ao TTS: a troca vale só para ele
+    ort.InferenceSession = _PinnedSession
+
+
+# Barreira do aquecimento, herdada na criação do processo (não pode ir pela fila de tarefas)
+_WARMUP_BARRIER: Any = None
+
+
+def _worker_init(threads: int, barrier: Any = None) -> None:
+    global _WARMUP_BARRIER
+    _WARMUP_BARRIER = barrier
+    if threads > 0:
+        _pin_onnx_threads(threads)
+    from app.services import text_to_speech
+
+    try:
+        text_to_speech.get_tts_model()
+    except Exception as e:
+        # Não derruba o pool: cada síntese devolve o erro à requisição
+        logger.warning("Worker de TTS sem modelo carregado: %s", e)
+
+
+def warmup_probe(timeout_s: float, voice: Optional[str] = None) -> Dict[str, Any]:
+    """Tarefa de aquecimento: segura o processo na barreira até os N workers chegarem.
+
+    Assim cada uma das N tarefas ocupa um processo diferente e todos sobem e carregam
+    o modelo (no initializer) antes de o aquecimento terminar. Com `voice`, cada worker
+    também faz uma síntese curta, para a 1ª inferência real não pagar o custo inicial.
+    """
+    from app.services import text_to_speech
+
+    try:
+        if _WARMUP_BARRIER is not None:
+            # Um worker que não sobe a tempo quebra a barreira: vira erro no relatório
+            _WARMUP_BARRIER.wait(timeout_s)
+        model = text_to_speech.get_tts_model()
+        if voice:
+            model.generate("Olá.", voice=voice)
+        error = None
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    return {"pid": os.getpid(), "model_loaded": error is None, "error": error}
+
+
+def synthesize_batch(items: List[TTSItem]) -> List[Tuple[bool, Any]]:
+    """Sintetiza um lote no worker. Cada posição: (True, float32 array) ou (False, mensagem)."""
+    import numpy as np
+
+    from app.services import text_to_speech
+
+    try:
+        model = text_to_speech.get_tts_model()
+    except Exception as e:
+        return [(False, str(e))] * len(items)
+
+    voices = {voice for _, voice in items}
+    if len(items) > 1 and len(voices) == 1 and hasattr(model, "generate_batch"):
+        try:
+            arrays = model.generate_batch([text for text, _ in items], voice=voices.pop())
+            return [(True, np.asarray(a, dtype=np.float32)) for a in arrays]
+        except Exception:
+            logger.exception("Falha na síntese em lote; repetindo item a item")
+
+    out: List[Tuple[bool, Any]] = []
+    for text, voice in items:
+        try:
+            audio = model.generate(text, voice=voice)
+            if audio is None:
+                out.append((False, "Modelo não retornou dados de áudio."))
+            else:
+                out.append((True, np.asarray(audio, dtype=np.float32)))
+        except Exception as e:
+            out.append((False, str(e)))
+    return out
+
+
+# ------------------------------ lado da API ------------------------------
+
+class _MicroBatcher:
+    """Junta itens que chegam dentro da janela e os despacha em um único envio."""
+
+    def __init__(
+        self,
+        submit: Callable[[List[TTSItem]], "Future[List[Tuple[bool, Any]]]"],
+        *,
+        max_batch: int,
+        window_s: float,
+    ) -> None:
+        self._submit = submit
+        self.max_batch = max(1, max_batch)
+        self.window_s = max(0.0, window_s)
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[TTSItem, Future]] = []
+        self._timer: Optional[threading.Timer] = None
+        self.batches = 0
+        self.items = 0
+
+    def add(self, item: TTSItem) -> Future:
+        fut: Future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((item, fut))
+            if len(self._pending) >= self.max_batch or self.window_s == 0:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window_s, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._dispatch(batch)
+        return fut
+
+    def _take(self) -> List[Tuple[TTSItem, Future]]:
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if batch:
+            self.batches += 1
+            self.items += len(batch)
+        return batch
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[Tuple[TTSItem, Future]]) -> None:
+        futures = [fut for _, fut in batch]
+        try:
+            job = self._submit([item for item, _ in batch])
+        except Exception as e:
+            for fut in futures:
+                fut.set_exception(e)
+            return
+
+        def done(job: Future) -> None:
+            try:
+                results = job.result()
+            except Exception as e:
+                for fut in futures:
+                    fut.set_exception(e)
+                return
+            for fut, result in zip(futures, results):
+                fut.set_result(result)
+
+        job.add_done_callback(done)
+
+
+class TTSWorkerPool:
+    def __init__(
+        self,
+        *,
+        workers: int,
+        threads_per_worker: int = 1,
+        max_batch: int = 4,
+        batch_window_ms: float = 10.0,
+        batch_max_chars: int = 160,
+        max_queue: int = 16,
+        queue_timeout_s: float = 10.0,
+        inference_timeout_s: float = 60.0,
+    ) -> None:
+        self.workers = max(0, int(workers))
+        self.threads_per_worker = threads_per_worker
+        self.batch_max_chars = batch_max_chars
+        self.inference_timeout_s = inference_timeout_s
+        self.restarts = 0
+        self._executor: Optional[Executor] = None
+        self._barrier: Any = None
+        self._executor_lock = threading.Lock()
+        self.bulkhead = Bulkhead(
+            "tts",
+            limit=max(1, self.workers) * max(1, max_batch),
+            max_queue=max_queue,
+            queue_timeout_s=queue_timeout_s,
+            busy_error=TTSBusyError,
+        )
+        self._batcher = _MicroBatcher(self._submit, max_batch=max_batch, window_s=batch_window_ms / 1000.0)
+
+    def _get_executor(self) -> Executor:
+        # Criado no primeiro uso: importar o módulo não sobe processos
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    if self.workers > 0:
+                        # spawn: não herda as threads/locks do servidor (fork após threads é inseguro)
+                        ctx = multiprocessing.get_context("spawn")
+                        self._barrier = ctx.Barrier(self.workers)
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=ctx,
+                            initializer=_worker_init,
+                            initargs=(self.threads_per_worker, self._barrier),
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+        return self._executor
+
+    def _submit(self, items: List[TTSItem]) -> "Future[List[Tuple[bool, Any]]]":
+        executor = self._get_executor()
+        try:
+            job = executor.submit(synthesize_batch, items)
+        except BrokenProcessPool:
+            self._discard(executor)
+            executor = self._get_executor()
+            job = executor.submit(synthesize_batch, items)
+
+        def check(job: Future) -> None:
+            if isinstance(job.exception(), BrokenProcessPool):
+                self._discard(executor)
+
+        job.add_done_callback(check)
+        return job
+
+    def _discard(self, executor: Executor) -> None:
+        """Descarta um pool quebrado (worker morto); o próximo uso cria outro."""
+        with self._executor_lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.restarts += 1
+        logger.warning("Pool de TTS quebrado (worker encerrado); recriando no próximo uso")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def synthesize(self, text: str, voice: str, *, admitted: bool = False) -> np.ndarray:
+        """Sintetiza `text` (bloqueante). Levanta TTSBusyError sem vaga e TTSWorkerError se falhar.
+
+        `admitted=True`: o chamador já segura uma vaga do bulkhead (ex.: um stream inteiro).
+        """
+        if not admitted:
+            with span("tts_queue"):
+                self.bulkhead.acquire()
+        release = not admitted
+        try:
+            with span("tts_inference"):
+                if len(text) <= self.batch_max_chars:
+                    fut = self._batcher.add((text, voice))
+                else:
+                    # Textos longos vão sozinhos: não atrasam os curtos do mesmo lote
+                    fut = _first_of(self._submit([(text, voice)]))
+                try:
+                    ok, value = fut.result(timeout=self.inference_timeout_s)
+                except FutureTimeoutError:
+                    # O worker segue ocupado: a vaga só volta quando a inferência terminar
+                    if release:
+                        self.release_when_done(fut)
+                        release = False
+                    raise TTSTimeoutError(f"síntese excedeu {self.inference_timeout_s:g}s", fut)
+                except BrokenProcessPool as e:
+                    raise TTSWorkerError(f"worker de TTS encerrado: {e}")
+        finally:
+            if release:
+                self.bulkhead.release()
+        if not ok:
+            raise TTSWorkerError(value)
+        return value
+
+    def release_when_done(self, fut: Future) -> None:
+        """Devolve uma vaga do bulkhead só quando `fut` terminar (síntese que estourou o tempo)."""
+        fut.add_done_callback(lambda _fut: self.bulkhead.release())
+
+    def warmup(self, timeout_s: float = 300.0, voice: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Sobe os workers e carrega o modelo em cada um; devolve um relatório por worker.
+
+        Envia uma tarefa por worker ao mesmo tempo; a barreira impede que um processo
+        pegue duas, então só retorna depois que todos os N processos responderam.
+        """
+        executor = self._get_executor()
+        if self.workers == 0:
+            executor.submit(_worker_init, 0).result(timeout_s)
+            return [executor.submit(warmup_probe, timeout_s, voice).result(timeout_s)]
+        # Uma barreira quebrada num aquecimento anterior (worker lento) não pode travar este
+        self._barrier.reset()
+        futures = [executor.submit(warmup_probe, timeout_s, voice) for _ in range(self.workers)]
+        done, pending = wait(futures, timeout=timeout_s)
+        if pending:
+            raise TTSWorkerError(f"{len(pending)} de {self.workers} workers de TTS não responderam em {timeout_s:g}s")
+        return [fut.result() for fut in futures]
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        batches, items = self._batcher.batches, self._batcher.items
+        return {
+            **self.bulkhead.stats(),
+            "mode": "process" if self.workers else "thread",
+            "workers": self.workers or 1,
+            "threads_per_worker": self.threads_per_worker if self.workers else None,
+            "restarts": self.restarts,
+            "batches": batches,
+            "batched_items": items,
+            "avg_batch_size": round(items / batches, 2) if batches else 0.0,
+        }
+
+
+def _first_of(job: "Future[List[Tuple[bool, Any]]]") -> "Future[Tuple[bool, Any]]":
+    fut: Future = Future()
+
+    def done(job: Future) -> None:
+        try:
+            fut.set_result(job.result()[0])
+        except Exception as e:
+            fut.set_exception(e)
+
+    job.add_done_callback(done)
+    return fut
+
+
+@lru_cache(maxsize=1)
+def get_tts_pool() -> TTSWorkerPool:
+    return TTSWorkerPool(
+        workers=settings.TTS_WORKERS,
+        threads_per_worker=settings.TTS_THREADS_PER_WORKER,
+        max_batch=settings.TTS_BATCH_MAX,
+        batch_window_ms=settings.TTS_BATCH_WINDOW_MS,
+        batch_max_chars=settings.TTS_BATCH_MAX_CHARS,
+        max_queue=settings.TTS_QUEUE_MAX,
+        queue_timeout_s=settings.TTS_QUEUE_TIMEOUT_SEC,
+        inference_timeout_s=settings.TTS_INFERENCE_TIMEOUT_SEC,
+    )
+
+
+def tts_pool_stats() -> Dict[str, Any]:
+    return get_tts_pool().stats()
@@ -0,0 +1,160 @@
+"""
+Aquecimento na inicialização (lifespan): carrega antes do primeiro usuário o que hoje
+seria carregado sob demanda na primeira requisição.
+
+Componentes (WARMUP_COMPONENTS, separados por vírgula, na ordem de execução; só os
+usados pelos papéis do processo em APP_ROLES):
+- kb:            snapshot da KB (JSON/artefato/LSA) + uma recuperação de teste
+- cohere:        clientes Cohere (síncrono e assíncrono, com o pool httpx)
+- stt:           modelo do backend de STT configurado (no-op para 'google')
+- tts:           pool de TTS (sobe todos os workers; cada um carrega o KittenTTS e faz uma síntese de teste)
+- tts_fallbacks: áudio dos textos de fallback no cache (se TTS_PRECOMPUTE_FALLBACKS)
+
+Roda em uma thread: o servidor já responde, mas o /health devolve 503 ("warming_up")
+até terminar, para o balanceador só mandar tráfego a workers aquecidos. Falhas de um
+componente ficam registradas no relatório e não impedem os demais.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from app.core.config import settings
+from app.core.roles import enabled_roles
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupSkipped(Exception):
+    """Componente não se aplica a esta instalação (ex.: KittenTTS ausente)."""
+
+
+def _warm_kb() -> str:
+    from app.services.legal_agent import get_kb_snapshot, rag_retrieve
+
+    snap = get_kb_snapshot()
+    hits = rag_retrieve("injúria racial em ambiente de trabalho", k=3)
+    return f"{len(snap.docs)} documentos, {len(hits)} resultados na consulta de teste"
+
+
+def _warm_cohere() -> str:
+    from app.services.legal_agent import get_async_cohere_client, get_cohere_client
+
+    if not settings.COHERE_API_KEY:
+        raise WarmupSkipped("COHERE_API_KEY não configurada")
+    get_cohere_client()
+    get_async_cohere_client()
+    return "clientes criados"
+
+
+def _warm_stt() -> str:
+    from app.services.stt_backends import get_stt_backend
+
+    backend = get_stt_backend()
+    backend.warmup()
+    return backend.name
+
+
+def _warm_tts() -> str:
+    from app.services import text_to_speech
+
+    if not text_to_speech.kittentts_available():
+        raise WarmupSkipped("KittenTTS não instalado")
+    pool = text_to_speech.get_tts_pool()
+    # Só retorna depois que todos os workers responderam
+    report = pool.warmup(voice=settings.KITTEN_TTS_VOICE_ID)
+    warmed = [worker for worker in report if worker["model_loaded"]]
+    if not warmed:
+        raise RuntimeError(f"nenhum worker de TTS carregou o modelo: {report[0]['error']}")
+    return f"{pool.stats()['mode']}: {len(warmed)}/{len(report)} workers aquecidos"
+
+
+def _warm_tts_fallbacks() -> str:
+    from app.services import text_to_speech
+
+    if not (settings.TTS_PRECOMPUTE_FALLBACKS and settings.TTS_CACHE_ENABLED):
+        raise WarmupSkipped("desativado")
+    if not text_to_speech.kittentts_available():
+        raise WarmupSkipped("KittenTTS não instalado")
+    return f"{text_to_speech.precompute_fallback_audio()} novo(s)"
+
+
+WARMUP_STEPS: Dict[str, Callable[[], str]] = {
+    "kb": _warm_kb,
+    "cohere": _warm_cohere,
+    "stt": _warm_stt,
+    "tts": _warm_tts,
+    "tts_fallbacks": _warm_tts_fallbacks,
+}
+
+# Papéis (APP_ROLES) que usam cada componente; fora deles o componente não é carregado
+_AGENT_ROLES = frozenset({"chat", "conversations"})
+COMPONENT_ROLES: Dict[str, FrozenSet[str]] = {
+    "kb": _AGENT_ROLES,
+    "cohere": _AGENT_ROLES,
+    "stt": frozenset({"audio"}),
+    "tts": frozenset({"audio"}),
+    "tts_fallbacks": frozenset({"audio"}),
+}
+
+_LOCK = threading.Lock()
+# idle: lifespan não rodou (ex.: testes sem contexto) | running | ready
+_STATE: Dict[str, Any] = {"status": "idle", "components": {}, "total_ms": None}
+
+
+def configured_components() -> List[str]:
+    names = [n.strip().lower() for n in (settings.WARMUP_COMPONENTS or "").split(",") if n.strip()]
+    unknown = [n for n in names if n not in WARMUP_STEPS]
+    if unknown:
+        logger.warning("WARMUP_COMPONENTS desconhecidos ignorados: %s", ", ".join(unknown))
+    roles = enabled_roles()
+    return [n for n in names if n in WARMUP_STEPS and COMPONENT_ROLES.get(n, roles) & roles]
+
+
+def run_warmup(components: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Executa os componentes em sequência, registrando status e tempo de cada um."""
+    names = configured_components() if components is None else components
+    started = time.perf_counter()
+    with _LOCK:
+        _STATE.update(status="running", components={}, total_ms=None)
+    for name in names:
+        t0 = time.perf_counter()
+        try:
+            entry: Dict[str, Any] = {"status": "ok", "detail": WARMUP_STEPS[name]()}
+        except WarmupSkipped as e:
+            entry = {"status": "skipped", "detail": str(e)}
+        except Exception as e:
+            logger.exception("Falha no aquecimento de '%s'", name)
+            entry = {"status": "error", "detail": str(e)}
+        entry["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        logger.info("Aquecimento %s: %s em %.1f ms (%s)", name, entry["status"], entry["ms"], entry["detail"])
+        with _LOCK:
+            _STATE["components"][name] = entry
+    with _LOCK:
+        _STATE.update(status="ready", total_ms=round((time.perf_counter() - started) * 1000, 1))
+    return warmup_status()
+
+
+def start_warmup() -> None:
+    """Marca o worker como não pronto e aquece em segundo plano."""
+    names = configured_components()
+    with _LOCK:
+        _STATE.update(status="running", components={}, total_ms=None)
+    threading.Thread(target=run_warmup, args=(names,), name="warmup", daemon=True).start()
+
+
+def is_ready() -> bool:
+    # 'idle' conta como pronto: sem lifespan não há aquecimento a esperar
+    return _STATE["status"] != "running"
+
+
+def warmup_status() -> Dict[str, Any]:
+    with _LOCK:
+        return {
+            "status": _STATE["status"],
+            "components": {k: dict(v) for k, v in _STATE["components"].items()},
+            "total_ms": _STATE["total_ms"],
+        }
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+_PROBE = """
+import json, sys
+import app.main
+from app.services.warmup import configured_components
+paths = sorted(app.main.app.openapi()["paths"])
+print(json.dumps({
+    "paths": paths,
+    "modules": sorted(m for m in sys.modules if m.startswith("app.")),
+    "warmup": configured_components(),
+}))
+"""
+
+
+def _boot(roles):
+    # app.main monta os routers na importação: cada papel roda em um processo novo
+    env = {**os.environ, "APP_ROLES": roles}
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=Path(__file__).resolve().parents[2],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    return proc
+
+
+def _describe(roles):
+    proc = _boot(roles)
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout)
+
+
+def test_chat_role_skips_audio_stack():
+    info = _describe("chat,conversations")
+
+    assert "/api/v1/chat" in info["paths"] and "/api/v1/conversations" in info["paths"]
+    assert "/api/v1/health" in info["paths"] and "/api/v1/sessions" in info["paths"]
+    assert not any("speech" in p or p.startswith("/api/v1/admin") for p in info["paths"])
+    assert "app.services.speech_to_text" not in info["modules"]
+    assert "app.services.text_to_speech" not in info["modules"]
+    assert info["warmup"] == ["kb", "cohere"]
+
+
+def test_audio_role_skips_agent_routes():
+    info = _describe("audio")
+
+    assert "/api/v1/text-to-speech" in info["paths"]
+    assert "/api/v1/chat" not in info["paths"]
+    assert "app.api.v1.routes.conversations" not in info["modules"]
+    assert info["warmup"] == ["stt", "tts", "tts_fallbacks"]
+
+
+def test_unknown_role_fails_startup():
+    proc = _boot("chat,audi0")
+    assert proc.returncode != 0
+    assert "APP_ROLES inválido" in proc.stderr
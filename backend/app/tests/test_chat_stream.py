@@ -0,0 +1,56 @@
+from app.api.v1.routes import chat as chat_routes
+from app.core.config import settings
+from app.services.kv_store import MemoryTTLStore, SQLiteTTLStore
+
+
+def test_chat_stream_two_steps(client, monkeypatch):
+    monkeypatch.setattr(settings, "COHERE_API_KEY", "test-key")
+    monkeypatch.setattr(chat_routes, "CHAT_STATE", MemoryTTLStore())
+
+    async def fake_clarify(user_message, k=5):
+        return "<clarify>\nQ1: Onde?\nQ2: Quando?\nQ3: Quem?\n</clarify>"
+
+    async def fake_stream(U0, Qs, U1, conversation_id=None, k=5):
+        yield {"type": "token", "text": "Em tese, "}
+        yield {"type": "token", "text": "pode haver injúria racial."}
+        yield {"type": "end", "text": "Em tese, pode haver injúria racial.", "citations": [{"text": "Lei 7.716"}]}
+
+    monkeypatch.setattr(chat_routes, "generate_clarify_questions_async", fake_clarify)
+    monkeypatch.setattr(chat_routes, "stream_final_answer", fake_stream)
+
+    body = {"user_message": "Sofri injúria racial no trabalho", "conversation_id": "t1"}
+    r = client.post("/api/v1/chat/stream", json=body)
+    assert r.headers["content-type"].startswith("text/event-stream")
+    assert "event: clarify" in r.text
+
+    body = {"user_message": "Foi no trabalho, ontem, um colega por injúria racial", "conversation_id": "t1"}
+    r = client.post("/api/v1/chat/stream", json=body)
+    events = [line.split(": ", 1)[1] for line in r.text.splitlines() if line.startswith("event: ")]
+    assert events == ["token", "token", "citations", "done"]
+    assert chat_routes.CHAT_STATE.get("t1") is None
+
+
+def test_chat_state_shared_between_workers(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "COHERE_API_KEY", "test-key")
+    path = str(tmp_path / "state.sqlite3")
+
+    async def fake_clarify(user_message, k=5):
+        return "<clarify>\nQ1: Onde?\nQ2: Quando?\nQ3: Quem?\n</clarify>"
+
+    async def fake_final(U0, Qs, U1, conversation_id=None, k=5):
+        return {"text": f"Resposta sobre: {U0}", "citations": []}
+
+    monkeypatch.setattr(chat_routes, "generate_clarify_questions_async", fake_clarify)
+    monkeypatch.setattr(chat_routes, "generate_final_answer_async", fake_final)
+
+    # Etapa A no "worker 1"
+    monkeypatch.setattr(chat_routes, "CHAT_STATE", SQLiteTTLStore(path, namespace="chat_state"))
+    body = {"user_message": "Sofri injúria racial no trabalho", "conversation_id": "w1"}
+    assert client.post("/api/v1/chat", json=body).status_code == 200
+
+    # Etapa B no "worker 2": outra conexão/instância sobre o mesmo arquivo
+    monkeypatch.setattr(chat_routes, "CHAT_STATE", SQLiteTTLStore(path, namespace="chat_state"))
+    body = {"user_message": "Foi no trabalho, ontem, um colega por injúria racial", "conversation_id": "w1"}
+    r = client.post("/api/v1/chat", json=body)
+    assert r.json()["response_text"] == "Resposta sobre: Sofri injúria racial no trabalho"
+    assert chat_routes.CHAT_STATE.get("w1") is None
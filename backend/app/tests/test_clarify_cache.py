@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from app.services import clarify_cache, legal_agent
+from app.services.kv_store import KVStore, MemoryTTLStore, SQLiteTTLStore
+
+
+DOCS = [{"title": "Lei 7.716/1989, Art. 20"}, {"title": "Injúria racial"}]
+
+
+def test_fingerprint_ignores_case_accents_punctuation_and_order():
+    a = clarify_cache.fingerprint("Sofri racismo no trabalho!", DOCS)
+    b = clarify_cache.fingerprint("  no TRABALHO, sofri   racismo", list(reversed(DOCS)))
+    assert a == b
+    assert a != clarify_cache.fingerprint("Sofri racismo no trabalho", DOCS[:1])
+
+
+def test_memory_store_lru_and_ttl():
+    store = MemoryTTLStore(max_entries=2, ttl_s=60)
+    store.set("a", 1)
+    store.set("b", 2)
+    assert store.get("a") == 1
+    store.set("c", 3)  # "b" é o menos usado recentemente
+    assert store.get("b") is None
+    store.set("d", 4, ttl_s=-1)
+    store.set("e", 5, ttl_s=0.0001)
+    asyncio.run(asyncio.sleep(0.01))
+    assert store.get("e") is None
+    stats = store.stats()
+    assert stats["evictions"] >= 2 and stats["expirations"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = SQLiteTTLStore(path, namespace="clarify", max_entries=2, ttl_s=60)
+    second = SQLiteTTLStore(path, namespace="clarify", max_entries=2, ttl_s=60)
+    first.set("k1", "<clarify>Q1</clarify>")
+    assert second.get("k1") == "<clarify>Q1</clarify>"
+    first.set("k2", 2)
+    first.set("k3", 3)
+    assert len(second) == 2
+    assert second.stats()["hits"] == 1
+
+
+def test_sqlite_store_checks_cap_every_n_writes_and_interface_is_abstract(tmp_path):
+    store = SQLiteTTLStore(str(tmp_path / "cache.sqlite3"), max_entries=2, ttl_s=60, prune_every=3)
+    for i in range(5):
+        store.set(f"k{i}", i)
+    # 3ª escrita podou para 2; as duas seguintes ainda não foram conferidas
+    assert len(store) == 4
+    store.set("k5", 5)
+    assert len(store) == 2 and store.get("k5") == 5
+
+    class Incomplete(KVStore):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_clarify_questions_cached_but_not_fallbacks(monkeypatch):
+    calls = []
+    store = MemoryTTLStore(max_entries=8, ttl_s=60)
+
+    async def fake_call(**kwargs):
+        calls.append(kwargs)
+        return {"text": "<clarify>\nQ1: a?\nQ2: b?\nQ3: c?\n</clarify>", "citations": [], "fallback": len(calls) == 1}
+
+    monkeypatch.setattr(legal_agent, "call_model_with_timeout_async", fake_call)
+    monkeypatch.setattr(legal_agent, "rag_retrieve", lambda q, k=5: DOCS)
+    monkeypatch.setattr(legal_agent, "get_clarify_cache", lambda: store)
+
+    asyncio.run(legal_agent.generate_clarify_questions_async("Sofri racismo no trabalho"))
+    asyncio.run(legal_agent.generate_clarify_questions_async("Sofri racismo no trabalho"))
+    asyncio.run(legal_agent.generate_clarify_questions_async("sofri RACISMO no trabalho."))
+
+    # 1ª chamada devolveu fallback (não cacheada); 2ª foi ao modelo; 3ª veio do cache
+    assert len(calls) == 2
+    assert store.stats()["hits"] == 1
@@ -2,3 +2,58 @@ def test_health(client):
     r = client.get('/api/v1/health')
     assert r.status_code == 200
     assert r.json() == {'status': 'ok'}
+
+
+def test_health_reports_not_ready_until_warmup_finishes(client, monkeypatch):
+    import threading
+
+    from app.services import warmup
+
+    release = threading.Event()
+
+    def no_model():
+        raise warmup.WarmupSkipped("sem modelo")
+
+    monkeypatch.setitem(warmup.WARMUP_STEPS, "kb", lambda: release.wait(5) and "ok")
+    monkeypatch.setitem(warmup.WARMUP_STEPS, "tts", no_model)
+    monkeypatch.setattr(warmup.settings, "WARMUP_COMPONENTS", "kb, tts, desconhecido")
+
+    warmup.start_warmup()
+    r = client.get('/api/v1/health')
+    assert r.status_code == 503
+    assert r.json()['status'] == 'warming_up'
+
+    release.set()
+    for _ in range(100):
+        if warmup.is_ready():
+            break
+        threading.Event().wait(0.02)
+    assert client.get('/api/v1/health').json() == {'status': 'ok'}
+    report = warmup.warmup_status()
+    assert report['components']['kb']['status'] == 'ok'
+    assert report['components']['tts']['status'] == 'skipped'
+    assert list(report['components']) == ['kb', 'tts'] and report['total_ms'] >= 0
+
+
+def test_tts_warmup_reports_every_warmed_worker(monkeypatch):
+    import numpy as np
+
+    from app.services import text_to_speech, warmup
+    from app.services.tts_pool import TTSWorkerPool
+
+    class FakeModel:
+        calls = []
+
+        def generate(self, text, voice=None):
+            self.calls.append(voice)
+            return np.zeros(10, dtype=np.float32)
+
+    pool = TTSWorkerPool(workers=0)
+    monkeypatch.setattr(text_to_speech, "kittentts_available", lambda: True)
+    monkeypatch.setattr(text_to_speech, "get_tts_pool", lambda: pool)
+    monkeypatch.setattr(text_to_speech, "get_tts_model", lambda: FakeModel())
+    try:
+        assert warmup._warm_tts() == "thread: 1/1 workers aquecidos"
+        assert FakeModel.calls == [warmup.settings.KITTEN_TTS_VOICE_ID]
+    finally:
+        pool.shutdown()
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Orçamento de importação do app.main (ms, medido com `python -X importtime`); ajustável por env em CI lento
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+
+# Dependências pesadas que só devem ser carregadas no primeiro uso (STT, TTS, LLM)
+LAZY_MODULES = {"cohere", "httpx", "numpy", "soundfile", "speech_recognition", "kittentts", "onnxruntime", "torch"}
+
+
+def _importtime(module: str):
+    backend_dir = Path(__file__).resolve().parents[2]
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            timings[name.strip()] = int(cumulative) / 1000.0
+    return timings
+
+
+def test_app_import_skips_heavy_dependencies_and_fits_budget():
+    timings = _importtime("app.main")
+
+    assert not LAZY_MODULES & set(timings)
+    assert timings["app.main"] < IMPORT_BUDGET_MS
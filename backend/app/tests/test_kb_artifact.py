@@ -0,0 +1,44 @@
+import json
+import os
+
+from app.services.kb_artifact import MappedBM25Index, build_artifact, load_artifact
+from app.services.kb_index import BM25Index
+from app.services.legal_agent import load_kb_from_dir
+
+
+DOCS = [
+    {"title": "Injúria racial", "content": "ofensa em razão de raça", "tags": ["injuria_racial"]},
+    {"title": "Direitos do consumidor", "content": "produto com defeito, procon", "tags": ["consumidor"]},
+]
+
+
+def _write_kb(tmp_path):
+    kb = tmp_path / "kb"
+    kb.mkdir()
+    (kb / "docs.json").write_text(json.dumps(DOCS), encoding="utf-8")
+    return kb
+
+
+def test_mapped_index_matches_in_memory_index(tmp_path):
+    kb = _write_kb(tmp_path)
+    out = build_artifact(str(kb), str(tmp_path / "kb_index.bin"))
+    mapped = MappedBM25Index(out)
+    plain = BM25Index(load_kb_from_dir(str(kb)))
+
+    assert len(mapped.docs) == 2
+    assert mapped.docs[1]["title"] == "Direitos do consumidor"
+    for query in ["injúria racial", "procon defeito", "inexistente"]:
+        got = [(i, round(s, 4)) for i, s in mapped.search(query, k=2)]
+        expected = [(i, round(s, 4)) for i, s in plain.search(query, k=2)]
+        assert got == expected
+
+
+def test_stale_artifact_is_ignored(tmp_path):
+    kb = _write_kb(tmp_path)
+    out = build_artifact(str(kb), str(tmp_path / "kb_index.bin"))
+    assert load_artifact(str(kb), out) is not None
+
+    src = kb / "docs.json"
+    st = os.stat(src)
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert load_artifact(str(kb), out) is None
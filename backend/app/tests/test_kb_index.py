@@ -0,0 +1,26 @@
+from app.services.kb_index import BM25Index, tokenize
+
+
+DOCS = [
+    {"title": "Injúria racial", "_fulltext": "injúria racial ofensa à dignidade em razão de raça", "tags": ["injuria_racial"]},
+    {"title": "Direitos do consumidor", "_fulltext": "produto com defeito troca reparo procon", "tags": ["consumidor"]},
+    {"title": "Capoeira", "_fulltext": "capoeira patrimônio cultural", "tags": ["cultura"]},
+]
+
+
+def test_tokenize_folds_accents_and_underscores():
+    assert tokenize("Injúria_Racial, RAÇA!") == ["injuria", "racial", "raca"]
+
+
+def test_search_ranks_by_postings():
+    index = BM25Index(DOCS)
+    top = index.search("sofri injuria racial", k=1)
+    assert [doc_id for doc_id, _ in top] == [0]
+    assert top[0][1] > 0
+
+
+def test_search_pads_with_tiebreak_order():
+    index = BM25Index(DOCS, tiebreak=[1.0, 3.0, 2.0])
+    top = index.search("procon", k=3)
+    assert [doc_id for doc_id, _ in top] == [1, 2, 0]
+    assert index.search("procon", k=3, pad=False) == top[:1]
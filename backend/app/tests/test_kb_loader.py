@@ -0,0 +1,48 @@
+import json
+
+from app.services.legal_agent import load_kb_from_dir
+
+
+LAW = {
+    "metadados": {"tipo_ato": "Lei", "numero": "7716", "ano": 1989, "ementa": "Define os crimes de preconceito."},
+    "texto": {
+        "artigos": [
+            {"artigo_num": "2", "anchor": "#art2", "caput": "Vetado.", "editorial": {"vetado": True}},
+            {
+                "artigo_num": "20",
+                "anchor": "#art20",
+                "caput": "Praticar, induzir ou incitar a discriminação.",
+                "pena": "reclusão de 1 a 3 anos e multa",
+                "pena_normalizada": {"reclusao_anos_min": 1, "reclusao_anos_max": 3, "multa": True},
+                "paragrafos": [{"paragrafo": "§2º", "texto": "Por meio de redes sociais.", "tags_contexto": ["internet"]}],
+                "tags_contexto": ["discriminacao"],
+            },
+        ]
+    },
+    "rag_chunks": [{"id": "art20_meios", "anchor": "#art20", "text": "Crime em redes sociais."}],
+}
+
+
+def test_law_is_split_into_linked_units(tmp_path):
+    (tmp_path / "lei.json").write_text(json.dumps(LAW), encoding="utf-8")
+    docs = load_kb_from_dir(str(tmp_path))
+    by_title = {d["title"]: d for d in docs}
+
+    assert set(by_title) == {
+        "Lei 7716/1989",
+        "Lei 7716/1989, art. 20",
+        "Lei 7716/1989, art. 20, §2º",
+        "Lei 7716/1989, trecho art20_meios",
+    }
+    law = by_title["Lei 7716/1989"]
+    assert law["content"] == "Define os crimes de preconceito."
+
+    art = by_title["Lei 7716/1989, art. 20"]
+    assert art["parent_id"] == law["id"]
+    assert art["anchor"] == "#art20"
+    assert art["pena_normalizada"]["multa"] is True
+    assert "Pena: reclusão de 1 a 3 anos e multa." in art["content"]
+
+    par = by_title["Lei 7716/1989, art. 20, §2º"]
+    assert par["tags"] == ["discriminacao", "internet"]
+    assert par["content"].startswith("Art. 20. Praticar")
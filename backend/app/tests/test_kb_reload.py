@@ -0,0 +1,30 @@
+import json
+
+from app.core.config import settings
+from app.services import legal_agent
+
+
+def _write(path, title, content):
+    path.write_text(json.dumps({"title": title, "content": content}), encoding="utf-8")
+
+
+def test_reload_swaps_snapshot_and_reparses_only_changed_files(tmp_path, monkeypatch):
+    _write(tmp_path / "a.json", "Consumidor", "produto com defeito procon")
+    _write(tmp_path / "b.json", "Trabalho", "assédio no emprego")
+    monkeypatch.setattr(settings, "KB_DIR", str(tmp_path))
+    monkeypatch.setattr(legal_agent, "_KB_SNAPSHOT", None)
+
+    first = legal_agent.get_kb_snapshot()
+    assert first.source == "json"
+    assert [d["title"] for d in legal_agent.rag_retrieve("procon", k=1)] == ["Consumidor"]
+
+    _write(tmp_path / "b.json", "Capoeira", "capoeira patrimônio cultural imaterial")
+    second = legal_agent.reload_kb()
+
+    assert second is legal_agent.get_kb_snapshot()
+    assert second.version == first.version + 1
+    assert legal_agent.kb_status()["last_reloaded_files"] == ["b.json"]
+    assert second.files["a.json"] is first.files["a.json"]
+    assert [d["title"] for d in legal_agent.rag_retrieve("capoeira", k=1)] == ["Capoeira"]
+    # O snapshot anterior permanece intacto para quem ainda o referencia
+    assert [d["title"] for d in first.docs] == ["Consumidor", "Trabalho"]
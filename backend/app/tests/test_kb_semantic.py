@@ -0,0 +1,65 @@
+import numpy as np
+
+from app.services.kb_index import tokenize
+from app.services.kb_semantic import LSAModel, fit_lsa
+
+
+DOCS = [
+    {"id": "racial", "_fulltext": "injúria racial ofensa cor da pele raça discriminação"},
+    {"id": "racismo", "_fulltext": "racismo discriminação raça cor preconceito"},
+    {"id": "consumo", "_fulltext": "produto com defeito troca garantia procon"},
+    {"id": "garantia", "_fulltext": "garantia do produto prazo de troca consumidor"},
+]
+
+
+def test_lsa_matches_related_terms_without_overlap():
+    model = fit_lsa(DOCS, dim=2)
+    assert model.doc_vectors.dtype == np.float32
+    # "preconceito" só aparece em 'racismo', mas o espaço latente aproxima 'racial'
+    top = [model.doc_keys[i] for i, _ in model.search("preconceito", k=2)]
+    assert set(top) == {"racial", "racismo"}
+    assert model.scores("palavra inexistente") is None
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    model = fit_lsa(DOCS, dim=2)
+    model.save(str(tmp_path), manifest={"docs.json": [1, 2]}, options={"dim": 2})
+    loaded, meta = LSAModel.load(str(tmp_path))
+    assert meta["manifest"] == {"docs.json": [1, 2]}
+    assert loaded.doc_keys == model.doc_keys
+    np.testing.assert_allclose(loaded.scores("procon"), model.scores("procon"), rtol=1e-5)
+
+
+def _dense_reference_scores(docs, query):
+    # Mesmo ajuste com a matriz densa N x V (a implementação usa só linhas esparsas)
+    model = fit_lsa(docs, dim=2)
+    x = np.zeros((len(docs), len(model.vocab)), dtype=np.float64)
+    index = {t: i for i, t in enumerate(model.vocab)}
+    n = len(docs)
+    toks = [tokenize(d["_fulltext"]) for d in docs]
+    df = {t: sum(t in doc_toks for doc_toks in toks) for t in model.vocab}
+    for row, doc_toks in enumerate(toks):
+        for t in set(doc_toks):
+            if t in index:
+                c = doc_toks.count(t)
+                x[row, index[t]] = (1 + np.log(c)) * (np.log((1 + n) / (1 + df[t])) + 1)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    _u, _s, vt = np.linalg.svd(x, full_matrices=False)
+    basis = vt[:2].T
+    docs_lat = x @ basis
+    docs_lat /= np.linalg.norm(docs_lat, axis=1, keepdims=True)
+    q = np.zeros(len(model.vocab))
+    q[index[query]] = np.log((1 + n) / (1 + df[query])) + 1
+    q = q @ basis
+    return model.scores(query), docs_lat @ (q / np.linalg.norm(q))
+
+
+def test_sparse_fit_matches_dense_svd_in_both_gram_shapes():
+    # Mais termos que documentos (Gram N x N) e mais documentos que termos (Gram V x V)
+    wide = DOCS
+    tall = [{"id": str(i), "_fulltext": text} for i, text in enumerate(
+        ["garantia troca", "troca troca garantia", "racismo cor", "cor racismo racismo", "garantia", "cor"]
+    )]
+    for docs, query in ((wide, "garantia"), (tall, "troca")):
+        got, expected = _dense_reference_scores(docs, query)
+        np.testing.assert_allclose(got, expected, atol=1e-4)
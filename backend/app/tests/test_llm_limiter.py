@@ -0,0 +1,139 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services import llm_limiter
+from app.services.llm_limiter import Bulkhead, LLMBusyError
+
+
+def test_async_bulkhead_queues_then_fails_fast():
+    bulkhead = Bulkhead("final", limit=1, max_queue=1, queue_timeout_s=5)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with bulkhead.aslot():
+                await release.wait()
+
+        first = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert bulkhead.stats()["queue_depth"] == 1
+
+        with pytest.raises(LLMBusyError):
+            await bulkhead.aacquire()
+
+        release.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+    stats = bulkhead.stats()
+    assert stats["admitted"] == 2 and stats["rejected"] == 1
+    assert stats["active"] == 0 and stats["queue_depth"] == 0
+
+
+def test_sync_bulkhead_queue_timeout():
+    bulkhead = Bulkhead("cleanup", limit=1, max_queue=4, queue_timeout_s=0.05)
+    bulkhead.acquire()
+    errors = []
+
+    def waiter():
+        try:
+            bulkhead.acquire()
+        except LLMBusyError as e:
+            errors.append(e)
+
+    th = threading.Thread(target=waiter)
+    th.start()
+    th.join()
+    bulkhead.release()
+
+    assert errors and errors[0].reason == "tempo de espera esgotado"
+    assert bulkhead.stats()["timeouts"] == 1 and bulkhead.stats()["active"] == 0
+
+
+def test_chat_returns_503_when_llm_queue_is_full(client, monkeypatch):
+    from app.api.v1.routes import chat as chat_routes
+    from app.core.config import settings
+    from app.services.kv_store import MemoryTTLStore
+
+    monkeypatch.setattr(settings, "COHERE_API_KEY", "test-key")
+    monkeypatch.setattr(chat_routes, "CHAT_STATE", MemoryTTLStore())
+
+    async def busy(user_message, k=5):
+        raise LLMBusyError("clarify", "fila cheia")
+
+    monkeypatch.setattr(chat_routes, "generate_clarify_questions_async", busy)
+    r = client.post("/api/v1/chat", json={"user_message": "oi", "conversation_id": "busy"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
+
+
+def test_bulkheads_are_isolated_per_call_type(monkeypatch):
+    monkeypatch.setattr(llm_limiter, "_BULKHEADS", {})
+    assert llm_limiter.get_bulkhead("cleanup") is not llm_limiter.get_bulkhead("final")
+    assert llm_limiter.get_bulkhead(None) is llm_limiter.get_bulkhead("final")
+
+
+def test_stream_final_answer_releases_slot_when_client_fails(monkeypatch):
+    from app.services import legal_agent
+
+    monkeypatch.setattr(llm_limiter, "_BULKHEADS", {})
+    monkeypatch.setattr(legal_agent, "rag_retrieve", lambda query, k=5: [])
+
+    def broken_client():
+        raise RuntimeError("sem cliente")
+
+    monkeypatch.setattr(legal_agent, "get_async_cohere_client", broken_client)
+
+    async def consume():
+        async for _ in legal_agent.stream_final_answer("U0", ["Q1", "Q2", "Q3"], "U1"):
+            pass
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            asyncio.run(consume())
+    assert llm_limiter.get_bulkhead("final").stats()["active"] == 0
+
+
+def test_conversation_new_topic_busy_clarify_is_not_retried_as_final(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.api.v1.routes import conversations as conv_routes
+    from app.services import legal_agent
+
+    final_calls = []
+
+    class FakeService:
+        def __init__(self, db):
+            pass
+
+        def get_conversation(self, conversation_id, guest_id=None):
+            return SimpleNamespace(id=conversation_id)
+
+        def add_message(self, **kwargs):
+            return SimpleNamespace(**kwargs)
+
+        def list_messages(self, conversation_id):
+            return []
+
+    async def busy(user_message, k=5):
+        raise LLMBusyError("clarify", "fila cheia")
+
+    async def final(**kwargs):
+        final_calls.append(kwargs)
+        return {"text": "final"}
+
+    monkeypatch.setattr(conv_routes, "ConversationService", FakeService)
+    monkeypatch.setattr(conv_routes, "_clarify_context", lambda history: ("U0", ["Q1", "Q2", "Q3"]))
+    monkeypatch.setattr(legal_agent, "is_new_topic", lambda U0, Qs, U1: True)
+    monkeypatch.setattr(conv_routes, "generate_clarify_questions_async", busy)
+    monkeypatch.setattr(conv_routes, "generate_final_answer_async", final)
+
+    payload = SimpleNamespace(role="user", content="Outro assunto")
+    with pytest.raises(LLMBusyError):
+        asyncio.run(conv_routes.post_message(1, payload, db=None, current_user=SimpleNamespace(guest_id="g1")))
+    assert final_calls == []
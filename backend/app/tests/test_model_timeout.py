@@ -0,0 +1,23 @@
+import asyncio
+
+from app.services import legal_agent
+
+
+def test_async_timeout_cancels_call_and_returns_fallback(monkeypatch):
+    state = {"cancelled": False}
+
+    async def slow_call(**kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        return {"text": "tarde demais", "citations": []}
+
+    monkeypatch.setattr(legal_agent, "call_model_async", slow_call)
+    resp = asyncio.run(
+        legal_agent.call_model_with_timeout_async("oi", None, mode="clarify", timeout_s=0.05)
+    )
+
+    assert resp["text"].startswith("<clarify>")
+    assert state["cancelled"] is True
@@ -0,0 +1,197 @@
+import asyncio
+import time
+
+from app.services import speech_to_text
+
+
+def test_transcription_runs_off_the_event_loop(monkeypatch):
+    def slow_transcribe(filepath, *, language="pt-BR"):
+        time.sleep(0.2)  # ffmpeg + reconhecimento bloqueantes
+        return f"ok:{filepath}", 1.0
+
+    monkeypatch.setattr(speech_to_text, "transcribe_audio_file", slow_transcribe)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        result = await speech_to_text.transcribe_audio_file_async("a.webm")
+        tick_task.cancel()
+        return result, ticks
+
+    (transcript, duration), ticks = asyncio.run(scenario())
+    assert transcript == "ok:a.webm" and duration == 1.0
+    # O loop continuou atendendo outras tarefas durante a transcrição
+    assert ticks >= 5
+
+
+def test_pcm_pipeline_falls_back_to_temp_file_for_unseekable_input(monkeypatch):
+    seen = []
+
+    def fake_ffmpeg(cmd, data):
+        src = cmd[cmd.index("-i") + 1]
+        seen.append((src, data))
+        if src == "pipe:0":
+            raise RuntimeError("ffmpeg falhou ao converter o arquivo. Detalhes: moov atom not found")
+        return b"\x00\x00" * speech_to_text.PCM_SAMPLE_RATE * 2  # 2 s de silêncio
+
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "STT_VAD_ENABLED", False)
+    monkeypatch.setattr(speech_to_text, "_run_ffmpeg", fake_ffmpeg)
+    monkeypatch.setattr(speech_to_text, "_recognize_pcm", lambda pcm, language: f"{len(pcm)} bytes")
+
+    transcript, duration = speech_to_text.transcribe_audio_bytes(b"m4a-bytes", filename="rec.m4a")
+
+    assert seen[0] == ("pipe:0", b"m4a-bytes")
+    assert seen[1][0].endswith(".m4a") and seen[1][1] is None
+    assert transcript == "64000 bytes" and duration == 2.0
+
+
+def _wav_bytes(seconds: float, rate: int = 8000) -> bytes:
+    import io
+
+    import numpy as np
+    import soundfile as sf
+
+    buf = io.BytesIO()
+    sf.write(buf, np.zeros(int(seconds * rate), dtype="int16"), rate, format="WAV")
+    return buf.getvalue()
+
+
+def test_over_length_upload_rejected_before_transcoding(client, monkeypatch, tmp_path):
+    from types import SimpleNamespace
+
+    from app.api.deps import get_current_guest
+    from app.api.v1.routes import audio as audio_routes
+    from app.main import app
+
+    def no_transcription(*args, **kwargs):
+        raise AssertionError("não deveria transcodificar/transcrever")
+
+    monkeypatch.setattr(speech_to_text, "transcribe_audio_bytes", no_transcription)
+    monkeypatch.setattr(audio_routes, "_get_upload_base", lambda: tmp_path)
+    app.dependency_overrides[get_current_guest] = lambda: SimpleNamespace(guest_id="g1")
+    try:
+        files = {"audio": ("long.wav", _wav_bytes(60), "audio/wav")}
+        r = client.post("/api/v1/speech-to-text", files=files)
+    finally:
+        app.dependency_overrides.pop(get_current_guest, None)
+
+    assert r.status_code == 400
+    assert "excede 45s" in r.json()["detail"]
+
+
+def test_probe_duration_reads_wav_header():
+    assert abs(speech_to_text.probe_duration(_wav_bytes(2.5)) - 2.5) < 1e-6
+
+
+def _pcm(*parts):
+    """Concatena trechos (segundos, amplitude) de senoide 220 Hz com ruído leve."""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    rate = speech_to_text.PCM_SAMPLE_RATE
+    chunks = []
+    for seconds, amp in parts:
+        t = np.arange(int(seconds * rate)) / rate
+        chunks.append(amp * np.sin(2 * np.pi * 220 * t) + rng.normal(0, 30, t.shape))
+    return np.concatenate(chunks).astype("<i2").tobytes()
+
+
+def test_vad_trims_silence_and_shortens_long_pauses(monkeypatch):
+    from app.core.config import settings
+
+    pcm = _pcm((2, 0), (1, 8000), (3, 0), (1, 8000), (2, 0))
+    monkeypatch.setattr(settings, "STT_VAD_PAD_MS", 100)
+
+    monkeypatch.setattr(settings, "STT_VAD_MAX_PAUSE_MS", 0)
+    trimmed = speech_to_text.pcm_duration_seconds(speech_to_text.trim_silence(pcm))
+    assert 5.0 <= trimmed <= 5.4
+
+    monkeypatch.setattr(settings, "STT_VAD_MAX_PAUSE_MS", 500)
+    assert len(speech_to_text.speech_segments(pcm)) == 2
+    split = speech_to_text.pcm_duration_seconds(speech_to_text.trim_silence(pcm))
+    assert 2.0 <= split <= 2.6
+
+
+def test_silence_only_skips_recognition(monkeypatch):
+    monkeypatch.setattr(speech_to_text, "decode_to_pcm", lambda data, **kw: _pcm((3, 0)))
+    monkeypatch.setattr(speech_to_text, "_recognize_pcm", lambda pcm, language: 1 / 0)
+    assert speech_to_text.transcribe_audio_bytes(b"x") == ("[Inaudível]", 0.0)
+
+
+def test_upload_over_byte_cap_is_rejected():
+    from fastapi.testclient import TestClient
+
+    from app.api import upload_limit
+    from app.main import app
+
+    limited = upload_limit.BodySizeLimitMiddleware(app, max_bytes=1024, path_prefixes=["/api/v1/speech-to-text"])
+    small_client = TestClient(limited)
+    files = {"audio": ("big.wav", b"\x00" * 4096, "audio/wav")}
+    r = small_client.post("/api/v1/speech-to-text", files=files)
+    assert r.status_code == 413
+
+    # Sem Content-Length (chunked): o limite é aplicado durante a leitura
+    def body():
+        yield b"--x\r\nContent-Disposition: form-data; name=\"audio\"; filename=\"a.wav\"\r\n\r\n"
+        for _ in range(8):
+            yield b"\x00" * 512
+
+    r = small_client.post(
+        "/api/v1/speech-to-text",
+        content=body(),
+        headers={"content-type": "multipart/form-data; boundary=x", "x-guest-id": "g1"},
+    )
+    assert r.status_code == 413
+
+
+def test_identical_upload_reuses_blob_and_cached_transcript(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+
+    from fastapi.testclient import TestClient
+
+    from app.api.deps import get_current_guest
+    from app.api.v1.routes import audio as audio_routes
+    from app.core.config import settings
+    from app.main import app
+    from app.services.kv_store import MemoryTTLStore
+
+    calls = []
+
+    async def fake_transcribe(content, **kwargs):
+        calls.append(len(content))
+        return "sofri racismo no trabalho", 2.5
+
+    store = MemoryTTLStore()
+    monkeypatch.setattr(settings, "STT_PREPROCESS_MODE", "off")
+    monkeypatch.setattr(audio_routes, "transcribe_audio_bytes_async", fake_transcribe)
+    monkeypatch.setattr(audio_routes, "get_transcript_cache", lambda: store)
+    monkeypatch.setattr(audio_routes, "_get_upload_base", lambda: tmp_path)
+    app.dependency_overrides[get_current_guest] = lambda: SimpleNamespace(guest_id="g1")
+    wav = _wav_bytes(2.5)
+    # Com o cliente aberto, o event loop (e as tarefas de arquivamento) persiste entre requisições
+    try:
+        with TestClient(app) as client:
+            first = client.post("/api/v1/speech-to-text", files={"audio": ("a.wav", wav, "audio/wav")}).json()
+            second = client.post("/api/v1/speech-to-text", files={"audio": ("b.WAV", wav, "audio/wav")}).json()
+            for _ in range(100):
+                names = [p.name for p in (tmp_path / "g1" / "misc").iterdir()]
+                if names == [first["audio_filename"]]:
+                    break
+                time.sleep(0.01)
+    finally:
+        app.dependency_overrides.pop(get_current_guest, None)
+
+    assert calls == [len(wav)]
+    assert first["cached"] is False and second["cached"] is True
+    assert second["transcript"] == "sofri racismo no trabalho"
+    assert first["audio_filename"] == second["audio_filename"] == f"{first['audio_sha256']}.wav"
+    assert names == [first["audio_filename"]]
@@ -0,0 +1,47 @@
+import pytest
+
+from app.core.config import settings
+from app.services import stt_backends
+
+
+def test_backend_selected_by_setting_and_cached(monkeypatch):
+    monkeypatch.setattr(settings, "STT_BACKEND", "faster_whisper")
+    stt_backends.get_stt_backend.cache_clear()
+    try:
+        backend = stt_backends.get_stt_backend()
+        assert backend.name == "faster_whisper"
+        assert stt_backends.get_stt_backend() is backend
+    finally:
+        stt_backends.get_stt_backend.cache_clear()
+
+
+def test_offline_model_loaded_once_per_worker():
+    loads = []
+
+    class Counting(stt_backends._LazyModelBackend):
+        def _load(self):
+            loads.append(1)
+            return object()
+
+        def recognize(self, pcm, *, language):
+            self._get_model()
+            return "ok"
+
+    backend = Counting()
+    backend.warmup()
+    assert [backend.recognize(b"\x00\x00", language="pt-BR") for _ in range(3)] == ["ok"] * 3
+    assert len(loads) == 1
+
+
+def test_backend_without_load_cannot_be_created():
+    class NoLoad(stt_backends._LazyModelBackend):
+        def recognize(self, pcm, *, language):
+            return "ok"
+
+    with pytest.raises(TypeError):
+        NoLoad()
+
+
+def test_vosk_without_model_path_is_unavailable():
+    with pytest.raises(stt_backends.STTBackendUnavailable):
+        stt_backends.VoskBackend(None).warmup()
@@ -0,0 +1,285 @@
+import io
+import os
+import signal
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+from app.services import text_to_speech
+from app.services.tts_cache import AudioCache, audio_cache_key
+from app.services.tts_pool import TTSBusyError, TTSWorkerError, TTSWorkerPool
+
+
+class FakeModel:
+    def __init__(self, samples=100):
+        self.calls = []
+        self.samples = samples
+
+    def generate(self, text, voice=None):
+        self.calls.append(text)
+        if self.samples == 100:
+            return np.full(100, 0.5, dtype=np.float32)
+        t = np.arange(self.samples) / 24000
+        return (0.3 * np.sin(2 * np.pi * 220 * t) * np.sin(2 * np.pi * 3 * t)).astype(np.float32)
+
+
+@pytest.fixture(autouse=True)
+def audio_cache(monkeypatch, tmp_path):
+    cache = AudioCache(str(tmp_path / "tts"), memory_entries=4, disk_max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(text_to_speech, "get_audio_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def tts_pool(monkeypatch):
+    pool = TTSWorkerPool(workers=0, max_batch=4, batch_window_ms=20, max_queue=0, queue_timeout_s=0.1)
+    monkeypatch.setattr(text_to_speech, "get_tts_pool", lambda: pool)
+    yield pool
+    pool.shutdown()
+
+
+def test_split_sentences_merges_short_and_wraps_long():
+    text = "## Entendimento do caso\nSim. Em tese, pode haver injúria racial! " + "palavra, " * 60
+    chunks = text_to_speech.split_sentences(text, max_chars=120)
+    assert chunks[0] == "Entendimento do caso. Sim."
+    assert chunks[1] == "Em tese, pode haver injúria racial!"
+    assert all(len(c) <= 120 for c in chunks)
+
+
+def test_stream_speech_wav_yields_header_then_pcm_per_sentence(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(text_to_speech, "get_tts_model", lambda: model)
+
+    parts = list(text_to_speech.stream_speech_wav("Primeira frase do parecer. Segunda frase do parecer."))
+
+    assert model.calls == ["Primeira frase do parecer.", "Segunda frase do parecer."]
+    header = parts[0][:44]
+    assert header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+    assert struct.unpack_from("<I", header, 24)[0] == text_to_speech.settings.KITTEN_TTS_SAMPLE_RATE
+    pcm = parts[0][44:] + b"".join(parts[1:])
+    assert len(pcm) == 2 * 100 * 2
+
+
+def test_repeated_text_is_served_from_cache_without_inference(monkeypatch, audio_cache):
+    model = FakeModel()
+    monkeypatch.setattr(text_to_speech, "get_tts_model", lambda: model)
+
+    first, _ = text_to_speech.generate_speech_sync("Pode detalhar o ocorrido?")
+    second, _ = text_to_speech.generate_speech_sync("  Pode detalhar   o ocorrido? ")
+    # O stream (frase a frase) tem sua própria entrada: não reaproveita a síntese do texto inteiro
+    streamed = b"".join(text_to_speech.stream_speech_wav("Pode detalhar o ocorrido?"))
+    streamed_again = b"".join(text_to_speech.stream_speech_wav("Pode detalhar o ocorrido?"))
+
+    assert model.calls == ["Pode detalhar o ocorrido?"] * 2
+    assert first == second and streamed[44:] == streamed_again[44:]
+    assert audio_cache.stats()["memory_hits"] == 2
+
+
+def test_stream_result_is_cached_as_complete_wav(monkeypatch, audio_cache):
+    model = FakeModel()
+    monkeypatch.setattr(text_to_speech, "get_tts_model", lambda: model)
+    list(text_to_speech.stream_speech_wav("Primeira frase do parecer. Segunda frase do parecer."))
+
+    # Disco sobrevive a um novo processo (nova instância, memória vazia)
+    fresh = AudioCache(audio_cache.directory, memory_entries=4, disk_max_bytes=audio_cache.disk_max_bytes)
+    s = text_to_speech.settings
+    key = audio_cache_key(
+        "Primeira frase do parecer. Segunda frase do parecer.",
+        s.KITTEN_TTS_VOICE_ID, s.KITTEN_TTS_MODEL, s.KITTEN_TTS_SAMPLE_RATE, text_to_speech.STREAM_CACHE_VARIANT,
+    )
+    wav = fresh.get(key)
+    assert fresh.stats()["disk_hits"] == 1
+    assert struct.unpack_from("<I", wav, 40)[0] == len(wav) - 44 == 2 * 100 * 2
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = AudioCache(str(tmp_path / "lru"), memory_entries=1, disk_max_bytes=2500)
+    cache.set("a", bytes(1000))
+    cache.set("b", bytes(1000))
+    os.utime(cache._path("a"), (1_000, 1_000))
+    os.utime(cache._path("b"), (2_000, 2_000))
+    cache.memory.clear()
+    assert cache.get("a") is not None  # leitura em disco renova "a"
+
+    cache.set("c", bytes(1000))
+
+    assert cache.stats()["disk_evictions"] == 1
+    assert sorted(os.listdir(cache.directory)) == ["a.audio", "c.audio"]
+
+
+def test_concurrent_short_texts_are_micro_batched(monkeypatch, tts_pool):
+    model = FakeModel()
+    monkeypatch.setattr(text_to_speech, "get_tts_model", lambda: model)
+    texts = [f"Frase curta número {i}." for i in range(4)]
+    results = {}
+
+    def synth(text):
+        results[text] = tts_pool.synthesize(text, "voz")
+
+    threads = [threading.Thread(target=synth, args=(t,)) for t in texts]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(model.calls) == sorted(texts)
+    assert all(len(results[t]) == 100 for t in texts)
+    stats = tts_pool.stats()
+    assert stats["batched_items"] == 4 and stats["batches"] < 4
+
+
+def test_process_pool_warmup_starts_every_worker_and_recovers_when_one_dies():
+    pool = TTSWorkerPool(workers=2, batch_window_ms=0, inference_timeout_s=30)
+    try:
+        report = pool.warmup(timeout_s=60)
+        pids = {worker["pid"] for worker in report}
+        assert len(pids) == 2 and os.getpid() not in pids
+
+        # Barreira quebrada (worker lento num aquecimento anterior) não trava o próximo
+        pool._barrier.abort()
+        assert {worker["pid"] for worker in pool.warmup(timeout_s=60)} == pids
+
+        os.kill(pids.pop(), signal.SIGKILL)
+        with pytest.raises(TTSWorkerError):
+            pool.synthesize("Olá.", "voz")
+        assert pool.stats()["restarts"] == 1
+        assert {worker["pid"] for worker in pool.warmup(timeout_s=60)}.isdisjoint(pids)
+    finally:
+        pool.shutdown()
+
+
+def test_warmup_probe_reports_barrier_timeout_instead_of_raising(monkeypatch):
+    from app.services import tts_pool as tts_pool_module
+
+    monkeypatch.setattr(tts_pool_module, "_WARMUP_BARRIER", threading.Barrier(2))
+    report = tts_pool_module.warmup_probe(0.01)
+    assert report["model_loaded"] is False and report["error"] == "BrokenBarrierError"
+
+
+def test_tts_route_returns_503_when_pool_is_saturated(client, monkeypatch, tts_pool):
+    from app.api.deps import get_current_guest
+    from app.main import app
+
+    app.dependency_overrides[get_current_guest] = lambda: object()
+    held = [tts_pool.bulkhead.acquire() for _ in range(tts_pool.bulkhead.stats()["limit"])]
+    try:
+        resp = client.post("/api/v1/text-to-speech", json={"text": "Olá, tudo bem?"})
+    finally:
+        for _ in held:
+            tts_pool.bulkhead.release()
+        app.dependency_overrides.pop(get_current_guest, None)
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    assert "Serviço de voz" in resp.json()["detail"]
+
+
+def test_negotiate_audio_format():
+    negotiate = text_to_speech.negotiate_audio_format
+    assert negotiate(None) == "wav"
+    assert negotiate("audio/ogg;q=0.9, audio/wav;q=0.5") == "ogg"
+    assert negotiate("audio/flac, audio/wav;q=0.1") == "wav"
+    assert negotiate("application/json, */*") == "wav"
+    assert negotiate("audio/wav", "opus") == "ogg"
+    with pytest.raises(ValueError):
+        negotiate(None, "flac")
+
+
+def test_tts_route_negotiates_opus_and_downsamples(client, monkeypatch):
+    import soundfile as sf
+    from app.api.deps import get_current_guest
+    from app.main import app
+
+    model = FakeModel(samples=24000 * 3)
+    monkeypatch.setattr(text_to_speech, "get_tts_model", lambda: model)
+    app.dependency_overrides[get_current_guest] = lambda: object()
+    try:
+        wav = client.post("/api/v1/text-to-speech", json={"text": "Olá, tudo bem?"})
+        ogg = client.post(
+            "/api/v1/text-to-speech", json={"text": "Olá, tudo bem?"}, headers={"Accept": "audio/ogg"}
+        )
+        small = client.post("/api/v1/text-to-speech?format=ogg&sample_rate=16000", json={"text": "Olá, tudo bem?"})
+        bad = client.post("/api/v1/text-to-speech?sample_rate=44100", json={"text": "Olá, tudo bem?"})
+    finally:
+        app.dependency_overrides.pop(get_current_guest, None)
+
+    assert wav.headers["content-type"] == "audio/wav"
+    assert ogg.headers["content-type"] == "audio/ogg" and "Accept" in ogg.headers["vary"]
+    assert len(ogg.content) * 5 < len(wav.content)
+    info = sf.info(io.BytesIO(small.content))
+    assert (info.format, info.subtype, info.samplerate) == ("OGG", "OPUS", 16000)
+    assert abs(info.duration - 3.0) < 0.1
+    assert len(small.content) < len(ogg.content)
+    assert bad.status_code == 400
+    # Cada formato/taxa tem sua própria entrada no cache
+    assert len(model.calls) == 3
+
+
+def test_stream_is_wav_only_and_empty_output_is_not_cached(client, monkeypatch, audio_cache):
+    from app.api.deps import get_current_guest
+    from app.main import app
+
+    monkeypatch.setattr(text_to_speech, "get_tts_model", lambda: FakeModel())
+    app.dependency_overrides[get_current_guest] = lambda: object()
+    try:
+        body = {"text": "Olá, tudo bem?", "stream": True}
+        ogg = client.post("/api/v1/text-to-speech?format=ogg", json=body)
+        rate = client.post("/api/v1/text-to-speech?sample_rate=16000", json=body)
+        accept = client.post("/api/v1/text-to-speech", json=body, headers={"Accept": "audio/ogg, audio/wav;q=0.5"})
+    finally:
+        app.dependency_overrides.pop(get_current_guest, None)
+    assert ogg.status_code == rate.status_code == 400
+    assert accept.status_code == 200 and accept.headers["content-type"] == "audio/wav"
+
+    monkeypatch.setattr(text_to_speech, "split_sentences", lambda text: [])
+    assert len(b"".join(text_to_speech.stream_speech_wav("..."))) == 44
+    assert audio_cache.stats()["sets"] == 1
+
+
+def test_stream_keeps_its_pool_slot_when_pool_saturates_mid_stream(monkeypatch, tts_pool):
+    monkeypatch.setattr(text_to_speech, "get_tts_model", lambda: FakeModel())
+    chunks = text_to_speech.stream_speech_wav("Primeira frase do parecer. Segunda frase do parecer.")
+    next(chunks)
+
+    # Depois do cabeçalho enviado, outras requisições ocupam todas as vagas livres
+    held = 0
+    with pytest.raises(TTSBusyError):
+        while True:
+            tts_pool.bulkhead.acquire()
+            held += 1
+    try:
+        rest = list(chunks)
+    finally:
+        for _ in range(held):
+            tts_pool.bulkhead.release()
+    assert held == tts_pool.bulkhead.stats()["limit"] - 1
+    assert len(b"".join(rest)) == 100 * 2
+    assert tts_pool.bulkhead.stats()["active"] == 0
+
+
+def test_timed_out_synthesis_keeps_its_slot_until_the_worker_finishes(monkeypatch):
+    release = threading.Event()
+
+    class SlowModel(FakeModel):
+        def generate(self, text, voice=None):
+            release.wait(5)
+            return super().generate(text, voice)
+
+    monkeypatch.setattr(text_to_speech, "get_tts_model", lambda: SlowModel())
+    pool = TTSWorkerPool(workers=0, batch_window_ms=0, inference_timeout_s=0.05)
+    try:
+        with pytest.raises(TTSWorkerError):
+            pool.synthesize("Olá.", "voz")
+        assert pool.bulkhead.stats()["active"] == 1
+
+        release.set()
+        for _ in range(100):
+            if pool.bulkhead.stats()["active"] == 0:
+                break
+            threading.Event().wait(0.01)
+        assert pool.bulkhead.stats()["active"] == 0
+    finally:
+        release.set()
+        pool.shutdown()
@@ -0,0 +1,62 @@
+import re
+from types import SimpleNamespace
+
+from app.api.v1.routes import chat as chat_routes
+from app.core.config import settings
+from app.services import legal_agent, timing
+from app.services.kv_store import MemoryTTLStore
+
+
+class FakeAsyncCohere:
+    async def chat(self, **kwargs):
+        return SimpleNamespace(text="<clarify>\nQ1: Onde?\nQ2: Quando?\nQ3: Quem?\n</clarify>", citations=[])
+
+
+def test_chat_request_reports_stage_timings(client, monkeypatch):
+    monkeypatch.setattr(settings, "COHERE_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "CLARIFY_CACHE_ENABLED", False)
+    monkeypatch.setattr(chat_routes, "CHAT_STATE", MemoryTTLStore())
+    monkeypatch.setattr(legal_agent, "get_async_cohere_client", lambda: FakeAsyncCohere())
+
+    r = client.post("/api/v1/chat", json={"user_message": "Sofri injúria racial no trabalho", "conversation_id": "m1"})
+
+    assert r.status_code == 200
+    stages = [part.split(";")[0].strip() for part in r.headers["Server-Timing"].split(",")]
+    assert stages == ["rag_retrieve", "prompt_build", "llm_queue", "llm_call", "total"]
+
+    body = client.get("/metrics").text
+    assert 'app_stage_duration_seconds_bucket{stage="llm_call",le="+Inf"}' in body
+    # Template da rota, nunca o caminho bruto (o prefixo do router entra conforme a versão do FastAPI)
+    assert re.search(r'app_http_request_duration_seconds_count\{method="POST",route="(/api/v1)?/chat",status="200"\}', body)
+
+
+def test_histogram_renders_cumulative_buckets():
+    family = timing.HistogramFamily("t_seconds", "teste", ("stage",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        family.observe(("x",), seconds)
+
+    lines = family.render()
+    assert 't_seconds_bucket{stage="x",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="x",le="1"} 3' in lines
+    assert 't_seconds_bucket{stage="x",le="+Inf"} 4' in lines
+    assert 't_seconds_count{stage="x"} 4' in lines
+
+
+def test_spans_in_other_threads_reach_the_request_only_when_propagated():
+    import threading
+
+    spans, token = timing.begin_request()
+    try:
+        with timing.span("local"):
+            pass
+        t = threading.Thread(target=lambda: timing.record("lost", 0.001))
+        t.start()
+        t.join()
+        t = threading.Thread(target=timing.propagate(lambda: timing.record("kept", 0.001)))
+        t.start()
+        t.join()
+    finally:
+        timing.end_request(token)
+
+    assert [name for name, _ in spans] == ["local", "kept"]
+    assert timing.server_timing_header(spans + [("local", 0.001)]).startswith("local;dur=")